@@ -1,6 +1,12 @@
 import streamlit as st
 from PIL import Image
 
+from utils.warmup import start_warmup
+
+# Aquecimento do servidor: carga do dataset e estado inicial das páginas em
+# segundo plano, enquanto a Home é lida (utils.warmup)
+start_warmup()
+
 st.set_page_config(
     page_title="Home",
     page_icon="🎲"
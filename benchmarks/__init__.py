@@ -0,0 +1,4 @@
+# ==================================
+# ===    Benchmarks    =====
+# ==================================
+# Gerador de dados sintéticos (generate) e suíte de benchmarks (run).
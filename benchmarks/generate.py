@@ -0,0 +1,176 @@
+# ==================================
+# ===    Gerador de dados sintéticos    =====
+# ==================================
+# Gera csvs no esquema do dataset/train.csv (mesmas colunas, formatos e
+# sentinelas) para os benchmarks:
+#     python -m benchmarks.generate --rows 1000000 --out benchmarks/data/train-1M.csv
+import os
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = [ 'ID', 'Delivery_person_ID', 'Delivery_person_Age', 'Delivery_person_Ratings',
+            'Restaurant_latitude', 'Restaurant_longitude', 'Delivery_location_latitude',
+            'Delivery_location_longitude', 'Order_Date', 'Time_Orderd', 'Time_Order_picked',
+            'Weatherconditions', 'Road_traffic_density', 'Vehicle_condition', 'Type_of_order',
+            'Type_of_vehicle', 'multiple_deliveries', 'Festival', 'City', 'Time_taken(min)' ]
+
+# Valores categóricos como aparecem no csv original (com o espaço no final)
+WEATHER = [ 'conditions Sunny', 'conditions Stormy', 'conditions Sandstorms', 'conditions Cloudy',
+            'conditions Fog', 'conditions Windy', 'conditions NaN' ]
+TRAFFIC = [ 'Low ', 'Medium ', 'High ', 'Jam ' ]
+ORDER_TYPES = [ 'Snack ', 'Meal ', 'Drinks ', 'Buffet ' ]
+VEHICLES = [ 'motorcycle ', 'scooter ', 'electric_scooter ', 'bicycle ' ]
+CITIES = [ 'Urban ', 'Metropolitian ', 'Semi-Urban ' ]
+RATINGS = [ '2.5', '3.5', '4.0', '4.5', '4.6', '4.7', '4.8', '4.9', '5.0' ]
+
+# Fração de linhas com o sentinela 'NaN ' em cada coluna (próxima do original);
+# como no original, a avaliação é 'NaN ' nas mesmas linhas que a idade
+NAN_RATES = { 'Delivery_person_Age': 0.04, 'Road_traffic_density': 0.01,
+              'City': 0.03, 'Festival': 0.005, 'multiple_deliveries': 0.02, 'Time_Orderd': 0.03 }
+
+# Cidades (códigos CITY<n>) com restaurantes em torno de um centro na Índia
+N_CITY_CODES = 22
+RESTAURANTS_PER_CITY = 20
+DELIVERY_PERSONS_PER_RESTAURANT = 3
+
+FIRST_DATE = pd.Timestamp( 2022, 2, 11 )
+DAYS = 55
+
+# Linhas geradas e gravadas por vez
+CHUNK_ROWS = 500_000
+
+# Csvs gerados para os benchmarks (um por tamanho)
+DATA_DIR = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), 'data' )
+
+
+def _with_nan( rng, values, rate=None, linhas=None ):
+    # Troca uma fração `rate` dos valores (ou as `linhas`) pelo sentinela do csv original
+    if linhas is None:
+        linhas = rng.random( len( values ) ) < rate
+    values = values.astype( object )
+    values[linhas] = 'NaN '
+
+    return values
+
+
+def generate_chunk( rng, start, rows, days=DAYS ):
+    """
+        Gera `rows` linhas no formato bruto do train.csv, com IDs a partir de
+        `start`:
+            - entregadores CITY<n>RES<r>DEL<d> (~1300 distintos, como no original)
+            - 'NaN ' nas colunas de NAN_RATES e 'conditions NaN' no clima
+            - Time_taken como '(min) NN'
+            - coordenadas válidas (~1% dos restaurantes com latitude negativa
+              e ~1% com coordenada zero, como no original)
+    """
+    city_code = rng.integers( 1, N_CITY_CODES + 1, rows )
+    restaurant = rng.integers( 1, RESTAURANTS_PER_CITY + 1, rows )
+    delivery = rng.integers( 1, DELIVERY_PERSONS_PER_RESTAURANT + 1, rows )
+
+    # Centro fixo por código de cidade + restaurante espalhado em ~0.2 grau
+    centers = np.random.default_rng( 0 ).uniform( [ 10, 70 ], [ 30, 88 ], size=( N_CITY_CODES + 1, 2 ) )
+    rest_lat = ( centers[city_code, 0] + rng.normal( 0, 0.1, rows ) ).round( 6 )
+    rest_lon = ( centers[city_code, 1] + rng.normal( 0, 0.1, rows ) ).round( 6 )
+    deliv_lat = ( rest_lat + rng.uniform( -0.15, 0.15, rows ) ).round( 6 )
+    deliv_lon = ( rest_lon + rng.uniform( -0.15, 0.15, rows ) ).round( 6 )
+
+    anomalia = rng.random( rows )
+    rest_lat = np.where( anomalia < 0.01, -rest_lat, rest_lat )
+    zero = anomalia > 0.99
+    rest_lat[zero] = 0.0
+    rest_lon[zero] = 0.0
+
+    sem_idade = rng.random( rows ) < NAN_RATES['Delivery_person_Age']
+
+    order_date = FIRST_DATE + pd.to_timedelta( rng.integers( 0, days, rows ), unit='D' )
+    minutes = rng.integers( 8 * 60, 23 * 60, rows ) // 5 * 5
+    ordered = pd.to_timedelta( minutes, unit='min' )
+    picked = pd.to_timedelta( minutes + rng.choice( [ 5, 10, 15 ], rows ), unit='min' )
+
+    df = pd.DataFrame( {
+        'ID': [ '0x{:x} '.format( i ) for i in range( start, start + rows ) ],
+        'Delivery_person_ID': pd.Series( city_code ).map( 'CITY{}'.format )
+                              + pd.Series( restaurant ).map( 'RES{:02d}'.format )
+                              + pd.Series( delivery ).map( 'DEL{:02d} '.format ),
+        'Delivery_person_Age': _with_nan( rng, rng.integers( 20, 40, rows ).astype( str ), linhas=sem_idade ),
+        'Delivery_person_Ratings': _with_nan( rng, rng.choice( RATINGS, rows ), linhas=sem_idade ),
+        'Restaurant_latitude': rest_lat,
+        'Restaurant_longitude': rest_lon,
+        'Delivery_location_latitude': deliv_lat,
+        'Delivery_location_longitude': deliv_lon,
+        'Order_Date': order_date.strftime( '%d-%m-%Y' ),
+        'Time_Orderd': _with_nan( rng, ( pd.Timestamp( 0 ) + ordered ).strftime( '%H:%M:%S' ).to_numpy(), NAN_RATES['Time_Orderd'] ),
+        'Time_Order_picked': ( pd.Timestamp( 0 ) + picked ).strftime( '%H:%M:%S' ),
+        'Weatherconditions': rng.choice( WEATHER, rows ),
+        'Road_traffic_density': _with_nan( rng, rng.choice( TRAFFIC, rows ), NAN_RATES['Road_traffic_density'] ),
+        'Vehicle_condition': rng.integers( 0, 4, rows ),
+        'Type_of_order': rng.choice( ORDER_TYPES, rows ),
+        'Type_of_vehicle': rng.choice( VEHICLES, rows ),
+        'multiple_deliveries': _with_nan( rng, rng.integers( 0, 4, rows ).astype( str ), NAN_RATES['multiple_deliveries'] ),
+        'Festival': _with_nan( rng, np.where( rng.random( rows ) < 0.05, 'Yes ', 'No ' ), NAN_RATES['Festival'] ),
+        'City': _with_nan( rng, rng.choice( CITIES, rows ), NAN_RATES['City'] ),
+        'Time_taken(min)': pd.Series( rng.integers( 10, 55, rows ) ).map( '(min) {}'.format ),
+    } )
+
+    return df.loc[:, COLUMNS]
+
+
+def write_csv( path, rows, seed=0, chunk_rows=CHUNK_ROWS, days=DAYS ):
+    """
+        Grava `rows` linhas sintéticas em `path`, em chunks (memória limitada
+        mesmo para 10M de linhas). Mesmo seed = mesmo arquivo.
+    """
+    rng = np.random.default_rng( seed )
+    os.makedirs( os.path.dirname( path ) or '.', exist_ok=True )
+
+    tmp_path = '{}.tmp-{}'.format( path, os.getpid() )
+    for start in range( 0, rows, chunk_rows ):
+        df = generate_chunk( rng, start, min( chunk_rows, rows - start ), days )
+        df.to_csv( tmp_path, mode='w' if start == 0 else 'a', header=( start == 0 ), index=False )
+    os.replace( tmp_path, path )
+
+    return path
+
+
+def parse_rows( text ):
+    """
+        '100k' -> 100000, '1M' -> 1000000, '250000' -> 250000
+    """
+    text = text.strip()
+    multiplier = { 'k': 10**3, 'K': 10**3, 'm': 10**6, 'M': 10**6 }.get( text[-1], 1 )
+    if multiplier != 1:
+        text = text[:-1]
+
+    return int( float( text ) * multiplier )
+
+
+def dataset_csv( size, data_dir=DATA_DIR ):
+    """
+        Caminho do csv sintético com `size` linhas ('100k', '1M', ...),
+        gerado na primeira vez.
+    """
+    path = os.path.join( data_dir, 'train-{}.csv'.format( size ) )
+    if not os.path.exists( path ):
+        print( 'gerando {} ...'.format( path ), file=sys.stderr )
+        write_csv( path, parse_rows( size ) )
+
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser( description='Gera csvs sintéticos no esquema do train.csv.' )
+    parser.add_argument( '--rows', default='100k', help='quantidade de linhas, ex.: 100k, 1M, 10M (padrão: %(default)s)' )
+    parser.add_argument( '--out', required=True, help='caminho do csv gerado' )
+    parser.add_argument( '--seed', type=int, default=0 )
+    parser.add_argument( '--days', type=int, default=DAYS, help='dias cobertos por Order_Date (padrão: %(default)s)' )
+    args = parser.parse_args()
+
+    write_csv( args.out, parse_rows( args.rows ), args.seed, days=args.days )
+    print( '{}: {} linhas'.format( args.out, parse_rows( args.rows ) ) )
+
+
+if __name__ == '__main__':
+    main()
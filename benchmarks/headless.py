@@ -0,0 +1,126 @@
+# ==================================
+# ===    Streamlit headless    =====
+# ==================================
+# Executa os scripts de pages/*.py sem servidor Streamlit: o `import streamlit`
+# das páginas recebe um substituto em que
+#     - os widgets retornam os valores da sessão da thread atual (set_widgets)
+#       ou o valor padrão declarado na página
+#     - os elementos de layout/saída não fazem nada, exceto serializar as
+#       figuras (plotly_chart) e contar os bytes enviados ao navegador
+#       (figuras, html e, aproximadamente, tabelas)
+# Cada thread é uma sessão: várias sessões rodam a mesma página em paralelo.
+import builtins
+import threading
+
+_session = threading.local()
+
+
+def set_widgets( widgets ):
+    """
+        Valores dos widgets da sessão da thread atual, por rótulo do widget.
+    """
+    _session.widgets = dict( widgets )
+
+
+def _widget( label, default ):
+    return getattr( _session, 'widgets', {} ).get( label, default )
+
+
+def _payload( size ):
+    _session.payload = getattr( _session, 'payload', 0 ) + size
+
+
+def _noop( *args, **kwargs ):
+    return None
+
+
+class _Element:
+    # Elemento sem efeito: qualquer chamada não listada aqui retorna None
+    def __getattr__( self, name ):
+        return _noop
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *exc ):
+        return False
+
+    def container( self ):
+        return _Element()
+
+    def empty( self ):
+        return _Element()
+
+    def expander( self, label, **kwargs ):
+        return _Element()
+
+    def progress( self, value=0 ):
+        return self
+
+    def columns( self, spec, **kwargs ):
+        return [ _Element() for _ in range( spec if isinstance( spec, int ) else len( spec ) ) ]
+
+    def tabs( self, labels ):
+        return [ _Element() for _ in labels ]
+
+    def slider( self, label, min_value=None, max_value=None, value=None, **kwargs ):
+        return _widget( label, value )
+
+    def multiselect( self, label, options, default=None, **kwargs ):
+        return list( _widget( label, default or [] ) )
+
+    def radio( self, label, options, index=0, **kwargs ):
+        return _widget( label, options[index] )
+
+    def checkbox( self, label, value=False, **kwargs ):
+        return _widget( label, value )
+
+    def plotly_chart( self, fig, **kwargs ):
+        # O Streamlit serializa a figura a cada rerun
+        _payload( len( fig.to_json() ) )
+
+    def dataframe( self, data, **kwargs ):
+        # Aproximação: tamanho em memória da tabela enviada
+        _payload( int( data.memory_usage( index=True, deep=True ).sum() ) )
+
+    def html( self, html, **kwargs ):
+        _payload( len( html ) )
+
+
+class _Streamlit( _Element ):
+    def __init__( self ):
+        self.sidebar = _Element()
+        # import streamlit.components.v1 as components -> st.components.v1
+        self.components = _Element()
+        self.components.v1 = _Element()
+
+
+st = _Streamlit()
+
+
+def _import( name, globals=None, locals=None, fromlist=(), level=0 ):
+    if name == 'streamlit' or name.startswith( 'streamlit.' ):
+        return st
+
+    return builtins.__import__( name, globals, locals, fromlist, level )
+
+
+_builtins = dict( vars( builtins ), __import__=_import )
+_compiled = {}
+_compile_lock = threading.Lock()
+
+
+def run_page( path ):
+    """
+        Executa o script da página uma vez (um rerun) na sessão da thread
+        atual. Retorna os bytes de figuras/html enviados ao navegador.
+    """
+    with _compile_lock:
+        if path not in _compiled:
+            with open( path, encoding='utf-8' ) as f:
+                _compiled[path] = compile( f.read(), path, 'exec' )
+
+    _session.payload = 0
+    exec( _compiled[path], { '__name__': '__main__', '__file__': path, '__builtins__': _builtins } )
+
+    return _session.payload
@@ -0,0 +1,264 @@
+# ==================================
+# ===    Teste de carga das páginas    =====
+# ==================================
+# Simula N sessões simultâneas: cada sessão muda um filtro da barra lateral
+# (data, trânsito ou clima), a visão, a granularidade ou uma seção adiada e
+# re-executa uma página, como o Streamlit faz a cada interação. Executar na
+# raiz do repositório:
+#     python -m benchmarks.load --sessions 16 --reruns 20
+#     python -m benchmarks.load --sessions 32 --processes 4 --size 1M
+#     python -m benchmarks.load --sessions 4 --think-ms 500 --prefetch
+import os
+import glob
+import json
+import time
+import random
+import argparse
+import datetime
+import resource
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks import headless
+
+ROOT = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+PAGES = sorted( glob.glob( os.path.join( ROOT, 'pages', '*.py' ) ) )
+
+# Rótulos e valores dos widgets da barra lateral das páginas
+DATE_LABEL = 'Até qual data?'
+TRAFFIC_LABEL = 'Quais as condições do trânsito'
+WEATHER_LABEL = 'Qual a condição climática'
+VIEW_LABEL = 'Visão'
+GRANULARITY_LABEL = 'Granularidade'
+SECTION_LABELS = [ 'Mostrar mapa', 'Mostrar avaliação por entregador' ]
+
+FIRST_DATE = datetime.datetime( 2022, 2, 11 )
+LAST_DATE = datetime.datetime( 2022, 4, 6 )
+TRAFFIC = [ 'Low', 'Medium', 'High', 'Jam' ]
+WEATHER = [ 'conditions Cloudy', 'conditions Fog', 'conditions Sandstorms', 'conditions Stormy',
+            'conditions Sunny', 'conditions Windy' ]
+VIEWS = [ 'Visão Gerencial', 'Visão Estratégica', 'Visão Geográfica' ]
+GRANULARITIES = [ 'day', 'week', 'month' ]
+
+PERCENTILES = [ 50, 95, 99 ]
+
+
+def _toggle( rng, selecionados, options ):
+    # Marca/desmarca uma opção do multiselect, mantendo ao menos uma marcada
+    valor = rng.choice( options )
+    if valor in selecionados and len( selecionados ) > 1:
+        return [ v for v in selecionados if v != valor ]
+
+    return sorted( set( selecionados ) | { valor }, key=options.index )
+
+
+def interact( rng, widgets ):
+    """
+        Uma interação aleatória: move o slider de data, marca/desmarca um
+        valor de trânsito ou de clima, troca de visão ou de granularidade ou
+        abre/fecha uma seção adiada.
+    """
+    widgets = dict( widgets )
+    widget = rng.choice( [ DATE_LABEL, TRAFFIC_LABEL, WEATHER_LABEL, VIEW_LABEL, GRANULARITY_LABEL ] + SECTION_LABELS )
+
+    if widget == DATE_LABEL:
+        widgets[DATE_LABEL] = FIRST_DATE + datetime.timedelta( days=rng.randint( 0, ( LAST_DATE - FIRST_DATE ).days ) )
+    elif widget == TRAFFIC_LABEL:
+        widgets[TRAFFIC_LABEL] = _toggle( rng, widgets[TRAFFIC_LABEL], TRAFFIC )
+    elif widget == WEATHER_LABEL:
+        widgets[WEATHER_LABEL] = _toggle( rng, widgets[WEATHER_LABEL], WEATHER )
+    elif widget == VIEW_LABEL:
+        widgets[VIEW_LABEL] = rng.choice( VIEWS )
+    elif widget == GRANULARITY_LABEL:
+        widgets[GRANULARITY_LABEL] = rng.choice( GRANULARITIES )
+    else:
+        widgets[widget] = not widgets.get( widget, False )
+
+    return widgets
+
+
+def run_session( session_id, reruns, seed=0, think_ms=0 ):
+    """
+        Uma sessão: `reruns` interações, cada uma seguida do rerun de uma
+        página sorteada. Retorna [ ( página, segundos, bytes enviados ) ].
+    """
+    rng = random.Random( seed * 100_003 + session_id )
+    widgets = { DATE_LABEL: LAST_DATE, TRAFFIC_LABEL: list( TRAFFIC ), WEATHER_LABEL: list( WEATHER ),
+                VIEW_LABEL: VIEWS[0] }
+
+    amostras = []
+    for _ in range( reruns ):
+        widgets = interact( rng, widgets )
+        page = rng.choice( PAGES )
+
+        headless.set_widgets( widgets )
+        start = time.perf_counter()
+        payload = headless.run_page( page )
+        amostras.append( ( os.path.basename( page ), time.perf_counter() - start, payload ) )
+
+        if think_ms:
+            time.sleep( think_ms / 1000 )
+
+    return amostras
+
+
+def _rss_mb():
+    # RSS atual (Linux: /proc/self/statm) e pico (getrusage; KB no Linux)
+    peak = resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss / 1024
+    try:
+        with open( '/proc/self/statm' ) as f:
+            atual = int( f.read().split()[1] ) * os.sysconf( 'SC_PAGE_SIZE' ) / 2**20
+    except OSError:
+        atual = None
+
+    return atual, peak
+
+
+def _shared_mb():
+    # PSS (páginas compartilhadas divididas entre os processos que as mapeiam)
+    # e memória privada do processo (Linux: /proc/self/smaps_rollup). A soma
+    # das PSS é a memória total dos workers: o snapshot mapeado conta uma vez
+    try:
+        with open( '/proc/self/smaps_rollup' ) as f:
+            kb = { linha.split()[0].rstrip( ':' ): int( linha.split()[1] ) for linha in f if linha.endswith( 'kB\n' ) }
+    except OSError:
+        return None, None
+
+    return kb['Pss'] / 1024, ( kb['Private_Clean'] + kb['Private_Dirty'] ) / 1024
+
+
+def run_process( sessions, reruns, seed=0, think_ms=0, first_session=0 ):
+    """
+        Executa `sessions` sessões em threads neste processo, depois de um
+        rerun de aquecimento de cada página (carga do dataset, cubo e
+        índices, fora da medição). Retorna as amostras e a memória do processo.
+    """
+    warmup = time.perf_counter()
+    for page in PAGES:
+        headless.set_widgets( {} )
+        headless.run_page( page )
+    warmup = time.perf_counter() - warmup
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor( max_workers=sessions ) as pool:
+        resultados = list( pool.map( lambda i: run_session( i, reruns, seed, think_ms ),
+                                     range( first_session, first_session + sessions ) ) )
+    wall = time.perf_counter() - start
+
+    rss, peak_rss = _rss_mb()
+    pss, private = _shared_mb()
+
+    return { 'pid': os.getpid(),
+             'samples': [ amostra for resultado in resultados for amostra in resultado ],
+             'warmup_s': warmup,
+             'wall_s': wall,
+             'rss_mb': rss,
+             'peak_rss_mb': peak_rss,
+             'pss_mb': pss,
+             'private_mb': private }
+
+
+def _run_process( args ):
+    return run_process( *args )
+
+
+def summarize( processes ):
+    """
+        Latências (p50/p95/p99, ms) por página e no total, vazão (reruns/s)
+        e memória de cada processo (e a soma das PSS, memória total dos workers).
+    """
+    samples = [ amostra for proc in processes for amostra in proc['samples'] ]
+
+    def _stats( amostras ):
+        latencias = np.array( [ segundos for _, segundos, _ in amostras ] ) * 1000
+        stats = { 'reruns': len( amostras ),
+                  'payload_kb': round( float( np.mean( [ payload for _, _, payload in amostras ] ) ) / 1024, 1 ) }
+        for p, valor in zip( PERCENTILES, np.percentile( latencias, PERCENTILES ) ):
+            stats['p{}_ms'.format( p )] = round( float( valor ), 2 )
+
+        return stats
+
+    pages = sorted( { page for page, _, _ in samples } )
+
+    return { 'total': _stats( samples ),
+             'pages': { page: _stats( [ a for a in samples if a[0] == page ] ) for page in pages },
+             # Processos rodam em paralelo: a vazão total é a soma das vazões
+             'throughput_rps': round( sum( len( proc['samples'] ) / proc['wall_s'] for proc in processes ), 2 ),
+             'total_pss_mb': ( round( sum( proc['pss_mb'] for proc in processes ), 1 )
+                               if all( proc['pss_mb'] is not None for proc in processes ) else None ),
+             'processes': [ { key: proc[key] for key in [ 'pid', 'warmup_s', 'wall_s', 'rss_mb', 'peak_rss_mb',
+                                                          'pss_mb', 'private_mb' ] }
+                            for proc in processes ] }
+
+
+def run( sessions, reruns, processes=1, seed=0, think_ms=0 ):
+    """
+        Distribui as sessões entre `processes` processos (cada um equivale a
+        um servidor Streamlit, com seus próprios caches) e resume os resultados.
+    """
+    if processes <= 1:
+        return summarize( [ run_process( sessions, reruns, seed, think_ms ) ] )
+
+    partes = np.array_split( np.arange( sessions ), processes )
+    tarefas = [ ( len( parte ), reruns, seed, think_ms, int( parte[0] ) ) for parte in partes if len( parte ) ]
+
+    with multiprocessing.get_context( 'spawn' ).Pool( len( tarefas ) ) as pool:
+        return summarize( pool.map( _run_process, tarefas ) )
+
+
+def print_summary( summary ):
+    colunas = [ 'reruns' ] + [ 'p{}_ms'.format( p ) for p in PERCENTILES ] + [ 'payload_kb' ]
+    print( '{:<28}'.format( 'page' ) + ''.join( '{:>12}'.format( c ) for c in colunas ) )
+    for page, stats in list( summary['pages'].items() ) + [ ( 'total', summary['total'] ) ]:
+        print( '{:<28}'.format( page ) + ''.join( '{:>12}'.format( stats[c] ) for c in colunas ) )
+
+    print( '\nvazão: {} reruns/s'.format( summary['throughput_rps'] ) )
+    for proc in summary['processes']:
+        rss = '-' if proc['rss_mb'] is None else '{:.1f}'.format( proc['rss_mb'] )
+        pss = '-' if proc['pss_mb'] is None else '{:.1f}'.format( proc['pss_mb'] )
+        private = '-' if proc['private_mb'] is None else '{:.1f}'.format( proc['private_mb'] )
+        print( 'processo {}: rss {} MB, pss {} MB, privada {} MB, pico {:.1f} MB, aquecimento {:.2f}s, '
+               'execução {:.2f}s'.format( proc['pid'], rss, pss, private, proc['peak_rss_mb'], proc['warmup_s'],
+                                          proc['wall_s'] ) )
+    if summary['total_pss_mb'] is not None:
+        print( 'memória total (soma das pss): {} MB'.format( summary['total_pss_mb'] ) )
+
+
+def main():
+    parser = argparse.ArgumentParser( description='Teste de carga: sessões simultâneas re-executando as páginas.' )
+    parser.add_argument( '--sessions', type=int, default=8, help='sessões simultâneas (padrão: %(default)s)' )
+    parser.add_argument( '--reruns', type=int, default=20, help='interações por sessão (padrão: %(default)s)' )
+    parser.add_argument( '--processes', type=int, default=1, help='processos (servidores) (padrão: %(default)s)' )
+    parser.add_argument( '--think-ms', type=int, default=0, help='pausa entre interações (padrão: %(default)s)' )
+    parser.add_argument( '--seed', type=int, default=0 )
+    parser.add_argument( '--dataset', default=None, help='csv ou store usado pelas páginas (CURRY_DATASET)' )
+    parser.add_argument( '--size', default=None, help='usa o csv sintético deste tamanho (ex.: 100k, 1M)' )
+    parser.add_argument( '--prefetch', action='store_true', help='liga o prefetch das datas vizinhas (CURRY_PREFETCH)' )
+    parser.add_argument( '--json', default=None, help='grava o resumo neste arquivo' )
+    args = parser.parse_args()
+
+    # O aquecimento medido é o rerun de cada página em run_process, e não a
+    # thread de utils.warmup
+    os.environ['CURRY_WARMUP'] = '0'
+    if args.prefetch:
+        os.environ['CURRY_PREFETCH'] = '1'
+
+    # As páginas leem CURRY_DATASET ao importar utils.loader (também nos processos filhos)
+    if args.size:
+        from benchmarks.generate import dataset_csv
+        args.dataset = dataset_csv( args.size )
+    if args.dataset:
+        os.environ['CURRY_DATASET'] = args.dataset
+
+    summary = run( args.sessions, args.reruns, args.processes, args.seed, args.think_ms )
+    print_summary( summary )
+
+    if args.json:
+        with open( args.json, 'w' ) as f:
+            json.dump( summary, f, indent=2 )
+
+
+if __name__ == '__main__':
+    main()
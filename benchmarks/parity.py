@@ -0,0 +1,197 @@
+# ==================================
+# ===    Verificações dos resultados    =====
+# ==================================
+# Confere as otimizações contra o cálculo direto, em dados sintéticos
+# (benchmarks.generate):
+#     - backends: resultados de cada página (utils.precompute.compute_results)
+#       iguais no pandas e no DuckDB
+#     - sketch: união exata das células esparsas e HLL dentro do erro
+#     - charts: lttb mantém os extremos e retorna n_out pontos
+#     - geo: interleave/deinterleave e chaves iguais às do geohash
+#     - cube: média e desvio padrão de cubos combinados (merge_cubes) iguais
+#       aos do dataset inteiro
+#     python -m benchmarks.parity --size 100k     (sai com código 1 se algo diverge)
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generate import dataset_csv
+from benchmarks.run import FILTERS, SIZES
+from utils.loader import load_dataset
+from utils.backend import PandasSource, DuckDBSource
+from utils.precompute import PAGES, compute_results
+from utils.cube import build_cube, merge_cubes, filter_cube
+from utils.metrics import KPI, run_kpis
+from utils.sketch import (SKETCH_DIMENSIONS, SKETCH_KEY, build_sketches, filter_cells, count_distinct,
+                          register_keys, registers, estimate, precision)
+from utils.charts import lttb
+from utils.geo import GRID_BITS, interleave, deinterleave, cell_keys
+
+# Estados dos filtros comparados: a seleção completa e a dos benchmarks
+STATES = [ {}, FILTERS ]
+
+# Desvios padrão do HLL tolerados (a chance de um acerto passar disso é ~6e-5)
+HLL_SIGMAS = 4
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def check_backends( csv_path ):
+    """
+        compute_results de cada página e estado dos filtros com PandasSource
+        e DuckDBSource (sem o store pré-calculado e sem cache).
+    """
+    for page, ( module, has_weather ) in PAGES.items():
+        for state in STATES:
+            filters = { name: value for name, value in state.items() if has_weather or name != 'weather' }
+            pandas_results = compute_results( page, PandasSource( module.COLUMNS, path=csv_path, **filters ) )
+            duckdb_results = compute_results( page, DuckDBSource( module.COLUMNS, path=csv_path, **filters ) )
+
+            assert pandas_results.keys() == duckdb_results.keys(), page
+            for name, df_aux in pandas_results.items():
+                try:
+                    pd.testing.assert_frame_equal( df_aux.reset_index( drop=True ),
+                                                   duckdb_results[name].reset_index( drop=True ),
+                                                   check_dtype=False, check_categorical=False )
+                except AssertionError as e:
+                    raise AssertionError( '{} {} {}: {}'.format( page, name, sorted( filters ), e ) )
+
+
+def _hll_bound( p, n ):
+    return HLL_SIGMAS * 1.04 / np.sqrt( 1 << p ) * n
+
+
+def check_sketch( df1 ):
+    """
+        count_distinct contra a contagem direta: exato sem células densas e,
+        com sketches de erro maior (células densas), dentro do erro do HLL.
+    """
+    rng = np.random.default_rng( 0 )
+    p = precision()
+    for n in [ 100, 10_000, 1_000_000 ]:
+        hashes = rng.integers( np.iinfo( np.uint64 ).max, size=n, dtype=np.uint64, endpoint=True )
+        erro = abs( estimate( registers( register_keys( hashes, p ), p ) ) - len( np.unique( hashes ) ) )
+        assert erro <= _hll_bound( p, n ), 'HLL com {} valores: erro {:.0f}'.format( n, erro )
+
+    df1 = df1.loc[:, SKETCH_DIMENSIONS + [ SKETCH_KEY ]]
+    sketches = build_sketches( df1 )
+    # Erro de 10%: 2**7 registradores, células com mais de 16 entregadores são densas
+    sketches_hll = build_sketches( df1, error=0.1 )
+
+    for state in STATES:
+        exato = filter_cube( df1, **state )[SKETCH_KEY].nunique()
+
+        cells = filter_cells( sketches, **state )
+        if not ( cells['dense'] >= 0 ).any():
+            contagem = count_distinct( sketches, cells )
+            assert contagem == exato, 'união exata {}: {} em vez de {}'.format( sorted( state ), contagem, exato )
+
+        cells = filter_cells( sketches_hll, **state )
+        assert ( cells['dense'] >= 0 ).any(), 'sem células densas'
+        erro = abs( count_distinct( sketches_hll, cells ) - exato )
+        assert erro <= _hll_bound( sketches_hll['p'], exato ), 'HLL {}: erro {}'.format( sorted( state ), erro )
+
+
+def check_lttb():
+    """
+        lttb: n_out posições crescentes, com o primeiro e o último ponto e
+        uma posição por bucket; séries curtas voltam inteiras.
+    """
+    rng = np.random.default_rng( 0 )
+    y = np.cumsum( rng.normal( size=10_000 ) )
+    x = pd.date_range( '2022-02-11', periods=len( y ), freq='min' ).to_numpy()
+
+    for n_out in [ 3, 100, 1000 ]:
+        posicoes = lttb( x, y, n_out )
+        assert len( posicoes ) == n_out, 'lttb: {} pontos em vez de {}'.format( len( posicoes ), n_out )
+        assert posicoes[0] == 0 and posicoes[-1] == len( y ) - 1, 'lttb: extremos'
+        assert ( np.diff( posicoes ) > 0 ).all(), 'lttb: posições fora de ordem'
+
+        edges = np.linspace( 1, len( y ) - 1, n_out - 1 ).astype( 'int64' )
+        assert ( ( posicoes[1:-1] >= edges[:-1] ) & ( posicoes[1:-1] < edges[1:] ) ).all(), 'lttb: buckets'
+
+    assert ( lttb( x[:50], y[:50], 100 ) == np.arange( 50 ) ).all(), 'lttb: série curta'
+
+
+def geohash( lat, lon, precision=6 ):
+    """
+        Geohash de referência (bit a bit, longitude primeiro).
+    """
+    lat_range, lon_range = [ -90.0, 90.0 ], [ -180.0, 180.0 ]
+    bits = []
+    for i in range( precision * 5 ):
+        value, limits = ( lon, lon_range ) if i % 2 == 0 else ( lat, lat_range )
+        mid = ( limits[0] + limits[1] ) / 2
+        bits.append( int( value >= mid ) )
+        limits[int( value < mid )] = mid
+
+    return ''.join( GEOHASH_BASE32[int( ''.join( map( str, bits[i:i + 5] ) ), 2 )] for i in range( 0, len( bits ), 5 ) )
+
+
+def check_geo():
+    """
+        interleave/deinterleave são inversas e a chave de cell_keys é o
+        geohash de 6 caracteres (30 bits) da coordenada.
+    """
+    rng = np.random.default_rng( 0 )
+    x, y = rng.integers( 0, 1 << GRID_BITS, ( 2, 100_000 ) )
+    x2, y2 = deinterleave( interleave( x, y ) )
+    assert ( x2 == x ).all() and ( y2 == y ).all(), 'interleave/deinterleave'
+
+    lat = rng.uniform( -89.9, 89.9, 2000 )
+    lon = rng.uniform( -179.9, 179.9, 2000 )
+    esperadas = [ int( ''.join( format( GEOHASH_BASE32.index( c ), '05b' ) for c in geohash( a, b ) ), 2 )
+                  for a, b in zip( lat, lon ) ]
+    assert ( cell_keys( lat, lon ) == np.array( esperadas ) ).all(), 'cell_keys diferente do geohash'
+
+
+def check_cube( df1 ):
+    """
+        merge_cubes de lotes (como na ingestão incremental) dá a mesma
+        média e o mesmo desvio padrão que o groupby direto no dataset.
+    """
+    kpis = [ KPI( 'city', [ 'City' ], 'Time_taken(min)' ), KPI( 'ratings', [ 'Weatherconditions' ], 'Delivery_person_Ratings' ) ]
+    lotes = np.array_split( np.arange( len( df1 ) ), 3 )
+    cube = merge_cubes( *[ build_cube( df1.iloc[lote] ) for lote in lotes ] )
+
+    resultados = run_kpis( kpis, cube=cube )
+    for kpi in kpis:
+        df_kpi = resultados[kpi.name]
+        direto = ( df1.groupby( kpi.by, observed=True )[kpi.measure]
+                      .agg( [ 'mean', 'std' ] )
+                      .reset_index() )
+        direto[kpi.by] = direto[kpi.by].astype( str )
+        pd.testing.assert_frame_equal( df_kpi.loc[:, kpi.by + [ 'mean', 'std' ]].reset_index( drop=True ),
+                                       direto.reset_index( drop=True ), check_dtype=False, rtol=1e-9 )
+
+
+def main():
+    parser = argparse.ArgumentParser( description='Confere os resultados das otimizações contra o cálculo direto.' )
+    parser.add_argument( '--size', default='100k', choices=SIZES, help='dataset sintético (padrão: %(default)s)' )
+    args = parser.parse_args()
+
+    csv_path = dataset_csv( args.size )
+    df1 = load_dataset( csv_path )
+    checks = [ ( 'backends', lambda: check_backends( csv_path ) ),
+               ( 'sketch', lambda: check_sketch( df1 ) ),
+               ( 'lttb', check_lttb ),
+               ( 'geo', check_geo ),
+               ( 'cube', lambda: check_cube( df1 ) ) ]
+
+    falhas = 0
+    for name, check in checks:
+        try:
+            check()
+            print( '{:<10} ok'.format( name ) )
+        except AssertionError as e:
+            falhas += 1
+            print( '{:<10} FALHOU: {}'.format( name, e ) )
+
+    if falhas:
+        sys.exit( 1 )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+# ==================================
+# ===    Benchmarks    =====
+# ==================================
+# Mede tempo e pico de memória das funções auxiliares e do cálculo completo
+# de cada página (sem renderização, com as fontes de utils.backend que as
+# páginas usam, nos dois backends), em dados sintéticos (benchmarks.generate):
+#     python -m benchmarks.run --sizes 100k 1M            (compara com o baseline)
+#     python -m benchmarks.run --sizes 100k 1M --save-baseline
+#     python -m benchmarks.run --check                    (sai com erro se houver regressão)
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.generate import dataset_csv
+from utils.cleaning import clean_code, READ_CSV_KWARGS
+from utils.geo import add_distance, add_geocells
+from utils.calendar_dim import add_calendar
+from utils.loader import sort_by_date
+from utils.schema import compact
+from utils.cube import build_cube, filter_cube
+from utils.filters import build_filter_index, apply_filters, select_positions
+from utils.metrics import run_kpis
+from utils.ranking import top_bottom_k
+from utils.maps import bin_cells
+from utils.spatial import build_spatial_index, query_bbox, cell_density, nearest_restaurants
+from utils.sketch import build_sketches, filter_cells, count_distinct
+from utils import warehouse
+from utils.backend import PandasSource, DuckDBSource
+import utils.visao_empresa as empresa
+import utils.visao_entregadores as entregadores
+import utils.visao_restaurantes as restaurantes
+
+BENCH_DIR = os.path.dirname( os.path.abspath( __file__ ) )
+BASELINE_PATH = os.path.join( BENCH_DIR, 'baseline.json' )
+
+SIZES = [ '100k', '1M', '10M' ]
+DEFAULT_SIZES = [ '100k', '1M' ]
+REPEAT = 3
+
+# Regressão = mais lento (ou pico de memória maior) que o baseline além desta fração
+TOLERANCE = 0.10
+
+# Estado dos filtros usado nos benchmarks: uma semana a menos e parte dos valores
+FILTERS = { 'date': pd.Timestamp( 2022, 3, 30 ),
+            'traffic': [ 'Low', 'Medium', 'Jam' ],
+            'weather': [ 'conditions Sunny', 'conditions Cloudy', 'conditions Fog', 'conditions Windy' ] }
+
+# Área ( lat_min, lat_max, lon_min, lon_max ) e ponto das consultas espaciais (região de Bangalore)
+BBOX = ( 12.8, 13.1, 77.4, 77.8 )
+NEAREST_POINT = ( 12.97, 77.59 )
+
+# Páginas medidas: módulo e filtros da barra lateral de cada uma
+PAGES = [ ( 'visao_empresa', empresa, [ 'date', 'traffic' ] ),
+          ( 'visao_entregadores', entregadores, [ 'date', 'traffic', 'weather' ] ),
+          ( 'visao_restaurantes', restaurantes, [ 'date', 'traffic', 'weather' ] ) ]
+
+SOURCES = [ ( 'pandas', PandasSource ), ( 'duckdb', DuckDBSource ) ]
+
+
+def page_case( module, source, csv_path, filters ):
+    """
+        Um rerun da página sem Streamlit: a fonte é aberta como a página
+        abre (sem o store pré-calculado e sem o cache de resultados) e
+        compute_page chama os mesmos métodos dela.
+    """
+    return lambda: module.compute_page( source( module.COLUMNS, path=csv_path, **filters ) )
+
+
+def build_cases( csv_path ):
+    """
+        Prepara as entradas uma única vez e retorna [ ( nome, função sem
+        argumentos ) ] com os casos medidos.
+    """
+    raw = pd.read_csv( csv_path, **READ_CSV_KWARGS )
+    cleaned = clean_code( raw )
+    sorted_df = sort_by_date( add_geocells( add_calendar( add_distance( cleaned ) ) ) )
+    df1 = compact( sorted_df )
+    cube = build_cube( df1 )
+    index = build_filter_index( df1 )
+
+    date, traffic, weather = FILTERS['date'], FILTERS['traffic'], FILTERS['weather']
+    df_empresa = df1.loc[:, empresa.COLUMNS]
+    df_entregadores = df1.loc[:, entregadores.COLUMNS]
+    df_restaurantes = df1.loc[:, restaurantes.COLUMNS]
+    kpis_empresa = run_kpis( empresa.PAGE_KPIS, cube=filter_cube( cube, date=date, traffic=traffic ) )
+    periods = empresa.period_orders( df_empresa )
+    sketches = build_sketches( df1 )
+    spatial = build_spatial_index( df1 )
+
+    # Backend DuckDB: o mesmo banco que a página abre para este csv
+    con = warehouse.load_database( csv_path )
+    sql_filters = { 'date': date, 'traffic': traffic, 'weather': weather }
+
+    # Páginas completas (sem Streamlit e sem caches), nos dois backends
+    pages = [ ( 'page.{}.{}'.format( backend, page ),
+                page_case( module, source, csv_path, { name: sql_filters[name] for name in filters } ) )
+              for page, module, filters in PAGES for backend, source in SOURCES ]
+
+    return [
+        # Carga e limpeza
+        ( 'read_csv', lambda: pd.read_csv( csv_path, **READ_CSV_KWARGS ) ),
+        ( 'clean_code', lambda: clean_code( raw ) ),
+        ( 'add_distance', lambda: add_distance( cleaned ) ),
+        ( 'add_calendar', lambda: add_calendar( cleaned ) ),
+        ( 'add_geocells', lambda: add_geocells( cleaned ) ),
+        ( 'sort_by_date', lambda: sort_by_date( cleaned ) ),
+        ( 'compact', lambda: compact( sorted_df ) ),
+        # Estruturas derivadas
+        ( 'build_cube', lambda: build_cube( df1 ) ),
+        ( 'build_filter_index', lambda: build_filter_index( df1 ) ),
+        ( 'apply_filters', lambda: apply_filters( df1, index, date=date, traffic=traffic, weather=weather ) ),
+        ( 'build_sketches', lambda: build_sketches( df1 ) ),
+        ( 'build_spatial_index', lambda: build_spatial_index( df1 ) ),
+        # Funções auxiliares das páginas
+        ( 'empresa.order_metrics', lambda: empresa.order_metrics( kpis_empresa['orders_by_date'] ) ),
+        ( 'empresa.period_orders', lambda: empresa.period_orders( df_empresa ) ),
+        ( 'empresa.orders_by_period', lambda: empresa.orders_by_period( periods ) ),
+        ( 'empresa.orders_share_by_period', lambda: empresa.orders_share_by_period( periods ) ),
+        ( 'maps.bin_cells', lambda: bin_cells( df1['delivery_cell'], df1['Delivery_location_latitude'],
+                                               df1['Delivery_location_longitude'] ) ),
+        ( 'entregadores.avg_ratings_by_delivery', lambda: entregadores.avg_ratings_by_delivery( df_entregadores ) ),
+        ( 'entregadores.top_bottom_k', lambda: top_bottom_k( df_entregadores ) ),
+        ( 'restaurantes.unique_deliveries', lambda: restaurantes.unique_deliveries( df_restaurantes ) ),
+        # Entregadores distintos pelos sketches (utils.sketch), com os filtros da página
+        ( 'sketch.period_orders', lambda: empresa.period_orders_sketch(
+            filter_cube( cube, date=date, traffic=traffic ), sketches,
+            filter_cells( sketches, date=date, traffic=traffic ) ) ),
+        ( 'sketch.unique_deliveries', lambda: count_distinct( sketches, filter_cells( sketches, **sql_filters ) ) ),
+        # Consultas espaciais (utils.spatial): área do mapa (com os filtros da
+        # página), densidade por célula e restaurantes mais próximos
+        ( 'spatial.query_bbox', lambda: query_bbox( spatial, BBOX ) ),
+        ( 'spatial.rows_in_bbox', lambda: df1.iloc[select_positions( index, query_bbox( spatial, BBOX ), **sql_filters )] ),
+        ( 'spatial.cell_density', lambda: cell_density( spatial, level=10 ) ),
+        ( 'spatial.nearest_restaurants', lambda: nearest_restaurants( spatial, *NEAREST_POINT, k=5 ) ),
+        # Backend DuckDB (agregações em SQL com os filtros como predicados)
+        ( 'duckdb.kpis_restaurantes', lambda: warehouse.run_kpis( con, restaurantes.PAGE_KPIS, **sql_filters ) ),
+        ( 'duckdb.period_orders', lambda: warehouse.period_orders( con, **sql_filters ) ),
+        ( 'duckdb.avg_ratings_by_delivery', lambda: warehouse.avg_ratings_by_delivery( con, **sql_filters ) ),
+        ( 'duckdb.top_bottom_k', lambda: warehouse.top_bottom_k( con, **sql_filters ) ),
+        ( 'duckdb.unique_deliveries', lambda: warehouse.unique_deliveries( con, **sql_filters ) ),
+    ] + pages
+
+
+def measure( fn, repeat=REPEAT ):
+    """
+        Retorna { 'seconds': melhor tempo em `repeat` execuções, 'peak_mb':
+        pico de memória alocada (tracemalloc) durante uma execução }.
+        O pico é medido numa execução separada: o tracemalloc deixa o
+        código mais lento e não entra no tempo.
+    """
+    tempos = []
+    for _ in range( repeat ):
+        start = time.perf_counter()
+        fn()
+        tempos.append( time.perf_counter() - start )
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return { 'seconds': round( min( tempos ), 6 ), 'peak_mb': round( peak / 2**20, 3 ) }
+
+
+def run( sizes, repeat=REPEAT, only=None ):
+    """
+        Executa os casos em cada tamanho. Retorna { tamanho: { caso: medidas } }.
+    """
+    results = {}
+    for size in sizes:
+        results[size] = {}
+        for name, fn in build_cases( dataset_csv( size ) ):
+            if only and not any( pattern in name for pattern in only ):
+                continue
+            results[size][name] = measure( fn, repeat )
+            print( '{:>5} {:<40} {:>10.4f}s {:>10.1f} MB'.format( size, name, results[size][name]['seconds'],
+                                                                 results[size][name]['peak_mb'] ), file=sys.stderr )
+
+    return results
+
+
+def compare( results, baseline, tolerance=TOLERANCE ):
+    """
+        Compara os resultados com o baseline. Retorna ( linhas da tabela,
+        lista de regressões ); casos ausentes do baseline não são comparados.
+    """
+    linhas = [ '{:>5} {:<40} {:>10} {:>10} {:>7} {:>10} {:>10} {:>7}'.format(
+                   'size', 'case', 'seconds', 'base', 'ratio', 'peak_mb', 'base', 'ratio' ) ]
+    regressions = []
+
+    for size, cases in results.items():
+        for name, atual in cases.items():
+            base = baseline.get( 'results', {} ).get( size, {} ).get( name )
+            if base is None:
+                linhas.append( '{:>5} {:<40} {:>10.4f} {:>10} {:>7} {:>10.1f} {:>10} {:>7}'.format(
+                                   size, name, atual['seconds'], '-', '-', atual['peak_mb'], '-', '-' ) )
+                continue
+
+            time_ratio = atual['seconds'] / base['seconds'] if base['seconds'] else 1.0
+            mem_ratio = atual['peak_mb'] / base['peak_mb'] if base['peak_mb'] else 1.0
+            flag = ''
+            if time_ratio > 1 + tolerance or mem_ratio > 1 + tolerance:
+                regressions.append( ( size, name, time_ratio, mem_ratio ) )
+                flag = '  <-- regressão'
+
+            linhas.append( '{:>5} {:<40} {:>10.4f} {:>10.4f} {:>7.2f} {:>10.1f} {:>10.1f} {:>7.2f}{}'.format(
+                               size, name, atual['seconds'], base['seconds'], time_ratio,
+                               atual['peak_mb'], base['peak_mb'], mem_ratio, flag ) )
+
+    return linhas, regressions
+
+
+def read_baseline( path=BASELINE_PATH ):
+    try:
+        with open( path ) as f:
+            return json.load( f )
+    except FileNotFoundError:
+        return {}
+
+
+def write_baseline( results, path=BASELINE_PATH ):
+    # Mantém os tamanhos não re-executados e registra o ambiente da medição
+    baseline = read_baseline( path )
+    baseline.setdefault( 'results', {} ).update( results )
+    baseline['environment'] = { 'python': platform.python_version(),
+                                'pandas': pd.__version__,
+                                'machine': platform.machine(),
+                                'date': time.strftime( '%Y-%m-%d' ) }
+
+    tmp_path = '{}.tmp-{}'.format( path, os.getpid() )
+    with open( tmp_path, 'w' ) as f:
+        json.dump( baseline, f, indent=2, sort_keys=True )
+    os.replace( tmp_path, path )
+
+
+def main():
+    parser = argparse.ArgumentParser( description='Benchmarks das funções e páginas do dashboard.' )
+    parser.add_argument( '--sizes', nargs='+', default=DEFAULT_SIZES, choices=SIZES,
+                         help='tamanhos dos datasets sintéticos (padrão: %(default)s)' )
+    parser.add_argument( '--repeat', type=int, default=REPEAT, help='execuções por caso (padrão: %(default)s)' )
+    parser.add_argument( '--only', nargs='+', default=None, help='executa só os casos que contêm estes textos' )
+    parser.add_argument( '--baseline', default=BASELINE_PATH, help='arquivo do baseline (padrão: %(default)s)' )
+    parser.add_argument( '--save-baseline', action='store_true', help='grava os resultados como novo baseline' )
+    parser.add_argument( '--check', action='store_true', help='sai com código 1 se houver regressão' )
+    parser.add_argument( '--tolerance', type=float, default=TOLERANCE,
+                         help='fração tolerada acima do baseline (padrão: %(default)s)' )
+    args = parser.parse_args()
+
+    results = run( args.sizes, args.repeat, args.only )
+
+    linhas, regressions = compare( results, read_baseline( args.baseline ), args.tolerance )
+    print( '\n'.join( linhas ) )
+
+    if args.save_baseline:
+        write_baseline( results, args.baseline )
+        print( 'baseline gravado em {}'.format( args.baseline ) )
+
+    if args.check and regressions:
+        sys.exit( 1 )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,152 +1,63 @@
 # ==================================
 # ===    Libraries  =====
 # ==================================
-import folium
+import math
+
 import pandas as pd
 
 import streamlit as st
+import streamlit.components.v1 as components
 import plotly.express as px
 import plotly.graph_objects as go
 
 from PIL import Image
 from haversine import haversine
-from streamlit_folium import folium_static
+
+from utils.loader import dataset_version
+from utils.ui import sidebar_progress, start_profiling, profiling_panel, view_selector, deferred_section
+from utils.backend import open_source
+from utils.warmup import rerun_started, prefetch_neighbours
+from utils.maps import county_map_html
+from utils.spatial import nearest_restaurants
+from utils.figure_cache import cached_figure, lazy, normalize_filters
+from utils.visao_empresa import ( PAGE_KPIS, COLUMNS, order_metrics, traffic_order_share, traffic_order_city,
+                                  orders_by_period, orders_share_by_period )
 
 st.set_page_config( page_title='Visão Empresa', page_icon="📈", layout='wide')
 
+# Spans de tempo deste rerun (CURRY_PROFILE=1 ou ?profile=1 na url)
+start_profiling( 'visao_empresa' )
+
+# Aquecimento do servidor (na primeira vez) e adiamento do prefetch (utils.warmup)
+rerun_started()
+
 # ==================================
 # ===    Help Functions    =====
 # ==================================
 
-def clean_code( df1 ):
-    """
-        Esta função realiza o data cleaning do dataset: 
-            1. Elimina os NaN e converte os tipos das colunas Delivery person Age 
-            2. Elimina os NaN e converte os tipos das colunas Delivery_person_Ratings
-            3. Elimina os NaN da coluna City
-            4. Converte a coluna Order Date
-            5. Elimina os NaN e converte os tipos das colunas multiple deliveries
-            6. Removendo os espaços de texto/string/objec com strip
-            7. Limpa a coluna de Time taken
-            
-    """
-    # 1. Convertendo a coluna Delivery person Age
-    linhas_selecionadas = df1['Delivery_person_Age'] != 'NaN ' 
-    df1 = df1.loc[ linhas_selecionadas, :].copy()
-    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].astype('int64')
-
-    # 2. Convertendo a coluna Delivery person Ratings e eliminando os NaN
-    linhas_selecionadas = df1['Road_traffic_density'] != 'NaN ' 
-    df1 = df1.loc[ linhas_selecionadas, :].copy()
-    df1['Delivery_person_Ratings'] = df1['Delivery_person_Ratings'].astype('float')
-
-    # 3. Convertendo eliminando os NaN da coluna city
-    linhas_selecionadas = df1['City'] != 'NaN ' 
-    df1 = df1.loc[ linhas_selecionadas, :].copy()
-
-    # 3. Convertendo eliminando os NaN da coluna city
-    linhas_selecionadas = df1['Festival'] != 'NaN ' 
-    df1 = df1.loc[ linhas_selecionadas, :].copy()
-
-    # 4. Convertendo a coluna Order Date
-    df1['Order_Date'] = pd.to_datetime( df1['Order_Date'], format='%d-%m-%Y')
-
-    # 5. Convertendo a coluna multiple deliveries
-    linhas_selecionadas = df1['multiple_deliveries'] != 'NaN '
-    df1 = df1.loc[ linhas_selecionadas, :].copy()
-    df1['multiple_deliveries'] = df1['multiple_deliveries'].astype('int')
-
-    # 6. Removendo os espaços de texto/string/objec com strip
-    df1.loc[:, 'ID'] = df1.loc[:, 'ID'].str.strip()
-    df1.loc[:, 'Delivery_person_ID'] = df1.loc[:, 'Delivery_person_ID'].str.strip()
-    df1.loc[:, 'Road_traffic_density'] = df1.loc[:, 'Road_traffic_density'].str.strip()
-    df1.loc[:, 'Type_of_order'] = df1.loc[:, 'Type_of_order'].str.strip()
-    df1.loc[:, 'Type_of_vehicle'] = df1.loc[:, 'Type_of_vehicle'].str.strip()
-    df1.loc[:, 'Festival'] = df1.loc[:, 'Festival'].str.strip()
-    df1.loc[:, 'City'] = df1.loc[:, 'City'].str.strip()
-
-    # 7. Limpando a coluna de Time taken
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].apply( lambda x: x.split( ' ' )[1] )
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].astype( int )
-    
-    return df1
-
-def order_metrics( df1 ):
-    # Order Mertrics
-    cols = [ 'ID', 'Order_Date'] 
-    # Seleção de linhas
-    df_aux = df1.loc[: , cols].groupby( 'Order_Date' ).count().reset_index()
-    # Desenhar o gráfico de Barras
-    fig = px.bar(df_aux, x='Order_Date', y='ID')
-            
-    return fig
-
-def traffic_order_share( df1 ): 
-    # Order Mertrics Share        
-    df_aux = df1.loc[:, ['ID', 'Road_traffic_density']].groupby( 'Road_traffic_density').count().reset_index()
-    # Criaçao. da metrica 
-    df_aux['entregas_perc'] = df_aux['ID'] / df_aux['ID'].sum()
-    # Desenhar o gráfico de pizza
-    fig = px.pie( df_aux, values='entregas_perc', names='Road_traffic_density' )
-                
-    return fig
-
-def traffic_order_city( df1 ):
-    # Traffic Order by city            
-    df_aux = df1.loc[:, ['ID', 'City', 'Road_traffic_density']].groupby(['City', 'Road_traffic_density']).count().reset_index()
-    # Desenhar o gráfico de scatter
-    fig  = px.scatter( df_aux, x='City', y= 'Road_traffic_density', size='ID', color='City')
-                
-    return fig
-
-def orders_by_week( df1):
-    # Criar a coluna da semana
-    df1['week_of_year'] = df1['Order_Date'].dt.strftime( '%U' )
-    # Agrupar pela semana
-    df_aux = df1.loc[: ,['ID', 'week_of_year']].groupby( ['week_of_year']).count().reset_index()
-    # Desenhar um gráfico de linhas 
-    fig = px.line( df_aux, x='week_of_year', y='ID')
-            
-    return fig
-
-def orders_share_by_week( df1 ):
-    # Quantidade de pedidos por semana / numero unico de entregadores por semana 
-    df_aux1 = df1.loc[: , [ 'ID', 'week_of_year']].groupby( 'week_of_year').count().reset_index()
-    df_aux2 = df1.loc[:, ['Delivery_person_ID', 'week_of_year']].groupby( 'week_of_year').nunique().reset_index()
-    # Merging os dois aux df criados 
-    df_aux = pd.merge( df_aux1, df_aux2, how='inner')
-    # Feature engeniering em df_aux
-    df_aux['order_by_delivery'] = df_aux['ID'] / df_aux['Delivery_person_ID']
-    # Desenhar um gráfico de linhas
-    fig = px.line( df_aux, x= 'week_of_year', y='order_by_delivery')
-            
-    return fig
-        
-def county_maps( df1 ):
-            
-    df_aux = df1.loc[:, ['City', 'Road_traffic_density', 'Delivery_location_latitude', 'Delivery_location_longitude']].groupby( ['City', 'Road_traffic_density']).median().reset_index()
-    # Desenhar o mapa
-    map_ = folium.Map( zoom_start=11 )
-    for index, location_info in df_aux.iterrows():
-        folium.Marker( [location_info['Delivery_location_latitude'],
-                       location_info['Delivery_location_longitude']], 
-                       popup=location_info[['City', 'Road_traffic_density']] ).add_to( map_ )
-    folium_static( map_, width=1400, height= 600 )
-        
-    return None 
-    
-# ==================================
-# ===   Import dataset    =====
-# ==================================
-df = pd.read_csv('dataset/train.csv') 
-df1 = df.copy()
+# Gráficos e KPIs da página: utils.visao_empresa (importável pelos benchmarks)
 
-# ==================================
-# ===    Data Cleaning   =====
-# ==================================
+# Visões da página (seletor no lugar de st.tabs)
+VIEWS = [ 'Visão Gerencial', 'Visão Estratégica', 'Visão Geográfica' ]
 
-df1 = clean_code( df1 ) 
+# Granularidades dos gráficos de pedidos por período (utils.calendar_dim.GRANULARITIES)
+GRANULARITY_LABELS = { 'day': 'Diária', 'week': 'Semanal', 'month': 'Mensal' }
 
+def county_maps( data, cache_key, bbox=None ):
+    # Mapa com clusters e mapa de calor pré-agregado; o html fica em cache
+    # por versão do dataset + filtros + área
+    html = county_map_html( data, cache_key, bbox )
+    components.html( html, width=1400, height=610 )
+        
+    return None 
+
+def area_bounds( index ):
+    # Extensão dos locais de entrega (índice espacial), arredondada para fora
+    # no passo dos sliders de área (0,01 grau)
+    lat_min, lat_max, lon_min, lon_max = index['bounds']['delivery']
+    return ( math.floor( lat_min * 100 ) / 100, math.ceil( lat_max * 100 ) / 100,
+             math.floor( lon_min * 100 ) / 100, math.ceil( lon_max * 100 ) / 100 )
+    
 # ==================================
 # ===    Barra Lateral    =====
 # ==================================
@@ -178,31 +89,35 @@ traffic_options= st.sidebar.multiselect(
 st.sidebar.markdown("""___""")
 st.sidebar.markdown("### Powered by Arthur Sousa")
 
-# ===============
-# Filtro de Data 
-# ===============
+# ================================
+# Filtros de Data e de Transito 
+# ================================
 
-linhas_selecionadas = df1['Order_Date'] < date_slider
-df1 = df1.loc[linhas_selecionadas, :]
+# Fonte dos dados (CURRY_BACKEND): dataset em memória com as colunas da página
+# (COLUMNS), lido e limpo uma única vez por processo, ou banco DuckDB com os
+# filtros como predicados SQL. As linhas só são filtradas pelas visões que as
+# usam (Geográfica); os gráficos das outras visões vêm de agregações
+source = open_source( COLUMNS, date=date_slider, traffic=traffic_options, progress=sidebar_progress() )
 
-# ==================
-# Filtro de Transito
-# ==================
+# Versão do dataset + filtros: chave do cache de figuras e do mapa
+version = dataset_version()
+filters = { 'date': date_slider, 'traffic': traffic_options }
 
-linhas_selecionadas = df1['Road_traffic_density'].isin( traffic_options )
-df1 = df1.loc[linhas_selecionadas, :]
+# Só calculados se algum gráfico não estiver em cache
+kpis = lazy( lambda: source.kpis( PAGE_KPIS ) )
     
 # ==================================
 # ===    Layout no Streamlit   =====
 # ==================================
 
-tab1, tab2, tab3 = st.tabs( ['Visão Gerencial', 'Visão Estratégica', 'Visão Geográfica'] ) 
+# Só a visão selecionada é executada no rerun (st.tabs executaria todas)
+view = view_selector( VIEWS )
 
-with tab1: 
+if view == 'Visão Gerencial': 
     with st.container():
         
         st.markdown('# Orders by Day')
-        fig = order_metrics( df1 )
+        fig = cached_figure( order_metrics, lambda: kpis()['orders_by_date'], version, filters )
         st.plotly_chart( fig, use_container_width=True)       
             
     
@@ -211,35 +126,65 @@ with tab1:
         with col1:
                         
             st.markdown('### Traffic Order Share')
-            fig = traffic_order_share( df1 )
+            fig = cached_figure( traffic_order_share, lambda: kpis()['orders_by_traffic'], version, filters )
             st.plotly_chart( fig, use_container_width=True )
             
 
         with col2:
             
             st.markdown('### Traffic Order City')
-            fig = traffic_order_city( df1 )
+            fig = cached_figure( traffic_order_city, lambda: kpis()['orders_by_city_traffic'], version, filters )
             st.plotly_chart( fig, use_container_width=True )
             
     
-with tab2:
+elif view == 'Visão Estratégica':
+    # Granularidade dos gráficos: chaves de calendário inteiras (utils.calendar_dim)
+    granularity = st.radio( 'Granularidade', list( GRANULARITY_LABELS ), index=1,
+                            format_func=GRANULARITY_LABELS.get, horizontal=True )
+    df_periods = lazy( lambda: source.period_orders( granularity ) )
+    period_filters = dict( filters, granularity=granularity )
+
     with st.container():
         
-        st.markdown('## Orders by Week')
-        fig = orders_by_week( df1 ) 
+        st.markdown('## Orders by {}'.format( granularity.capitalize() ))
+        fig = cached_figure( orders_by_period, df_periods, version, period_filters )
         st.plotly_chart( fig, use_container_width=True)
         
     
     with st.container():
         
-        st.markdown('## Orders Share by Week')
-        fig = orders_share_by_week( df1 ) 
+        st.markdown('## Orders Share by {}'.format( granularity.capitalize() ))
+        fig = cached_figure( orders_share_by_period, df_periods, version, period_filters )
         st.plotly_chart( fig, use_container_width=True)
     
     
-with tab3: 
+elif view == 'Visão Geográfica':
     st.markdown('# County Maps')
-    fig = county_maps( df1 ) 
-    
-
-
+    # Área do mapa: o retângulo é consultado no índice espacial (utils.spatial),
+    # que só lê as linhas das células da área
+    spatial_index = source.spatial_index()
+    lat_min, lat_max, lon_min, lon_max = area_bounds( spatial_index )
+    col1, col2 = st.columns( 2 )
+    with col1:
+        lat_range = st.slider( 'Latitude', min_value=lat_min, max_value=lat_max, value=( lat_min, lat_max ), step=0.01 )
+    with col2:
+        lon_range = st.slider( 'Longitude', min_value=lon_min, max_value=lon_max, value=( lon_min, lon_max ), step=0.01 )
+
+    bbox = tuple( lat_range ) + tuple( lon_range )
+    area = None if bbox == ( lat_min, lat_max, lon_min, lon_max ) else bbox
+    map_data = source.rows if area is None else lambda: source.rows_in_bbox( area )
+
+    # O mapa é a seção mais cara da página: só é montado quando pedido
+    if deferred_section( 'Mostrar mapa' ):
+        map_filters = dict( filters, latitude=lat_range, longitude=lon_range )
+        fig = county_maps( map_data, ( version, normalize_filters( map_filters ) ), area )
+
+    st.markdown('### Restaurantes mais próximos do centro da área')
+    center = ( ( bbox[0] + bbox[1] ) / 2, ( bbox[2] + bbox[3] ) / 2 )
+    st.dataframe( nearest_restaurants( spatial_index, *center, k=5 ), use_container_width=True )
+
+# Posições vizinhas do slider de data calculadas em segundo plano (CURRY_PREFETCH)
+prefetch_neighbours( 'visao_empresa', filters )
+
+# Painel de profiling na barra lateral (só com o profiling ligado)
+profiling_panel()
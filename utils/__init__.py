@@ -0,0 +1,4 @@
+# ==================================
+# ===    Curry Company utils   =====
+# ==================================
+# Módulos compartilhados entre as páginas do dashboard.
@@ -0,0 +1,281 @@
+# ==================================
+# ===    Backend das páginas    =====
+# ==================================
+# Fonte dos dados das páginas, escolhida na inicialização do servidor:
+#     CURRY_BACKEND=pandas   (padrão) dataset em memória, cubo e índices dos filtros
+#     CURRY_BACKEND=duckdb   banco DuckDB embutido (utils.warehouse): as agregações
+#                            rodam em SQL e o dataset não é carregado em memória
+# As duas fontes retornam os mesmos resultados, no formato esperado pelas
+# funções de gráfico/tabela de utils.visao_*. Entregadores distintos (por
+# período e no total) vêm dos sketches por célula de utils.sketch nas duas. Se existe um store pré-calculado
+# (utils.precompute) para o dataset atual, os estados da grade são lidos dele
+# e a fonte ao vivo só é aberta para o resto (CURRY_PRECOMPUTED=0 desativa).
+# Consultas espaciais (área do mapa, restaurante mais próximo) usam o índice
+# em grade de utils.spatial nas duas fontes. Os resultados de cada estado dos
+# filtros ficam num cache do processo (CachedSource), preenchido também pelo
+# aquecimento e pelo prefetch de utils.warmup.
+import os
+
+from utils.cache import ByteLRU, result_bytes
+from utils.loader import DATASET_PATH, load_dataset, dataset_version
+from utils.cube import load_cube, filter_cube
+from utils.metrics import run_kpis
+from utils.ranking import top_bottom_k
+from utils.sketch import load_sketches, filter_cells, count_distinct
+from utils.filters import load_filter_index, apply_filters, select_positions
+from utils.spatial import load_spatial_index, query_bbox
+from utils.figure_cache import lazy
+from utils.precompute import load_precomputed, kpi_result, top_bottom_result, state_key
+import utils.visao_empresa as empresa
+import utils.visao_entregadores as entregadores
+
+BACKENDS = [ 'pandas', 'duckdb' ]
+BACKEND = os.environ.get( 'CURRY_BACKEND', 'pandas' ).lower()
+PRECOMPUTED = os.environ.get( 'CURRY_PRECOMPUTED', '1' ) != '0'
+
+# Orçamento (MB) dos resultados em cache por processo (0 desativa o cache)
+RESULT_CACHE_MB = int( os.environ.get( 'CURRY_RESULT_CACHE_MB', 64 ) )
+
+_results = ByteLRU( RESULT_CACHE_MB * 2**20, sizeof=result_bytes )
+
+
+class PandasSource:
+    """
+        Dataset em memória (load_dataset com as colunas da página): as linhas
+        são filtradas por utils.filters e os KPIs vêm do cubo pré-agregado.
+        `path` é o dataset (por padrão CURRY_DATASET).
+    """
+    def __init__( self, columns, date=None, traffic=None, weather=None, progress=None, path=DATASET_PATH ):
+        self.path = path
+        self.filters = { 'date': date, 'traffic': traffic, 'weather': weather }
+        df1 = load_dataset( path, columns=columns, progress=progress )
+        self._df1 = df1
+        # Só filtrado quando alguma seção usa as linhas
+        self._rows = lazy( lambda: apply_filters( df1, load_filter_index( path ), **self.filters ) )
+        self._cube = lazy( lambda: filter_cube( load_cube( path ), **self.filters ) )
+        self._cells = lazy( lambda: filter_cells( load_sketches( path ), **self.filters ) )
+
+    def rows( self ):
+        return self._rows()
+
+    def spatial_index( self ):
+        return load_spatial_index( self.path )
+
+    def rows_in_bbox( self, bbox ):
+        # Só as linhas das células do retângulo, e os filtros só nelas
+        positions = query_bbox( self.spatial_index(), bbox )
+        return self._df1.iloc[select_positions( load_filter_index( self.path ), positions, **self.filters )]
+
+    def kpis( self, kpis ):
+        return run_kpis( kpis, cube=self._cube() )
+
+    def period_orders( self, granularity='week' ):
+        return empresa.period_orders_sketch( self._cube(), load_sketches( self.path ), self._cells(), granularity )
+
+    def age_vehicle_metrics( self ):
+        return entregadores.age_vehicle_metrics( self.rows() )
+
+    def avg_ratings_by_delivery( self ):
+        return entregadores.avg_ratings_by_delivery( self.rows() )
+
+    def top_bottom_k( self, k, min_orders ):
+        return top_bottom_k( self.rows(), k=k, min_orders=min_orders )
+
+    def unique_deliveries( self ):
+        return count_distinct( load_sketches( self.path ), self._cells() )
+
+
+class DuckDBSource:
+    """
+        Banco DuckDB da versão atual do dataset: cada método é uma consulta
+        com os filtros da barra lateral como predicados. `path` é o dataset
+        (por padrão CURRY_DATASET).
+    """
+    def __init__( self, columns, date=None, traffic=None, weather=None, progress=None, path=DATASET_PATH ):
+        # Importado só neste backend: o duckdb não é necessário no backend pandas
+        from utils import warehouse
+
+        self.warehouse = warehouse
+        self.path = path
+        self.columns = list( columns )
+        self.filters = { 'date': date, 'traffic': traffic, 'weather': weather }
+        self.con = warehouse.load_database( path, progress=progress )
+        self._rows = lazy( lambda: warehouse.rows( self.con, self.columns, **self.filters ) )
+        self._cells = lazy( lambda: filter_cells( warehouse.load_sketches( path ), **self.filters ) )
+
+    def rows( self ):
+        return self._rows()
+
+    def spatial_index( self ):
+        return self.warehouse.load_spatial_index( self.path )
+
+    def rows_in_bbox( self, bbox ):
+        positions = query_bbox( self.spatial_index(), bbox )
+        return self.warehouse.rows_at( self.con, self.columns, positions, **self.filters )
+
+    def kpis( self, kpis ):
+        return self.warehouse.run_kpis( self.con, kpis, **self.filters )
+
+    def period_orders( self, granularity='week' ):
+        return empresa.period_orders_sketch( self.warehouse.orders_by_day( self.con, **self.filters ),
+                                             self.warehouse.load_sketches( self.path ), self._cells(), granularity )
+
+    def age_vehicle_metrics( self ):
+        return self.warehouse.age_vehicle_metrics( self.con, **self.filters )
+
+    def avg_ratings_by_delivery( self ):
+        return self.warehouse.avg_ratings_by_delivery( self.con, **self.filters )
+
+    def top_bottom_k( self, k, min_orders ):
+        return self.warehouse.top_bottom_k( self.con, k=k, min_orders=min_orders, **self.filters )
+
+    def unique_deliveries( self ):
+        return count_distinct( self.warehouse.load_sketches( self.path ), self._cells() )
+
+
+class PrecomputedSource:
+    """
+        Resultados do store pré-calculado para o estado atual dos filtros.
+        O que não está no store (estados fora da grade, rows()) vem da fonte
+        ao vivo, aberta só na primeira vez que é necessária.
+    """
+    def __init__( self, store, filters, live ):
+        self.store = store
+        self.filters = filters
+        self._live = lazy( live )
+
+    def _get( self, name ):
+        return self.store.get( name, self.filters )
+
+    def rows( self ):
+        return self._live().rows()
+
+    def spatial_index( self ):
+        return self._live().spatial_index()
+
+    def rows_in_bbox( self, bbox ):
+        return self._live().rows_in_bbox( bbox )
+
+    def kpis( self, kpis ):
+        frames = { kpi.name: self._get( kpi_result( kpi ) ) for kpi in kpis }
+        if any( df_kpi is None for df_kpi in frames.values() ):
+            return self._live().kpis( kpis )
+
+        return frames
+
+    def period_orders( self, granularity='week' ):
+        df_aux = self._get( 'period_orders.{}'.format( granularity ) )
+        return self._live().period_orders( granularity ) if df_aux is None else df_aux
+
+    def age_vehicle_metrics( self ):
+        df_aux = self._get( 'age_vehicle_metrics' )
+        if df_aux is None:
+            return self._live().age_vehicle_metrics()
+
+        # Coluna a coluna: a linha inteira (iloc[0]) converteria os tipos
+        return tuple( df_aux[col].iloc[0] for col in df_aux.columns )
+
+    def avg_ratings_by_delivery( self ):
+        df_aux = self._get( 'avg_ratings_by_delivery' )
+        return self._live().avg_ratings_by_delivery() if df_aux is None else df_aux
+
+    def top_bottom_k( self, k, min_orders ):
+        name = top_bottom_result( k, min_orders )
+        top, bottom = self._get( name + '.top' ), self._get( name + '.bottom' )
+        if top is None or bottom is None:
+            return self._live().top_bottom_k( k, min_orders )
+
+        return top, bottom
+
+    def unique_deliveries( self ):
+        df_aux = self._get( 'unique_deliveries' )
+        return self._live().unique_deliveries() if df_aux is None else int( df_aux.iloc[0, 0] )
+
+
+class CachedSource:
+    """
+        Resultados de `source` no cache do processo (LRU com orçamento em
+        bytes, compartilhado pelas sessões), por backend + versão do dataset
+        + estado dos filtros. As linhas e as consultas espaciais não entram
+        no cache: são views do dataset ou dependem da área do mapa. Os
+        resultados são compartilhados e não devem ser alterados.
+    """
+    def __init__( self, source, key ):
+        self.source = source
+        self.key = key
+
+    def _cached( self, name, compute ):
+        key = self.key + ( name, )
+        value = _results.get( key )
+        if value is None:
+            value = compute()
+            _results.put( key, value )
+
+        return value
+
+    def rows( self ):
+        return self.source.rows()
+
+    def spatial_index( self ):
+        return self.source.spatial_index()
+
+    def rows_in_bbox( self, bbox ):
+        return self.source.rows_in_bbox( bbox )
+
+    def kpis( self, kpis ):
+        name = ( 'kpis', ) + tuple( kpi_result( kpi ) for kpi in kpis )
+        return self._cached( name, lambda: self.source.kpis( kpis ) )
+
+    def period_orders( self, granularity='week' ):
+        return self._cached( ( 'period_orders', granularity ), lambda: self.source.period_orders( granularity ) )
+
+    def age_vehicle_metrics( self ):
+        return self._cached( ( 'age_vehicle_metrics', ), self.source.age_vehicle_metrics )
+
+    def avg_ratings_by_delivery( self ):
+        return self._cached( ( 'avg_ratings_by_delivery', ), self.source.avg_ratings_by_delivery )
+
+    def top_bottom_k( self, k, min_orders ):
+        return self._cached( ( top_bottom_result( k, min_orders ), ),
+                             lambda: self.source.top_bottom_k( k, min_orders ) )
+
+    def unique_deliveries( self ):
+        return self._cached( ( 'unique_deliveries', ), self.source.unique_deliveries )
+
+
+def result_cache_info():
+    """
+        Contadores e bytes do cache de resultados (ByteLRU.info).
+    """
+    return _results.info()
+
+
+def open_source( columns, date=None, traffic=None, weather=None, progress=None, backend=None, precomputed=None,
+                 cached=True ):
+    """
+        Fonte dos dados da página com os filtros da barra lateral, no backend
+        `backend` (por padrão CURRY_BACKEND).
+            - columns: colunas usadas pela página (rows() retorna só essas)
+            - progress: callback( fração, linhas ) da carga inicial
+            - precomputed: usa o store pré-calculado, se existir (por padrão
+              CURRY_PRECOMPUTED)
+            - cached: resultados pelo cache do processo (CachedSource), se
+              CURRY_RESULT_CACHE_MB > 0
+    """
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        raise ValueError( 'CURRY_BACKEND inválido: {!r} (opções: {})'.format( backend, ', '.join( BACKENDS ) ) )
+
+    source = DuckDBSource if backend == 'duckdb' else PandasSource
+    filters = { 'date': date, 'traffic': traffic, 'weather': weather }
+
+    def live():
+        return source( columns, progress=progress, **filters )
+
+    store = load_precomputed() if ( PRECOMPUTED if precomputed is None else precomputed ) else None
+    fonte = live() if store is None else PrecomputedSource( store, filters, live )
+
+    if not cached or RESULT_CACHE_MB <= 0:
+        return fonte
+
+    return CachedSource( fonte, ( backend, dataset_version(), state_key( filters ) ) )
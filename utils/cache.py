@@ -0,0 +1,85 @@
+# ==================================
+# ===    Cache LRU por bytes    =====
+# ==================================
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def result_bytes( value ):
+    """
+        Bytes aproximados de um resultado das páginas: DataFrames/Series
+        (memory_usage deep) e dicts/tuplas/listas deles; outros valores pelo
+        sys.getsizeof.
+    """
+    if isinstance( value, pd.DataFrame ):
+        return int( value.memory_usage( index=True, deep=True ).sum() )
+    if isinstance( value, pd.Series ):
+        return int( value.memory_usage( index=True, deep=True ) )
+    if isinstance( value, dict ):
+        return sys.getsizeof( value ) + sum( result_bytes( v ) for v in value.values() )
+    if isinstance( value, ( tuple, list ) ):
+        return sys.getsizeof( value ) + sum( result_bytes( v ) for v in value )
+
+    return sys.getsizeof( value )
+
+
+class ByteLRU:
+    """
+        Cache LRU thread-safe com orçamento em bytes. Por padrão para valores
+        str/bytes (json de figuras, html de mapas); `sizeof` mede outros
+        valores (ex.: result_bytes). Uma instância no nível do módulo é
+        compartilhada por todas as sessões do processo.
+    """
+
+    def __init__( self, max_bytes, sizeof=len ):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._items = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get( self, key ):
+        with self._lock:
+            value = self._items.get( key )
+            if value is None:
+                self._misses += 1
+                return None
+
+            self._items.move_to_end( key )
+            self._hits += 1
+            return value
+
+    def put( self, key, value ):
+        size = self.sizeof( value )
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if self._items.pop( key, None ) is not None:
+                self._bytes -= self._sizes.pop( key )
+
+            self._items[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+
+            # Remove os menos usados até caber no orçamento
+            while self._bytes > self.max_bytes:
+                evicted, _ = self._items.popitem( last=False )
+                self._bytes -= self._sizes.pop( evicted )
+
+    def info( self ):
+        with self._lock:
+            return { 'hits': self._hits, 'misses': self._misses,
+                     'items': len( self._items ), 'bytes': self._bytes, 'max_bytes': self.max_bytes }
+
+    def clear( self ):
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+            self._bytes = 0
@@ -0,0 +1,90 @@
+# ==================================
+# ===    Dimensão calendário    =====
+# ==================================
+# Chaves inteiras de calendário de Order_Date, calculadas na ingestão
+# (utils.loader.iter_clean_chunks) e gravadas junto com o dataset limpo:
+#     date_key   dia, AAAAMMDD
+#     iso_week   semana ISO, AAAAWW (ano ISO, segunda a domingo)
+#     month_key  mês, AAAAMM
+#     weekday    dia da semana, 0 = segunda
+# Os gráficos agregam por período (bucketize) com essas chaves: ordenar as
+# chaves é ordenar no tempo, e só os rótulos dos períodos viram texto.
+import numpy as np
+import pandas as pd
+
+CALENDAR_COLUMNS = [ 'date_key', 'iso_week', 'month_key', 'weekday' ]
+
+# Granularidades dos gráficos: coluna de calendário usada como chave
+GRANULARITIES = { 'day': 'date_key', 'week': 'iso_week', 'month': 'month_key' }
+
+
+def calendar_keys( dates ):
+    """
+        Chaves de calendário de cada data (arrays numpy, na ordem de `dates`).
+        As contas são feitas uma vez por dia distinto: o dataset tem milhares
+        de pedidos por dia.
+    """
+    codes, dias = pd.factorize( pd.DatetimeIndex( dates ).normalize() )
+    dias = pd.DatetimeIndex( dias )
+    iso = dias.isocalendar()
+
+    por_dia = { 'date_key': ( dias.year * 10000 + dias.month * 100 + dias.day ).to_numpy( dtype='int32' ),
+                'iso_week': ( iso['year'] * 100 + iso['week'] ).to_numpy( dtype='int32' ),
+                'month_key': ( dias.year * 100 + dias.month ).to_numpy( dtype='int32' ),
+                'weekday': dias.dayofweek.to_numpy( dtype='int8' ) }
+
+    return { col: valores[codes] for col, valores in por_dia.items() }
+
+
+def add_calendar( df1 ):
+    """
+        Retorna df1 com as colunas de CALENDAR_COLUMNS (um novo frame; df1
+        não é alterado). Frames que já têm as colunas voltam como estão.
+    """
+    if all( col in df1.columns for col in CALENDAR_COLUMNS ):
+        return df1
+
+    return df1.assign( **calendar_keys( df1['Order_Date'] ) )
+
+
+def bucket_keys( df_aux, granularity ):
+    """
+        Chave inteira do período de cada linha de df_aux: a coluna de
+        calendário, se o frame a tem, ou calculada a partir de Order_Date
+        (ex.: células do cubo e dos sketches).
+    """
+    col = GRANULARITIES[granularity]
+    if col in df_aux.columns:
+        return df_aux[col].to_numpy()
+
+    return calendar_keys( df_aux['Order_Date'] )[col]
+
+
+def bucket_labels( keys, granularity ):
+    """
+        Rótulos dos períodos ( '2022-03-14', '2022-W11', '2022-03' ), só
+        para as chaves distintas que vão para o gráfico.
+    """
+    keys = np.asarray( keys, dtype='int64' )
+    if granularity == 'day':
+        return [ '{:04d}-{:02d}-{:02d}'.format( k // 10000, k // 100 % 100, k % 100 ) for k in keys ]
+    if granularity == 'week':
+        return [ '{:04d}-W{:02d}'.format( k // 100, k % 100 ) for k in keys ]
+
+    return [ '{:04d}-{:02d}'.format( k // 100, k % 100 ) for k in keys ]
+
+
+def bucketize( df_aux, granularity, aggs ):
+    """
+        Agrega df_aux por período (`granularity`: 'day', 'week' ou 'month')
+        sem criar colunas nele (o frame pode ser uma view do dataset
+        compartilhado).
+            - aggs: { coluna: agregação } do groupby
+        Retorna um DataFrame com a coluna `granularity` (rótulo do período,
+        em ordem cronológica) e as colunas agregadas.
+    """
+    keys = pd.Series( bucket_keys( df_aux, granularity ), index=df_aux.index, name=granularity )
+    df_periodos = df_aux.loc[:, list( aggs )].groupby( keys, sort=True ).agg( aggs )
+    df_periodos.index = pd.Index( bucket_labels( df_periodos.index, granularity ), name=granularity, dtype=object )
+
+    return df_periodos.reset_index()
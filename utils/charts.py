@@ -0,0 +1,156 @@
+# ==================================
+# ===    Payload dos gráficos    =====
+# ==================================
+# O json de cada figura Plotly é enviado para cada navegador: séries longas
+# são reduzidas antes de desenhar e os valores são serializados compactos.
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# Teto de pontos por série temporal enviada ao navegador
+MAX_SERIES_POINTS = 1000
+
+# Acima desta quantidade de pontos, scatter/line usam traces WebGL (abaixo
+# de MAX_SERIES_POINTS: uma série reduzida ao teto ainda é desenhada em WebGL)
+WEBGL_THRESHOLD = 500
+
+# Casas decimais mantidas nos valores float das figuras
+FLOAT_DECIMALS = 4
+
+# Atributos numéricos das traces compactados por compact_figure
+_TRACE_ARRAYS = [ 'x', 'y', 'values' ]
+
+
+def _as_float( values ):
+    # Eixo x como número: datas viram int64 (ns), categorias viram a posição
+    values = np.asarray( values )
+    if np.issubdtype( values.dtype, np.datetime64 ):
+        return values.astype( 'datetime64[ns]' ).view( 'int64' ).astype( 'float64' )
+    if np.issubdtype( values.dtype, np.number ):
+        return values.astype( 'float64' )
+
+    return np.arange( len( values ), dtype='float64' )
+
+
+def lttb( x, y, n_out ):
+    """
+        Largest-Triangle-Three-Buckets: escolhe n_out pontos que preservam a
+        forma da série (picos e vales), sempre mantendo o primeiro e o último.
+        Retorna as posições escolhidas (ordenadas).
+    """
+    n = len( y )
+    if n_out >= n or n_out < 3:
+        return np.arange( n )
+
+    x = _as_float( x )
+    y = np.asarray( y, dtype='float64' )
+
+    # Limites dos n_out - 2 buckets internos
+    edges = np.linspace( 1, n - 1, n_out - 1 ).astype( 'int64' )
+
+    selecionados = np.empty( n_out, dtype='int64' )
+    selecionados[0] = 0
+    selecionados[-1] = n - 1
+
+    a = 0
+    for i in range( n_out - 2 ):
+        start, stop = edges[i], edges[i + 1]
+
+        # Média do bucket seguinte (ou o último ponto)
+        next_stop = edges[i + 2] if i + 2 < len( edges ) else n
+        avg_x = x[stop:next_stop].mean()
+        avg_y = y[stop:next_stop].mean()
+
+        # Ponto do bucket que forma o maior triângulo com o anterior e a média seguinte
+        area = np.abs( ( x[a] - avg_x ) * ( y[start:stop] - y[a] )
+                       - ( x[a] - x[start:stop] ) * ( avg_y - y[a] ) )
+        a = start + int( np.argmax( area ) )
+        selecionados[i + 1] = a
+
+    return selecionados
+
+
+def minmax_buckets( y, n_out ):
+    """
+        Divide a série em n_out / 2 buckets e mantém o mínimo e o máximo de
+        cada um: preserva todos os extremos, indicado para barras.
+        Retorna as posições escolhidas (ordenadas).
+    """
+    n = len( y )
+    if n_out >= n or n_out < 2:
+        return np.arange( n )
+
+    y = np.asarray( y, dtype='float64' )
+    edges = np.linspace( 0, n, n_out // 2 + 1 ).astype( 'int64' )
+
+    selecionados = []
+    for start, stop in zip( edges[:-1], edges[1:] ):
+        bucket = y[start:stop]
+        selecionados += [ start + int( np.argmin( bucket ) ), start + int( np.argmax( bucket ) ) ]
+
+    return np.unique( selecionados )
+
+
+def downsample( df_aux, x, y, max_points=MAX_SERIES_POINTS, method='lttb' ):
+    """
+        Reduz a série ( x, y ) de df_aux a no máximo max_points linhas:
+            - method='lttb': preserva a forma da curva (gráficos de linha)
+            - method='minmax': preserva mínimos e máximos (gráficos de barra)
+        Séries que já cabem no teto são retornadas sem alteração.
+    """
+    if len( df_aux ) <= max_points:
+        return df_aux
+
+    if method == 'minmax':
+        posicoes = minmax_buckets( df_aux[y].to_numpy(), max_points )
+    else:
+        posicoes = lttb( df_aux[x].to_numpy(), df_aux[y].to_numpy(), max_points )
+
+    return df_aux.iloc[posicoes]
+
+
+def render_mode( n_points, threshold=WEBGL_THRESHOLD ):
+    """
+        render_mode do plotly express: 'webgl' acima do limite de pontos.
+        Em séries reduzidas por downsample, usar a quantidade de pontos de
+        antes da redução.
+    """
+    return 'webgl' if n_points > threshold else 'svg'
+
+
+def _compact( values, decimals ):
+    # Floats arredondados e datas sem hora (00:00:00) como 'YYYY-MM-DD'
+    if not isinstance( values, np.ndarray ):
+        return values
+
+    if np.issubdtype( values.dtype, np.floating ):
+        return np.round( values, decimals )
+
+    # O plotly guarda datas como datetime64 ou como array de objetos datetime
+    if np.issubdtype( values.dtype, np.datetime64 ) or ( len( values ) and isinstance( values[0], datetime.datetime ) ):
+        datas = pd.DatetimeIndex( values )
+        if ( datas == datas.normalize() ).all():
+            return np.asarray( datas.strftime( '%Y-%m-%d' ), dtype=object )
+
+    return values
+
+
+def compact_figure( fig, decimals=FLOAT_DECIMALS ):
+    """
+        Compacta os valores das traces da figura antes da serialização:
+            - floats arredondados a `decimals` casas
+            - datas sem hora enviadas como 'YYYY-MM-DD'
+            - marker.size numérico também arredondado
+        A figura é alterada no lugar e retornada.
+    """
+    for trace in fig.data:
+        for attr in _TRACE_ARRAYS:
+            if attr in trace:
+                trace[attr] = _compact( trace[attr], decimals )
+
+        marker = trace['marker'] if 'marker' in trace else None
+        if marker is not None and 'size' in marker and marker.size is not None:
+            marker.size = _compact( marker.size, decimals )
+
+    return fig
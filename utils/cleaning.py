@@ -0,0 +1,98 @@
+# ==================================
+# ===    Data Cleaning    =====
+# ==================================
+import numpy as np
+import pandas as pd
+
+# Sentinela usado no csv original para valores ausentes
+NAN_SENTINEL = 'NaN '
+
+# Colunas cujas linhas com o sentinela são eliminadas
+NAN_COLUMNS = [ 'Delivery_person_Age', 'Road_traffic_density', 'City', 'Festival', 'multiple_deliveries' ]
+
+# Colunas de texto com espaços sobrando
+STRIP_COLUMNS = [ 'ID', 'Delivery_person_ID', 'Road_traffic_density', 'Type_of_order',
+                  'Type_of_vehicle', 'Festival', 'City' ]
+
+# Linhas olhadas para decidir se uma coluna de texto tem valores repetidos
+# o bastante para limpar cada valor distinto uma vez só (_per_value)
+DISTINCT_SAMPLE = 10000
+
+# Argumentos do read_csv para tratar o sentinela como NA já na leitura:
+# as colunas numéricas chegam como float e não como texto
+READ_CSV_KWARGS = { 'na_values': { col: NAN_SENTINEL for col in NAN_COLUMNS + [ 'Delivery_person_Ratings' ] } }
+
+
+def _valid( coluna ):
+    # Válido = nem NA (lido com READ_CSV_KWARGS) nem o sentinela (lido como texto)
+    linhas = coluna.notna()
+    if not pd.api.types.is_numeric_dtype( coluna ):
+        linhas = linhas & ( coluna != NAN_SENTINEL )
+
+    return linhas.to_numpy()
+
+
+def _to_number( coluna ):
+    if pd.api.types.is_numeric_dtype( coluna ):
+        return coluna
+
+    return coluna.mask( coluna == NAN_SENTINEL ).astype( 'float64' )
+
+
+def _per_value( coluna, funcao ):
+    # funcao( Index de valores distintos ) aplicada uma vez por valor, e não
+    # por linha: os códigos do factorize levam o resultado de volta às
+    # linhas (código -1 = NA, que continua NA). Colunas quase sem repetição
+    # (ex.: ID) não ganham nada com o factorize e vão direto.
+    amostra = coluna.iloc[:DISTINCT_SAMPLE]
+    if amostra.nunique() > len( amostra ) / 2:
+        return funcao( coluna )
+
+    codes, uniques = pd.factorize( coluna )
+    valores = np.append( funcao( uniques ).to_numpy( dtype=object ), np.nan )
+
+    return pd.Series( valores[codes], index=coluna.index, name=coluna.name )
+
+
+def clean_code( df1 ):
+    """
+        Esta função realiza o data cleaning do dataset:
+            1. Elimina, com uma única máscara e uma única cópia, as linhas com NaN
+               nas colunas Delivery_person_Age, Road_traffic_density, City,
+               Festival e multiple_deliveries
+            2. Converte os tipos das colunas Delivery_person_Age, Delivery_person_Ratings
+               e multiple_deliveries
+            3. Converte a coluna Order Date
+            4. Removendo os espaços de texto/string/objec com strip
+            5. Limpa a coluna de Time taken ('(min) NN' -> NN)
+
+        Aceita tanto o csv lido com pd.read_csv( path ) quanto com
+        pd.read_csv( path, **READ_CSV_KWARGS ); o resultado é o mesmo.
+    """
+    # 1. Máscara única de linhas válidas
+    linhas_selecionadas = np.ones( len( df1 ), dtype=bool )
+    for col in NAN_COLUMNS:
+        linhas_selecionadas &= _valid( df1[col] )
+
+    # Cada coluna é copiada uma vez, só com as linhas válidas, e o frame é
+    # montado no fim (sem substituir coluna a coluna dentro dos blocos do pandas)
+    posicoes = np.flatnonzero( linhas_selecionadas )
+    df_aux = { col: df1[col].take( posicoes ) for col in df1.columns }
+
+    # 2. Convertendo as colunas numéricas
+    df_aux['Delivery_person_Age'] = _to_number( df_aux['Delivery_person_Age'] ).astype( 'int64' )
+    df_aux['Delivery_person_Ratings'] = _to_number( df_aux['Delivery_person_Ratings'] ).astype( 'float' )
+    df_aux['multiple_deliveries'] = _to_number( df_aux['multiple_deliveries'] ).astype( 'int' )
+
+    # 3. Convertendo a coluna Order Date
+    df_aux['Order_Date'] = pd.to_datetime( df_aux['Order_Date'], format='%d-%m-%Y' )
+
+    # 4. Removendo os espaços de texto/string/objec com strip (uma vez por valor distinto)
+    for col in STRIP_COLUMNS:
+        df_aux[col] = _per_value( df_aux[col], lambda valores: valores.str.strip() )
+
+    # 5. Limpando a coluna de Time taken
+    df_aux['Time_taken(min)'] = _per_value( df_aux['Time_taken(min)'],
+                                            lambda valores: valores.str.replace( '(min) ', '', regex=False ) ).astype( int )
+
+    return pd.DataFrame( df_aux, index=df1.index[posicoes] )
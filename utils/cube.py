@@ -0,0 +1,158 @@
+# ==================================
+# ===    Cubo pré-agregado    =====
+# ==================================
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.loader import DATASET_PATH, load_dataset, load_derived, dataset_version
+from utils.profiling import timed
+from utils.schema import compact, plain
+from utils.snapshot import read_arrow, snapshot_path, publish_snapshot
+from utils.store import is_store, read_manifest
+
+CUBE_DIMENSIONS = [ 'Order_Date', 'City', 'Road_traffic_density', 'Weatherconditions',
+                    'Festival', 'Type_of_order', 'Type_of_vehicle' ]
+
+CUBE_MEASURES = [ 'Time_taken(min)', 'Delivery_person_Ratings', 'distance_km' ]
+
+
+def build_cube( df1, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES ):
+    """
+        Esta função agrega o dataset limpo em células de `dimensions`
+        (por padrão CUBE_DIMENSIONS). Cada célula guarda:
+            - orders: quantidade de pedidos
+            - <medida>_count, _sum, _sumsq, _min, _max para cada uma das
+              `measures` (count/sum/sumsq ignoram NaN)
+        Contagem, soma e soma dos quadrados são somáveis entre células, então
+        qualquer filtro/agrupamento das páginas é respondido a partir do cubo.
+    """
+    dimensions = list( dimensions )
+    measures = list( measures )
+
+    # Medidas compactas (int8/int16, utils.schema) acumulam em 64 bits: sem
+    # overflow nas somas e nos quadrados
+    valores = { col: df1[col].astype( 'int64' if pd.api.types.is_integer_dtype( df1[col] ) else 'float64' )
+                for col in measures }
+    df_aux = df1.loc[:, dimensions].assign( **valores, **{ col + '_sq': valores[col] ** 2 for col in measures } )
+
+    aggs = { 'orders': ( dimensions[0], 'size' ) }
+    for col in measures:
+        aggs[col + '_count'] = ( col, 'count' )
+        aggs[col + '_sum'] = ( col, 'sum' )
+        aggs[col + '_sumsq'] = ( col + '_sq', 'sum' )
+        aggs[col + '_min'] = ( col, 'min' )
+        aggs[col + '_max'] = ( col, 'max' )
+
+    cube = df_aux.groupby( dimensions, sort=True, observed=True ).agg( **aggs ).reset_index()
+
+    return cube
+
+
+def _merge_func( col ):
+    # Como combinar uma coluna de células: min/max se preservam, o resto soma
+    if col.endswith( '_min' ):
+        return 'min'
+    if col.endswith( '_max' ):
+        return 'max'
+    return 'sum'
+
+
+def merge_cubes( *cubes ):
+    """
+        Combina cubos de lotes diferentes em um único cubo (células com as
+        mesmas dimensões são somadas).
+    """
+    df_aux = pd.concat( cubes, ignore_index=True )
+    aggs = { col: _merge_func( col ) for col in df_aux.columns if col not in CUBE_DIMENSIONS }
+
+    return df_aux.groupby( CUBE_DIMENSIONS, sort=True, observed=True ).agg( aggs ).reset_index()
+
+
+def load_cube( path=DATASET_PATH ):
+    """
+        Cubo da versão atual do dataset, publicado uma única vez como snapshot
+        compartilhado entre os processos (utils.snapshot). Para um store
+        (utils.ingest) usa o cubo mantido incrementalmente.
+    """
+    def build():
+        if is_store( path ):
+            manifest = read_manifest( path )
+            if manifest.get( 'cube' ):
+                # Dimensões com os mesmos tipos do cubo construído do dataset compacto
+                return compact( read_arrow( os.path.join( path, manifest['cube'] ) ) )
+
+        return build_cube( load_dataset( path, CUBE_DIMENSIONS + CUBE_MEASURES ) )
+
+    return load_derived( 'cube', lambda: publish_snapshot( snapshot_path( dataset_version( path ), name='cube' ),
+                                                           build, source=path ),
+                         path=path )
+
+
+@timed( 'filter' )
+def filter_cube( cube, date=None, traffic=None, weather=None ):
+    """
+        Aplica os filtros da barra lateral sobre as células do cubo:
+            - date: mantém Order_Date < date
+            - traffic: lista de Road_traffic_density
+            - weather: lista de Weatherconditions
+    """
+    linhas_selecionadas = np.ones( len( cube ), dtype=bool )
+
+    if date is not None:
+        linhas_selecionadas &= ( cube['Order_Date'] < date ).to_numpy()
+
+    if traffic is not None:
+        linhas_selecionadas &= cube['Road_traffic_density'].isin( traffic ).to_numpy()
+
+    if weather is not None:
+        linhas_selecionadas &= cube['Weatherconditions'].isin( weather ).to_numpy()
+
+    return cube.loc[linhas_selecionadas, :]
+
+
+def regroup( cube, by, measures=() ):
+    """
+        Reagrupa as células do cubo pelas dimensões `by` (lista, pode ser
+        vazia), mantendo orders e os acumuladores de `measures`. O resultado
+        continua sendo um cubo.
+    """
+    cols = [ 'orders' ]
+    for measure in measures:
+        cols += [ measure + sufixo for sufixo in ( '_count', '_sum', '_sumsq', '_min', '_max' ) ]
+
+    aggs = { col: _merge_func( col ) for col in cols }
+
+    if by:
+        return cube.groupby( list( by ), sort=True, observed=True ).agg( aggs ).reset_index()
+
+    return pd.DataFrame( [ { col: cube[col].agg( func ) for col, func in aggs.items() } ] )
+
+
+def rollup( cube, by, measure=None ):
+    """
+        Reagrupa as células do cubo pelas dimensões `by`.
+            - Sem measure: retorna `by` + orders
+            - Com measure: retorna também count, mean, std (ddof=1, como o
+              pandas), min e max da medida
+    """
+    df_aux = regroup( cube, by, [ measure ] if measure is not None else [] )
+
+    # Resultado pequeno: dimensões categóricas voltam a ser texto
+    df_aux = plain( df_aux, by )
+
+    if measure is None:
+        return df_aux
+
+    n = df_aux[measure + '_count']
+    total = df_aux[measure + '_sum']
+    var = ( df_aux[measure + '_sumsq'] - total ** 2 / n ) / ( n - 1 )
+
+    df_aux['count'] = n
+    df_aux['mean'] = total / n
+    df_aux['std'] = np.sqrt( var.clip( lower=0 ).where( n > 1 ) )
+    df_aux['min'] = df_aux[measure + '_min']
+    df_aux['max'] = df_aux[measure + '_max']
+
+    return df_aux.loc[:, list( by ) + [ 'orders', 'count', 'mean', 'std', 'min', 'max' ]]
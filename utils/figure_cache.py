@@ -0,0 +1,77 @@
+# ==================================
+# ===    Cache de figuras    =====
+# ==================================
+import os
+import datetime
+
+import plotly.io as pio
+
+from utils.cache import ByteLRU
+from utils.charts import compact_figure
+from utils.profiling import span
+
+# Orçamento (MB) do json das figuras em cache, compartilhado por todas as sessões
+FIGURE_CACHE_MB = int( os.environ.get( 'CURRY_FIGURE_CACHE_MB', 64 ) )
+
+_figures = ByteLRU( FIGURE_CACHE_MB * 2**20 )
+
+
+def normalize_filters( filters ):
+    """
+        Converte o estado dos filtros em uma tupla estável e hashable: listas
+        viram tuplas ordenadas e datas viram texto ISO.
+    """
+    def _normalize( value ):
+        if isinstance( value, ( list, tuple, set ) ):
+            return tuple( sorted( value ) )
+        if isinstance( value, ( datetime.date, datetime.datetime ) ):
+            return value.isoformat()
+        return value
+
+    return tuple( sorted( ( name, _normalize( value ) ) for name, value in filters.items() ) )
+
+
+def cached_figure( fn, data, version, filters ):
+    """
+        Esta função memoiza figuras Plotly:
+            - fn: função que recebe os dados e retorna a figura
+            - data: função sem argumentos que retorna os dados de fn; só é
+              chamada quando a figura não está em cache
+            - version: versão do dataset (utils.loader.dataset_version)
+            - filters: dict com o estado dos filtros que afetam a figura
+        A figura é compactada (utils.charts.compact_figure) e guardada como
+        json em um LRU com orçamento em bytes.
+    """
+    key = ( fn.__module__, fn.__qualname__, version, normalize_filters( filters ) )
+
+    fig_json = _figures.get( key )
+    if fig_json is not None:
+        with span( 'render' ):
+            return pio.from_json( fig_json )
+
+    # data() (ex.: KPIs) fica fora do span de render: tem seus próprios spans
+    dados = data()
+    with span( 'render' ):
+        fig = compact_figure( fn( dados ) )
+        _figures.put( key, fig.to_json() )
+
+    return fig
+
+
+def lazy( fn ):
+    """
+        Retorna uma função sem argumentos que chama fn() uma única vez, na
+        primeira chamada (ex.: KPIs que só são necessários em caso de miss).
+    """
+    result = []
+
+    def _call():
+        if not result:
+            result.append( fn() )
+        return result[0]
+
+    return _call
+
+
+def cache_info():
+    return _figures.info()
@@ -0,0 +1,105 @@
+# ==================================
+# ===    Filtros da barra lateral    =====
+# ==================================
+import numpy as np
+import pandas as pd
+
+from utils.loader import DATASET_PATH, load_dataset, load_derived
+from utils.profiling import timed
+
+# Colunas de baixa cardinalidade filtradas pelos multiselects
+FILTER_COLUMNS = [ 'Road_traffic_density', 'Weatherconditions' ]
+
+
+def build_filter_index( df1 ):
+    """
+        Esta função monta o índice dos filtros sobre o dataset ordenado por
+        Order_Date (utils.loader.sort_by_date):
+            - dates: array ordenado de Order_Date, para busca binária
+            - <coluna>: { valor: bitmap (np.packbits) das linhas com o valor }
+    """
+    index = { 'rows': len( df1 ), 'dates': df1['Order_Date'].to_numpy() }
+
+    for col in FILTER_COLUMNS:
+        codes, uniques = pd.factorize( df1[col] )
+        index[col] = { valor: np.packbits( codes == i ) for i, valor in enumerate( uniques ) }
+
+    return index
+
+
+def load_filter_index( path=DATASET_PATH ):
+    """
+        Índice dos filtros da versão atual do dataset, construído uma vez por processo.
+    """
+    return load_derived( 'filter_index',
+                         lambda: build_filter_index( load_dataset( path, [ 'Order_Date' ] + FILTER_COLUMNS ) ),
+                         path=path )
+
+
+def _bitmap( bitmaps, values ):
+    # OR dos bitmaps dos valores selecionados; None = todos os valores selecionados
+    if set( bitmaps ) <= set( values ):
+        return None
+
+    selecionados = [ bitmaps[valor] for valor in values if valor in bitmaps ]
+    if not selecionados:
+        return np.zeros_like( next( iter( bitmaps.values() ) ) )
+
+    return np.bitwise_or.reduce( selecionados )
+
+
+@timed( 'filter' )
+def apply_filters( df1, index, date=None, traffic=None, weather=None ):
+    """
+        Aplica os filtros da barra lateral a um frame carregado com
+        load_dataset (mesma ordem de linhas do índice):
+            - date: Order_Date < date, por busca binária e fatia sem cópia
+            - traffic / weather: AND dos bitmaps dos valores selecionados
+        Com todos os valores de trânsito/clima selecionados (o padrão), o
+        resultado é uma view do frame compartilhado, sem cópia. O frame
+        retornado não deve ser alterado.
+    """
+    stop = len( df1 )
+    if date is not None:
+        stop = int( np.searchsorted( index['dates'], pd.Timestamp( date ).to_datetime64(), side='left' ) )
+
+    mask = None
+    for col, values in zip( FILTER_COLUMNS, ( traffic, weather ) ):
+        if values is None:
+            continue
+
+        bitmap = _bitmap( index[col], values )
+        if bitmap is not None:
+            mask = bitmap if mask is None else mask & bitmap
+
+    if mask is None:
+        return df1.iloc[:stop]
+
+    linhas_selecionadas = np.unpackbits( mask[: ( stop + 7 ) // 8], count=stop ).view( bool )
+
+    return df1.iloc[np.flatnonzero( linhas_selecionadas )]
+
+
+@timed( 'filter' )
+def select_positions( index, positions, date=None, traffic=None, weather=None ):
+    """
+        Mesmos filtros de apply_filters, aplicados só às linhas `positions`
+        (posições ordenadas no dataset, ex.: as de uma consulta espacial):
+        o custo é proporcional às posições, e não ao dataset.
+    """
+    positions = np.asarray( positions )
+    if date is not None:
+        stop = int( np.searchsorted( index['dates'], pd.Timestamp( date ).to_datetime64(), side='left' ) )
+        positions = positions[: int( np.searchsorted( positions, stop, side='left' ) )]
+
+    for col, values in zip( FILTER_COLUMNS, ( traffic, weather ) ):
+        if values is None:
+            continue
+
+        bitmap = _bitmap( index[col], values )
+        if bitmap is not None:
+            # Bit de cada posição no bitmap (np.packbits: bit mais alto primeiro)
+            bits = ( bitmap[positions >> 3] >> ( 7 - ( positions & 7 ) ).astype( np.uint8 ) ) & 1
+            positions = positions[bits.astype( bool )]
+
+    return positions
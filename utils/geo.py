@@ -0,0 +1,154 @@
+# ==================================
+# ===    Distâncias    =====
+# ==================================
+import numpy as np
+
+# Mesmo raio médio da Terra usado pelo pacote haversine
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km( lat1, lon1, lat2, lon2 ):
+    """
+        Distância de grande círculo (km) vetorizada: recebe arrays/Series de
+        coordenadas em graus e devolve um array numpy.
+    """
+    lat1, lon1, lat2, lon2 = ( np.radians( np.asarray( x, dtype='float64' ) ) for x in ( lat1, lon1, lat2, lon2 ) )
+
+    a = ( np.sin( ( lat2 - lat1 ) / 2 ) ** 2
+          + np.cos( lat1 ) * np.cos( lat2 ) * np.sin( ( lon2 - lon1 ) / 2 ) ** 2 )
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin( np.sqrt( a ) )
+
+
+def restaurant_location( df1 ):
+    """
+        Coordenadas dos restaurantes ( lat, lon ) como arrays numpy, com os
+        erros de sinal do dataset corrigidos (valor absoluto: todas as
+        entregas estão no hemisfério norte/leste). Coordenada zerada = sem
+        localização.
+    """
+    return df1['Restaurant_latitude'].abs().to_numpy(), df1['Restaurant_longitude'].abs().to_numpy()
+
+
+def add_distance( df1 ):
+    """
+        Adiciona a coluna distance_km (restaurante -> local de entrega).
+            - Latitudes/longitudes negativas do restaurante são erros de sinal
+              no dataset (todas as entregas estão no hemisfério norte/leste) e
+              são corrigidas com o valor absoluto.
+            - Restaurantes com coordenada zerada não têm localização: a
+              distância fica NaN e não entra nas médias.
+    """
+    rest_lat, rest_lon = restaurant_location( df1 )
+
+    distance = haversine_km( rest_lat, rest_lon,
+                             df1['Delivery_location_latitude'].to_numpy(),
+                             df1['Delivery_location_longitude'].to_numpy() )
+    distance[ ( rest_lat == 0 ) | ( rest_lon == 0 ) ] = np.nan
+
+    df1['distance_km'] = distance
+
+    return df1
+
+
+# ==================================
+# ===    Grade geográfica    =====
+# ==================================
+# Cada coordenada recebe na ingestão a chave inteira da sua célula numa grade
+# regular de 2**GRID_BITS x 2**GRID_BITS células sobre o globo: os bits de
+# longitude e latitude intercalados, a longitude primeiro, como no geohash
+# (com 15 bits por eixo a chave tem os mesmos 30 bits de um geohash de 6
+# caracteres, células de ~1,2 x 0,6 km). Células próximas têm chaves
+# próximas, e a célula de um nível mais grosso é um prefixo da chave
+# (key >> 2 por nível): a célula grossa é um intervalo contíguo de chaves.
+GRID_BITS = 15
+
+# Colunas de célula gravadas junto com o dataset limpo (-1 = sem localização)
+GEOCELL_COLUMNS = [ 'restaurant_cell', 'delivery_cell' ]
+
+
+def grid_xy( lat, lon, bits=GRID_BITS ):
+    """
+        Coluna ( x, longitude ) e linha ( y, latitude ) da grade de cada
+        coordenada, como arrays int64.
+    """
+    cells = 1 << bits
+    lat = np.asarray( lat, dtype='float64' )
+    lon = np.asarray( lon, dtype='float64' )
+
+    x = np.clip( np.floor( ( lon + 180.0 ) / 360.0 * cells ), 0, cells - 1 ).astype( 'int64' )
+    y = np.clip( np.floor( ( lat + 90.0 ) / 180.0 * cells ), 0, cells - 1 ).astype( 'int64' )
+
+    return x, y
+
+
+def _spread( v ):
+    # Espalha os 16 bits baixos de v nas posições pares (bit i -> bit 2i)
+    v = np.asarray( v, dtype='int64' ) & 0xFFFF
+    v = ( v | ( v << 8 ) ) & 0x00FF00FF
+    v = ( v | ( v << 4 ) ) & 0x0F0F0F0F
+    v = ( v | ( v << 2 ) ) & 0x33333333
+    return ( v | ( v << 1 ) ) & 0x55555555
+
+
+def _squeeze( v ):
+    # Inversa de _spread: junta os bits das posições pares
+    v = np.asarray( v, dtype='int64' ) & 0x55555555
+    v = ( v | ( v >> 1 ) ) & 0x33333333
+    v = ( v | ( v >> 2 ) ) & 0x0F0F0F0F
+    v = ( v | ( v >> 4 ) ) & 0x00FF00FF
+    return ( v | ( v >> 8 ) ) & 0xFFFF
+
+
+def interleave( x, y ):
+    """
+        Chave da célula ( x, y ): bits de x (longitude) nas posições ímpares
+        e de y (latitude) nas pares.
+    """
+    return ( _spread( x ) << 1 ) | _spread( y )
+
+
+def deinterleave( keys ):
+    """
+        Inversa de interleave: retorna ( x, y ).
+    """
+    keys = np.asarray( keys, dtype='int64' )
+    return _squeeze( keys >> 1 ), _squeeze( keys )
+
+
+def cell_keys( lat, lon, bits=GRID_BITS ):
+    """
+        Chave (int32) da célula de cada coordenada; coordenadas nulas ou
+        zeradas (sem localização) recebem -1.
+    """
+    lat = np.asarray( lat, dtype='float64' )
+    lon = np.asarray( lon, dtype='float64' )
+
+    keys = interleave( *grid_xy( lat, lon, bits ) )
+    sem_local = np.isnan( lat ) | np.isnan( lon ) | ( lat == 0 ) | ( lon == 0 )
+
+    return np.where( sem_local, -1, keys ).astype( 'int32' )
+
+
+def cell_center( keys, level=GRID_BITS ):
+    """
+        Centro ( lat, lon ) das células `keys` do nível `level` (bits por
+        eixo; level < GRID_BITS é uma célula mais grossa, key >> 2 por nível).
+    """
+    x, y = deinterleave( keys )
+    cells = 1 << level
+
+    return ( y + 0.5 ) * 180.0 / cells - 90.0, ( x + 0.5 ) * 360.0 / cells - 180.0
+
+
+def add_geocells( df1 ):
+    """
+        Retorna df1 com as colunas de GEOCELL_COLUMNS (um novo frame; df1
+        não é alterado). Frames que já têm as colunas voltam como estão.
+    """
+    if all( col in df1.columns for col in GEOCELL_COLUMNS ):
+        return df1
+
+    return df1.assign( restaurant_cell=cell_keys( *restaurant_location( df1 ) ),
+                       delivery_cell=cell_keys( df1['Delivery_location_latitude'],
+                                                df1['Delivery_location_longitude'] ) )
@@ -0,0 +1,164 @@
+# ==================================
+# ===    Ingestão incremental    =====
+# ==================================
+# Uso:
+#     python -m utils.ingest dataset/train.csv            (cria o store)
+#     python -m utils.ingest dataset/pedidos_2022-04-07.csv (acrescenta um lote)
+#
+# O dashboard lê o store quando CURRY_DATASET aponta para o diretório.
+# Apenas um processo de ingestão deve escrever no store por vez.
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from utils.cube import build_cube, merge_cubes
+from utils.loader import MAX_MEMORY_MB, iter_clean_chunks, read_clean
+from utils.snapshot import read_arrow, write_arrow
+from utils.store import read_manifest, write_manifest
+
+STORE_DIR = os.environ.get( 'CURRY_STORE', 'dataset/store' )
+
+
+def hash_ids( ids ):
+    """
+        Hash (uint64) dos IDs dos pedidos, usado na deduplicação.
+    """
+    return pd.util.hash_pandas_object( ids, index=False ).to_numpy()
+
+
+def _known( sorted_hashes, hashes ):
+    # Busca binária dos hashes do lote nos hashes já gravados
+    if len( sorted_hashes ) == 0:
+        return np.zeros( len( hashes ), dtype=bool )
+
+    pos = np.searchsorted( sorted_hashes, hashes ).clip( max=len( sorted_hashes ) - 1 )
+
+    return sorted_hashes[pos] == hashes
+
+
+def id_files( manifest ):
+    """
+        Arquivos de hashes dos IDs do store, um por parte. Stores antigos
+        têm um único arquivo com todos os hashes.
+    """
+    ids = manifest['ids'] or []
+
+    return [ ids ] if isinstance( ids, str ) else ids
+
+
+def known_ids( store_dir, manifest, hashes ):
+    """
+        Máscara dos `hashes` já gravados no store: busca binária em cada
+        arquivo de hashes (via memory-map, só as páginas visitadas são lidas).
+    """
+    known = np.zeros( len( hashes ), dtype=bool )
+    for name in id_files( manifest ):
+        known |= _known( np.load( os.path.join( store_dir, name ), mmap_mode='r' ), hashes )
+
+    return known
+
+
+def _save_ids( path, hashes ):
+    tmp_path = '{}.tmp-{}'.format( path, os.getpid() )
+    with open( tmp_path, 'wb' ) as f:
+        np.save( f, hashes )
+    os.replace( tmp_path, path )
+
+
+def append_batch( batch, store_dir=STORE_DIR ):
+    """
+        Esta função acrescenta um lote já limpo (read_clean) ao store:
+            1. Remove IDs repetidos no lote e IDs que já estão no store
+            2. Grava as linhas novas como uma nova parte, com os hashes dos
+               IDs dela num arquivo próprio
+            3. Atualiza o cubo somando o cubo do lote ao cubo existente
+            4. Publica a nova versão do manifesto
+        O custo é proporcional ao tamanho do lote, não ao histórico.
+        Retorna o manifesto resultante.
+    """
+    manifest = read_manifest( store_dir )
+    os.makedirs( store_dir, exist_ok=True )
+
+    # 1. Deduplicação por ID
+    batch = batch.drop_duplicates( 'ID', keep='first' )
+    hashes = hash_ids( batch['ID'] )
+
+    linhas_novas = ~known_ids( store_dir, manifest, hashes )
+    batch = batch.loc[linhas_novas, :]
+    if batch.empty:
+        return manifest
+
+    version = manifest['version'] + 1
+
+    # 2. Nova parte com as linhas do lote
+    part = 'part-{:05d}.arrow'.format( len( manifest['parts'] ) )
+    write_arrow( batch.reset_index( drop=True ), os.path.join( store_dir, part ), preserve_index=False )
+
+    # Hashes só das linhas novas, ao lado da parte: o histórico não é relido nem regravado
+    ids = 'ids-{:05d}.npy'.format( len( manifest['parts'] ) )
+    _save_ids( os.path.join( store_dir, ids ), np.sort( hashes[linhas_novas] ) )
+
+    # 3. Cubo incremental: contagens, somas e somas dos quadrados são somáveis
+    cube = build_cube( batch )
+    if manifest['cube']:
+        cube = merge_cubes( read_arrow( os.path.join( store_dir, manifest['cube'] ) ), cube )
+
+    cube_name = 'cube-v{}.arrow'.format( version )
+    write_arrow( cube, os.path.join( store_dir, cube_name ), preserve_index=False )
+
+    # 4. Publicação
+    old_cube = manifest['cube']
+    manifest = { 'version': version,
+                 'rows': manifest['rows'] + len( batch ),
+                 'parts': manifest['parts'] + [ part ],
+                 'ids': id_files( manifest ) + [ ids ],
+                 'cube': cube_name }
+    write_manifest( store_dir, manifest )
+
+    if old_cube:
+        os.remove( os.path.join( store_dir, old_cube ) )
+
+    return manifest
+
+
+def ingest_csv( csv_path, store_dir=STORE_DIR ):
+    """
+        Limpa um csv no esquema do train.csv e acrescenta ao store.
+    """
+    return append_batch( read_clean( csv_path ), store_dir )
+
+
+def stream_ingest( csv_path, store_dir=STORE_DIR, chunksize=None, max_memory_mb=MAX_MEMORY_MB, progress=None ):
+    """
+        Ingestão com memória limitada para csvs muito grandes: cada chunk é
+        limpo e acrescentado ao store (nova parte + cubo incremental) antes de
+        ler o próximo, então o pico de memória é ~max_memory_mb mais o cubo
+        (os hashes de IDs gravados são consultados via memory-map).
+    """
+    manifest = read_manifest( store_dir )
+    for df1 in iter_clean_chunks( csv_path, chunksize, max_memory_mb, progress ):
+        manifest = append_batch( df1, store_dir )
+
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser( description='Acrescenta lotes de pedidos ao store do dashboard.' )
+    parser.add_argument( 'csv', nargs='+', help='arquivos csv no esquema do train.csv' )
+    parser.add_argument( '--store', default=STORE_DIR, help='diretório do store (padrão: %(default)s)' )
+    parser.add_argument( '--max-memory-mb', type=int, default=None,
+                         help='lê o csv em chunks com este teto de memória (MB)' )
+    args = parser.parse_args()
+
+    for csv_path in args.csv:
+        if args.max_memory_mb:
+            manifest = stream_ingest( csv_path, args.store, max_memory_mb=args.max_memory_mb )
+        else:
+            manifest = ingest_csv( csv_path, args.store )
+        print( '{}: versão {}, {} linhas'.format( csv_path, manifest['version'], manifest['rows'] ) )
+
+
+if __name__ == '__main__':
+    main()
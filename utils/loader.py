@@ -0,0 +1,277 @@
+# ==================================
+# ===    Data Loader    =====
+# ==================================
+import os
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.cleaning import clean_code, READ_CSV_KWARGS
+from utils.geo import add_distance, add_geocells
+from utils.calendar_dim import add_calendar
+from utils.schema import compact
+from utils.snapshot import snapshot_path, publish_snapshot
+from utils.store import is_store, manifest_path, read_store
+from utils.profiling import span
+
+DATASET_PATH = os.environ.get( 'CURRY_DATASET', 'dataset/train.csv' )
+
+# Teto de memória (MB) para cada chunk da leitura em streaming
+MAX_MEMORY_MB = int( os.environ.get( 'CURRY_MAX_MEMORY_MB', 512 ) )
+CLEAN_OVERHEAD = 3
+
+# Cache por processo: as páginas do Streamlit são re-executadas a cada
+# interação, mas este módulo fica em sys.modules durante toda a vida do servidor.
+_cache = {}
+_digests = {}
+_derived = {}
+_stats = { 'hits': 0, 'misses': 0 }
+_lock = threading.RLock()
+
+
+def file_digest( path, block_size=1 << 20 ):
+    """
+        Calcula o hash (sha1) do conteúdo do arquivo, lendo em blocos.
+    """
+    digest = hashlib.sha1()
+    with open( path, 'rb' ) as f:
+        for block in iter( lambda: f.read( block_size ), b'' ):
+            digest.update( block )
+
+    return digest.hexdigest()
+
+
+def _freeze( df1 ):
+    # Marca os arrays internos como somente leitura: qualquer escrita
+    # in-place no frame compartilhado passa a levantar ValueError
+    for values in df1._mgr.arrays:
+        values = getattr( values, '_ndarray', values )
+        if hasattr( values, 'flags' ):
+            values.flags.writeable = False
+
+    return df1
+
+
+def _chunksize( path, max_memory_mb ):
+    # Bytes por linha estimados numa amostra do csv, com folga para o chunk
+    # cru, a cópia limpa e os temporários da limpeza
+    sample = pd.read_csv( path, nrows=1000, **READ_CSV_KWARGS )
+    row_bytes = sample.memory_usage( deep=True ).sum() / max( len( sample ), 1 )
+
+    return max( int( max_memory_mb * 2**20 / ( row_bytes * CLEAN_OVERHEAD ) ), 1000 )
+
+
+def iter_clean_chunks( path, chunksize=None, max_memory_mb=MAX_MEMORY_MB, progress=None ):
+    """
+        Lê o csv em chunks e devolve cada chunk já limpo (clean_code + colunas
+        derivadas), sem nunca manter o csv cru inteiro em memória.
+            - chunksize: linhas por chunk; se None, é calculado para que um
+              chunk em limpeza caiba em max_memory_mb
+            - progress: callback( fração_lida, linhas_limpas ) chamado a cada chunk
+    """
+    if chunksize is None:
+        chunksize = _chunksize( path, max_memory_mb )
+
+    total = os.path.getsize( path )
+    rows = 0
+    with open( path, 'rb' ) as f:
+        # O sentinela 'NaN ' vira NA já no parser: as colunas numéricas não passam por texto
+        reader = pd.read_csv( f, chunksize=chunksize, **READ_CSV_KWARGS )
+        while True:
+            with span( 'load.read_csv' ):
+                chunk = next( reader, None )
+            if chunk is None:
+                break
+
+            # Colunas derivadas calculadas uma única vez na ingestão
+            with span( 'load.clean' ):
+                df1 = add_geocells( add_calendar( add_distance( clean_code( chunk ) ) ) )
+            del chunk
+
+            rows += len( df1 )
+            if progress is not None:
+                progress( min( f.tell() / total, 1.0 ) if total else 1.0, rows )
+
+            yield df1
+
+    if progress is not None:
+        progress( 1.0, rows )
+
+
+def read_clean( path, chunksize=None, max_memory_mb=MAX_MEMORY_MB, progress=None ):
+    """
+        Lê um csv no esquema do train.csv e aplica a limpeza + colunas derivadas.
+        A leitura é feita em chunks (iter_clean_chunks): o csv cru nunca fica
+        inteiro em memória, mas o pico é duas vezes o dataset limpo (os
+        chunks e o frame concatenado) mais um chunk. Para o dataset do
+        servidor, read_compact.
+    """
+    return pd.concat( iter_clean_chunks( path, chunksize, max_memory_mb, progress ) )
+
+
+def _concat_compact( chunks ):
+    # Categorias de cada coluna unidas entre os chunks (ordenadas, como em
+    # utils.schema.compact): com o mesmo tipo em todos, o concat mantém as
+    # colunas category. Cada chunk é trocado no lugar: uma cópia por vez.
+    for col in chunks[0].columns:
+        if not all( isinstance( chunk[col].dtype, pd.CategoricalDtype ) for chunk in chunks ):
+            continue
+
+        categorias = sorted( set().union( *( chunk[col].cat.categories for chunk in chunks ) ) )
+        dtype = pd.CategoricalDtype( categorias, ordered=True )
+        for i, chunk in enumerate( chunks ):
+            if chunk[col].dtype != dtype:
+                chunks[i] = chunk.assign( **{ col: chunk[col].cat.set_categories( categorias ).astype( dtype ) } )
+
+    return pd.concat( chunks )
+
+
+def read_compact( path, chunksize=None, max_memory_mb=MAX_MEMORY_MB, progress=None ):
+    """
+        O mesmo que compact( sort_by_date( read_clean( path ) ) ), sem passar
+        pelo dataset inteiro no formato não compacto: cada chunk é
+        compactado (utils.schema) logo depois de limpo, e a ordenação por
+        Order_Date é um único take sobre o frame compacto. Pico de memória:
+        duas vezes o dataset compacto (os chunks e o frame concatenado, depois
+        o concatenado e o ordenado) mais um chunk em limpeza.
+    """
+    chunks = [ compact( df1 ) for df1 in iter_clean_chunks( path, chunksize, max_memory_mb, progress ) ]
+    df1 = _concat_compact( chunks )
+    del chunks
+
+    datas = df1['Order_Date'].to_numpy()
+    if len( datas ) and not ( datas[1:] >= datas[:-1] ).all():
+        df1 = df1.take( np.argsort( datas, kind='stable' ) )
+
+    return df1
+
+
+def sort_by_date( df1 ):
+    """
+        Ordena (de forma estável) por Order_Date. Todos os frames carregados
+        ficam nessa ordem, então o filtro de data vira uma busca binária e
+        projeções diferentes do mesmo dataset têm as mesmas linhas na mesma
+        posição.
+    """
+    if not df1['Order_Date'].is_monotonic_increasing:
+        df1 = df1.sort_values( 'Order_Date', kind='stable' )
+
+    return df1
+
+
+def _read_source( path, progress ):
+    # Dataset limpo, ordenado e compactado (utils.schema) a partir da origem
+    if is_store( path ):
+        # Store incremental (utils.ingest): as partes já estão limpas em Arrow,
+        # mas cada lote tem suas próprias datas (e partes antigas não têm as
+        # colunas de calendário e de célula)
+        with span( 'load.store' ):
+            return compact( add_geocells( add_calendar( sort_by_date( read_store( path ) ) ) ) )
+
+    return read_compact( path, progress=progress )
+
+
+def _load( path, digest, columns, progress ):
+    # Snapshot publicado uma vez (por este ou outro processo) e aberto via
+    # memory-map sem cópia, com projeção de colunas
+    with span( 'load.snapshot' ):
+        return publish_snapshot( snapshot_path( digest ), lambda: _read_source( path, progress ), columns,
+                                 source=path )
+
+
+def _source_digest( path ):
+    # Só recalcula o hash quando o mtime/tamanho do arquivo muda; para um
+    # store a versão é o hash do manifesto
+    source = manifest_path( path ) if is_store( path ) else path
+    stat = os.stat( source )
+    stamp = ( stat.st_mtime_ns, stat.st_size )
+
+    known = _digests.get( path )
+    if known is None or known[0] != stamp:
+        known = ( stamp, file_digest( source ) )
+        _digests[path] = known
+
+    return known[1]
+
+
+def load_dataset( path=DATASET_PATH, columns=None, progress=None ):
+    """
+        Esta função retorna o dataset limpo (clean_code), lendo o csv apenas
+        uma vez para todos os processos: o primeiro publica o snapshot e os
+        demais o abrem via memory-map, sem cópia (utils.snapshot). `path`
+        pode ser o csv ou um store (utils.ingest).
+            - O frame retornado é compartilhado entre as sessões e é somente
+              leitura: os filtros das páginas devem gerar novos frames.
+            - O cache é invalidado quando o mtime/tamanho do arquivo muda e o
+              hash do conteúdo é diferente do que foi carregado.
+            - columns: lista de colunas usadas pela página; as demais não são
+              materializadas quando existe snapshot.
+            - progress: callback( fração, linhas ) da leitura do csv (ex.:
+              utils.ui.sidebar_progress)
+    """
+    key = ( path, tuple( columns ) if columns is not None else None )
+
+    with _lock:
+        digest = _source_digest( path )
+
+        entry = _cache.get( key )
+        if entry is not None and entry['digest'] == digest:
+            _stats['hits'] += 1
+            return entry['df']
+
+        _stats['misses'] += 1
+        with span( 'load' ):
+            df1 = _freeze( _load( path, digest, columns, progress ) )
+        _cache[key] = { 'digest': digest, 'df': df1 }
+
+    return df1
+
+
+def dataset_version( path=DATASET_PATH ):
+    """
+        Retorna o hash do conteúdo atual de `path`.
+    """
+    with _lock:
+        return _source_digest( path )
+
+
+def load_derived( name, builder, path=DATASET_PATH ):
+    """
+        Artefatos derivados do dataset (cubos, índices, ...): builder() é
+        executado uma vez por versão do dataset e o resultado fica em cache.
+    """
+    with _lock:
+        digest = _source_digest( path )
+
+        entry = _derived.get( ( name, path ) )
+        if entry is not None and entry['digest'] == digest:
+            _stats['hits'] += 1
+            return entry['value']
+
+        _stats['misses'] += 1
+        with span( 'load.{}'.format( name ) ):
+            value = builder()
+        _derived[( name, path )] = { 'digest': digest, 'value': value }
+
+    return value
+
+
+def cache_info():
+    """
+        Retorna os contadores de hits/misses e o número de itens em cache.
+    """
+    with _lock:
+        return { 'hits': _stats['hits'],
+                 'misses': _stats['misses'],
+                 'entries': len( _cache ) + len( _derived ) }
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+        _digests.clear()
+        _derived.clear()
+        _stats['hits'] = 0
+        _stats['misses'] = 0
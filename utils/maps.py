@@ -0,0 +1,125 @@
+# ==================================
+# ===    Mapas (Visão Geográfica)    =====
+# ==================================
+import folium
+import numpy as np
+from folium.plugins import FastMarkerCluster, HeatMap
+
+from utils.cache import ByteLRU
+from utils.geo import GRID_BITS
+from utils.profiling import span
+
+# Teto de pontos (células) enviados ao navegador
+MAX_POINTS = 2000
+
+# Orçamento (MB) dos mapas renderizados (html) em cache por processo
+MAP_CACHE_MB = 32
+
+_maps = ByteLRU( MAP_CACHE_MB * 2**20 )
+
+# Marcadores do cluster: um por célula da grade, com a quantidade de
+# entregas da célula (row[2]) no tooltip e nas opções do marcador
+CELL_MARKER_JS = """function ( row ) {
+    var marker = L.marker( new L.LatLng( row[0], row[1] ), { count: row[2] } );
+    marker.bindTooltip( row[2].toLocaleString() + ' entregas' );
+    return marker;
+}"""
+
+# Ícone de cada grupo: soma das entregas das células do grupo (e não a
+# quantidade de células), com as classes de tamanho do Leaflet.markercluster
+CLUSTER_ICON_JS = """function ( cluster ) {
+    var total = cluster.getAllChildMarkers().reduce( function ( soma, marker ) {
+        return soma + marker.options.count;
+    }, 0 );
+    var tamanho = total < 1000 ? 'small' : ( total < 10000 ? 'medium' : 'large' );
+    return L.divIcon( { html: '<div><span>' + total.toLocaleString() + '</span></div>',
+                        className: 'marker-cluster marker-cluster-' + tamanho,
+                        iconSize: new L.Point( 40, 40 ) } );
+}"""
+
+
+def bin_cells( keys, lat, lon, max_points=MAX_POINTS ):
+    """
+        Esta função agrega as coordenadas pelas células da grade geográfica
+        (chaves de utils.geo, gravadas na ingestão):
+            - cada célula vira um ponto no centróide das entregas da célula,
+              com a quantidade de entregas como peso
+            - se houver mais que max_points células, a grade é engrossada
+              (célula 2x maior, key >> 2) até caber; só as chaves distintas
+              são reagrupadas, e não as linhas
+        Linhas sem localização (chave -1) são ignoradas.
+        Retorna ( lat, lon, count ) como arrays numpy.
+    """
+    keys = np.asarray( keys, dtype='int64' )
+    validas = keys >= 0
+    lat = np.asarray( lat, dtype='float64' )[validas]
+    lon = np.asarray( lon, dtype='float64' )[validas]
+
+    cells, inverse = np.unique( keys[validas], return_inverse=True )
+    for _ in range( GRID_BITS ):
+        if len( cells ) <= max_points:
+            break
+        cells, grossas = np.unique( cells >> 2, return_inverse=True )
+        inverse = grossas[inverse]
+
+    counts = np.bincount( inverse, minlength=len( cells ) )
+    center_lat = np.bincount( inverse, weights=lat, minlength=len( cells ) ) / counts
+    center_lon = np.bincount( inverse, weights=lon, minlength=len( cells ) ) / counts
+
+    return center_lat, center_lon, counts
+
+
+def build_county_map( df1, bbox=None ):
+    """
+        Monta o mapa da Visão Geográfica:
+            - um marcador na mediana de cada ( City, Road_traffic_density )
+            - mapa de calor das entregas, a partir da grade pré-agregada
+            - marcadores agrupados (cluster) com os centróides da grade: cada
+              grupo mostra a soma das entregas das suas células, e cada
+              marcador a quantidade de entregas da célula
+            - bbox: ( lat_min, lat_max, lon_min, lon_max ) da área
+              selecionada; o mapa abre enquadrado nela
+    """
+    df_aux = ( df1.loc[:, ['City', 'Road_traffic_density', 'Delivery_location_latitude', 'Delivery_location_longitude']]
+                  .groupby( ['City', 'Road_traffic_density'], observed=True )
+                  .median()
+                  .reset_index() )
+
+    map_ = folium.Map( zoom_start=11 )
+    for city, traffic, lat, lon in df_aux.itertuples( index=False ):
+        folium.Marker( [lat, lon], popup='{} / {}'.format( city, traffic ) ).add_to( map_ )
+
+    if len( df1 ) > 0:
+        lat, lon, counts = bin_cells( df1['delivery_cell'], df1['Delivery_location_latitude'],
+                                      df1['Delivery_location_longitude'] )
+        # [ lat, lon, entregas da célula ]
+        cells = np.column_stack( [ lat.round( 5 ), lon.round( 5 ), counts ] ).tolist()
+
+        HeatMap( cells, name='Densidade de entregas' ).add_to( map_ )
+        FastMarkerCluster( cells, name='Entregas', callback=CELL_MARKER_JS,
+                           icon_create_function=CLUSTER_ICON_JS ).add_to( map_ )
+        folium.LayerControl().add_to( map_ )
+
+    if bbox is not None:
+        lat_min, lat_max, lon_min, lon_max = bbox
+        map_.fit_bounds( [ [ lat_min, lon_min ], [ lat_max, lon_max ] ] )
+
+    return map_
+
+
+def county_map_html( data, cache_key, bbox=None ):
+    """
+        HTML do mapa, em cache por `cache_key` (versão do dataset + estado
+        dos filtros e da área): com filtros iguais o mapa não é reconstruído.
+            - data: função sem argumentos que retorna o dataset filtrado; só
+              é chamada quando o mapa não está em cache
+            - bbox: área selecionada (build_county_map)
+    """
+    html = _maps.get( cache_key )
+    if html is None:
+        df1 = data()
+        with span( 'render' ):
+            html = folium.Figure().add_child( build_county_map( df1, bbox ) ).render()
+        _maps.put( cache_key, html )
+
+    return html
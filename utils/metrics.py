@@ -0,0 +1,35 @@
+# ==================================
+# ===    Motor de KPIs    =====
+# ==================================
+from collections import namedtuple
+
+from utils.cube import build_cube, regroup, rollup
+from utils.profiling import timed
+
+# name: chave do resultado; by: lista de dimensões; measure: coluna medida
+# (None = apenas quantidade de pedidos)
+KPI = namedtuple( 'KPI', [ 'name', 'by', 'measure' ] )
+
+
+@timed( 'aggregate' )
+def run_kpis( kpis, cube=None, df1=None ):
+    """
+        Esta função calcula todos os KPIs declarados por uma página com uma
+        única passada sobre a fonte:
+            1. Agrupa a fonte pela união das dimensões de todos os KPIs,
+               acumulando count/sum/sumsq/min/max de todas as medidas
+            2. Cada KPI é um rollup dessa tabela intermediária, que é pequena
+        A fonte é o cubo já filtrado (cube) ou o dataset filtrado (df1).
+        Retorna { kpi.name: DataFrame } no formato de utils.cube.rollup.
+    """
+    dimensions = list( dict.fromkeys( col for kpi in kpis for col in kpi.by ) )
+    measures = list( dict.fromkeys( kpi.measure for kpi in kpis if kpi.measure is not None ) )
+
+    # 1. Passada única sobre a fonte
+    if cube is not None:
+        base = regroup( cube, dimensions, measures )
+    else:
+        base = build_cube( df1, dimensions, measures )
+
+    # 2. Rollups sobre a tabela intermediária
+    return { kpi.name: rollup( base, kpi.by, kpi.measure ) for kpi in kpis }
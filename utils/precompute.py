@@ -0,0 +1,383 @@
+# ==================================
+# ===    Pré-cálculo em lote    =====
+# ==================================
+# Calcula fora do Streamlit (ex.: num job agendado) todos os KPIs e tabelas
+# das páginas para uma grade de datas limite x combinações de filtros, com as
+# mesmas funções das páginas (utils.backend), num pool de processos:
+#     python -m utils.precompute
+#     python -m utils.precompute --traffic subsets --weather singles --workers 8
+# O resultado é um diretório versionado por dataset:
+#     dataset/.precomputed/v<versão>-<hash>/manifest.json   grade e offsets por estado
+#     dataset/.precomputed/v<versão>-<hash>/<resultado>.arrow  linhas de todos os estados
+# As páginas (utils.backend.open_source) leem o store do dataset atual antes de
+# calcular: estados da grade são respondidos com uma fatia do arquivo, via
+# memory-map; os demais (e as linhas, ex.: mapas) continuam ao vivo.
+import os
+import json
+import shutil
+import argparse
+import collections
+import datetime
+import itertools
+import threading
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+
+from utils.loader import DATASET_PATH, dataset_version, load_dataset
+from utils.cube import load_cube
+from utils.snapshot import supersede
+from utils.figure_cache import normalize_filters
+from utils.profiling import span
+from utils.calendar_dim import GRANULARITIES
+import utils.visao_empresa as empresa
+import utils.visao_entregadores as entregadores
+import utils.visao_restaurantes as restaurantes
+
+PRECOMPUTE_DIR = os.environ.get( 'CURRY_PRECOMPUTE_DIR', 'dataset/.precomputed' )
+
+# Incrementar sempre que os KPIs, as tabelas das páginas ou o formato do store mudarem
+PRECOMPUTE_VERSION = 3
+
+MANIFEST_NAME = 'manifest.json'
+
+# Opções e valor inicial dos widgets da barra lateral das páginas
+DEFAULT_DATE = datetime.datetime( 2022, 4, 13 )
+TRAFFIC = [ 'Low', 'Medium', 'High', 'Jam' ]
+WEATHER = [ 'conditions Cloudy', 'conditions Fog', 'conditions Sandstorms', 'conditions Stormy',
+            'conditions Sunny', 'conditions Windy' ]
+
+# Páginas: módulo com PAGE_KPIS/COLUMNS e se a página tem o filtro de clima
+PAGES = { 'visao_empresa': ( empresa, False ),
+          'visao_entregadores': ( entregadores, True ),
+          'visao_restaurantes': ( restaurantes, True ) }
+
+AGE_VEHICLE_COLUMNS = [ 'maior_idade', 'menor_idade', 'melhor_condicao', 'pior_condicao' ]
+
+_lock = threading.RLock()
+_stores = {}
+
+
+# ==================================
+# ===    Nomes e estados    =====
+# ==================================
+
+def state_key( filters ):
+    """
+        Chave texto do estado dos filtros ( { 'date', 'traffic', 'weather' } ),
+        a mesma para qualquer ordem de seleção nos multiselects.
+    """
+    return json.dumps( normalize_filters( filters ) )
+
+
+def kpi_result( kpi ):
+    return 'kpi.{}'.format( kpi.name )
+
+
+def top_bottom_result( k, min_orders ):
+    return 'top_bottom_k-{}-{}'.format( k, min_orders )
+
+
+def store_path( digest, precompute_dir=PRECOMPUTE_DIR ):
+    """
+        Diretório do store pré-calculado para o hash `digest` do dataset.
+    """
+    return os.path.join( precompute_dir, 'v{}-{}'.format( PRECOMPUTE_VERSION, digest ) )
+
+
+def compute_results( page, source ):
+    """
+        Todos os KPIs e tabelas da página `page` com a fonte `source`
+        (utils.backend), como { nome: DataFrame }. Resultados que não são
+        tabelas (métricas da página) viram um DataFrame de uma linha.
+    """
+    module, _ = PAGES[page]
+    kpis = source.kpis( module.PAGE_KPIS )
+    results = { kpi_result( kpi ): kpis[kpi.name] for kpi in module.PAGE_KPIS }
+
+    if module is empresa:
+        for granularity in GRANULARITIES:
+            results['period_orders.{}'.format( granularity )] = source.period_orders( granularity )
+    elif module is entregadores:
+        # Uma coluna por métrica, para manter o tipo de cada valor
+        metrics = source.age_vehicle_metrics()
+        results['age_vehicle_metrics'] = pd.DataFrame( { col: [ value ] for col, value in zip( AGE_VEHICLE_COLUMNS,
+                                                                                              metrics ) } )
+        results['avg_ratings_by_delivery'] = source.avg_ratings_by_delivery()
+        top, bottom = source.top_bottom_k( k=entregadores.TOP_K, min_orders=entregadores.MIN_ORDERS )
+        name = top_bottom_result( entregadores.TOP_K, entregadores.MIN_ORDERS )
+        results[name + '.top'] = top
+        results[name + '.bottom'] = bottom
+    elif module is restaurantes:
+        results['unique_deliveries'] = pd.DataFrame( { 'unique_deliveries': [ source.unique_deliveries() ] } )
+
+    return results
+
+
+# ==================================
+# ===    Grade de filtros    =====
+# ==================================
+
+def _selections( options, mode ):
+    # all: só a seleção completa (padrão das páginas); singles: também cada
+    # opção sozinha; subsets: todos os subconjuntos não vazios
+    if mode == 'all':
+        return [ list( options ) ]
+    if mode == 'singles':
+        return [ list( options ) ] + [ [ option ] for option in options ]
+
+    return [ list( combo ) for n in range( len( options ), 0, -1 ) for combo in itertools.combinations( options, n ) ]
+
+
+def date_grid( df1, mode='daily' ):
+    """
+        Datas limite da grade: o valor inicial do slider e, com mode='daily',
+        cada dia do dataset (até o dia seguinte ao último pedido).
+    """
+    dates = [ DEFAULT_DATE ]
+    if mode == 'daily' and len( df1 ):
+        first, last = df1['Order_Date'].min().normalize(), df1['Order_Date'].max().normalize()
+        dates += list( pd.date_range( first, last + pd.Timedelta( days=1 ), freq='D' ).to_pydatetime() )
+
+    return sorted( set( dates ) )
+
+
+def filter_grid( page, dates, traffic='singles', weather='singles' ):
+    """
+        Estados dos filtros da página na grade datas x trânsito (x clima).
+    """
+    _, has_weather = PAGES[page]
+    weathers = _selections( WEATHER, weather ) if has_weather else [ None ]
+
+    return [ { 'date': date, 'traffic': t, 'weather': w }
+             for date in dates for t in _selections( TRAFFIC, traffic ) for w in weathers ]
+
+
+# ==================================
+# ===    Cálculo e gravação    =====
+# ==================================
+
+def _compute_chunk( page, states, backend ):
+    # Executado nos processos do pool: o dataset e o cubo já foram publicados
+    # pelo processo principal e são abertos via memory-map (utils.snapshot).
+    # Importado aqui: utils.backend importa este módulo
+    from utils.backend import open_source
+
+    module, _ = PAGES[page]
+    resultados = {}
+    for filters in states:
+        source = open_source( module.COLUMNS, backend=backend, precomputed=False, cached=False, **filters )
+        for name, df_aux in compute_results( page, source ).items():
+            resultados.setdefault( name, [] ).append( ( state_key( filters ), df_aux ) )
+
+    return resultados
+
+
+def _concat( frames, index ):
+    # Uma tabela por resultado, com os tipos mais comuns entre os estados não
+    # vazios: tabelas vazias recebem esses tipos; estados com tipos diferentes
+    # (ex.: métricas NaN de um filtro sem linhas) ficam fora do store e são
+    # calculados ao vivo
+    nao_vazios = [ df_aux.dtypes for _, df_aux in frames if len( df_aux ) ] or [ frames[0][1].dtypes ]
+    contagem = collections.Counter( tuple( map( str, dtypes ) ) for dtypes in nao_vazios )
+    mais_comum = contagem.most_common( 1 )[0][0]
+    dtypes = next( dtypes for dtypes in nao_vazios if tuple( map( str, dtypes ) ) == mais_comum )
+
+    partes, offsets, linhas = [], [ None ] * len( index ), 0
+    for key, df_aux in frames:
+        if not len( df_aux ):
+            df_aux = df_aux.astype( dtypes.to_dict() )
+        elif not df_aux.dtypes.equals( dtypes ):
+            continue
+
+        offsets[index[key]] = [ linhas, linhas + len( df_aux ) ]
+        partes.append( df_aux.reset_index( drop=True ) )
+        linhas += len( df_aux )
+
+    return pd.concat( partes, ignore_index=True ), offsets
+
+
+def _write_table( df_aux, path ):
+    # Arrow IPC sem compressão: as fatias de cada estado são lidas via memory-map
+    table = pa.Table.from_pandas( df_aux, preserve_index=False )
+    with pa.OSFile( path, 'wb' ) as sink:
+        with pa.ipc.new_file( sink, table.schema ) as writer:
+            writer.write_table( table )
+
+
+def _publish( tmp_dir, final_dir, source ):
+    # O diretório novo substitui o anterior de uma vez; processos que já
+    # mapearam os arquivos antigos continuam lendo até recarregar
+    if os.path.exists( final_dir ):
+        old_dir = '{}.old-{}'.format( final_dir, os.getpid() )
+        os.replace( final_dir, old_dir )
+        shutil.rmtree( old_dir, ignore_errors=True )
+    os.replace( tmp_dir, final_dir )
+
+    # Remove o store que este substitui para a mesma origem (outro hash do
+    # conteúdo ou formato anterior); stores de outros datasets ficam intactos
+    supersede( final_dir, source, 'store' )
+
+
+def precompute( path=DATASET_PATH, dates='daily', traffic='singles', weather='singles', workers=None,
+                backend='pandas', precompute_dir=PRECOMPUTE_DIR, chunk_size=32 ):
+    """
+        Calcula todos os resultados das páginas na grade de filtros e publica
+        o store da versão atual do dataset. Retorna o manifesto gravado.
+            - dates: 'daily' (cada dia do dataset) ou 'default' (só o valor
+              inicial do slider)
+            - traffic/weather: 'all', 'singles' ou 'subsets' (ver _selections)
+            - workers: processos do pool (padrão: os.cpu_count())
+            - backend: backend das fontes (utils.backend.BACKENDS)
+    """
+    digest = dataset_version( path )
+
+    # Publica o snapshot e o cubo (ou o banco DuckDB) antes de iniciar o pool:
+    # cada processo só abre os arquivos já gravados
+    df1 = load_dataset( path=path, columns=[ 'Order_Date' ] )
+    if backend == 'duckdb':
+        from utils.warehouse import load_database
+        load_database( path )
+    else:
+        load_cube( path )
+
+    grid = { page: filter_grid( page, date_grid( df1, dates ), traffic, weather ) for page in PAGES }
+    tarefas = [ ( page, states[i:i + chunk_size] ) for page, states in grid.items()
+                for i in range( 0, len( states ), chunk_size ) ]
+
+    frames = {}
+    # spawn: os processos filhos leem CURRY_DATASET do ambiente ao importar utils.loader
+    with ProcessPoolExecutor( max_workers=workers or os.cpu_count(),
+                              mp_context=multiprocessing.get_context( 'spawn' ) ) as pool:
+        futures = [ pool.submit( _compute_chunk, page, states, backend ) for page, states in tarefas ]
+        for future in futures:
+            for name, resultados in future.result().items():
+                frames.setdefault( name, [] ).extend( resultados )
+
+    final_dir = store_path( digest, precompute_dir )
+    tmp_dir = '{}.tmp-{}'.format( final_dir, os.getpid() )
+    shutil.rmtree( tmp_dir, ignore_errors=True )
+    os.makedirs( tmp_dir )
+
+    # Offsets de cada resultado: lista alinhada com manifest['states'] (None
+    # para estados fora do store)
+    states = sorted( { state_key( filters ) for page_states in grid.values() for filters in page_states } )
+    index = { key: i for i, key in enumerate( states ) }
+
+    results = {}
+    for name, resultados in sorted( frames.items() ):
+        df_aux, offsets = _concat( resultados, index )
+        file_name = '{}.arrow'.format( name )
+        _write_table( df_aux, os.path.join( tmp_dir, file_name ) )
+        results[name] = { 'file': file_name, 'offsets': offsets }
+
+    manifest = { 'version': PRECOMPUTE_VERSION,
+                 'dataset': digest,
+                 'created': datetime.datetime.now().isoformat( timespec='seconds' ),
+                 'grid': { 'dates': dates, 'traffic': traffic, 'weather': weather,
+                           'states': { page: len( page_states ) for page, page_states in grid.items() } },
+                 'states': states,
+                 'results': results }
+    with open( os.path.join( tmp_dir, MANIFEST_NAME ), 'w' ) as f:
+        json.dump( manifest, f )
+
+    _publish( tmp_dir, final_dir, path )
+
+    return manifest
+
+
+# ==================================
+# ===    Leitura pelas páginas    =====
+# ==================================
+
+class PrecomputedStore:
+    """
+        Store pré-calculado aberto por um processo do servidor: o manifesto é
+        lido uma vez e cada arquivo de resultado é mapeado na primeira consulta.
+    """
+    def __init__( self, store_dir ):
+        self.store_dir = store_dir
+        with open( os.path.join( store_dir, MANIFEST_NAME ) ) as f:
+            self.manifest = json.load( f )
+        self._index = { key: i for i, key in enumerate( self.manifest['states'] ) }
+        self._tables = {}
+
+    def _table( self, name ):
+        with _lock:
+            table = self._tables.get( name )
+            if table is None:
+                path = os.path.join( self.store_dir, self.manifest['results'][name]['file'] )
+                table = pa.ipc.open_file( pa.memory_map( path, 'r' ) ).read_all()
+                self._tables[name] = table
+
+        return table
+
+    def get( self, name, filters ):
+        """
+            DataFrame do resultado `name` para o estado `filters`, ou None se
+            o estado não está na grade.
+        """
+        entry = self.manifest['results'].get( name )
+        i = self._index.get( state_key( filters ) )
+        if entry is None or i is None or entry['offsets'][i] is None:
+            return None
+
+        with span( 'precomputed' ):
+            start, stop = entry['offsets'][i]
+            return self._table( name ).slice( start, stop - start ).to_pandas()
+
+
+def load_precomputed( path=DATASET_PATH, precompute_dir=PRECOMPUTE_DIR ):
+    """
+        Store pré-calculado da versão atual do dataset, ou None se ainda não
+        foi gerado. Um store publicado depois do início do servidor é
+        encontrado no rerun seguinte (o manifesto é verificado a cada chamada).
+    """
+    store_dir = store_path( dataset_version( path ), precompute_dir )
+    try:
+        stamp = os.stat( os.path.join( store_dir, MANIFEST_NAME ) ).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _lock:
+        entry = _stores.get( store_dir )
+        if entry is None or entry[0] != stamp:
+            entry = ( stamp, PrecomputedStore( store_dir ) )
+            _stores[store_dir] = entry
+            # Store de mesmo conteúdo publicado para outra origem: passa a ser
+            # também o desta, e não é removido enquanto ela o usar
+            with contextlib.suppress( OSError ):
+                supersede( store_dir, path, 'store' )
+
+    return entry[1]
+
+
+def main():
+    parser = argparse.ArgumentParser( description='Pré-calcula os KPIs e tabelas das páginas numa grade de filtros.' )
+    parser.add_argument( '--dataset', default=None, help='csv ou store do dataset (CURRY_DATASET)' )
+    parser.add_argument( '--dates', choices=[ 'daily', 'default' ], default='daily',
+                         help='datas limite da grade (padrão: %(default)s)' )
+    parser.add_argument( '--traffic', choices=[ 'all', 'singles', 'subsets' ], default='singles',
+                         help='seleções de trânsito da grade (padrão: %(default)s)' )
+    parser.add_argument( '--weather', choices=[ 'all', 'singles', 'subsets' ], default='singles',
+                         help='seleções de clima da grade (padrão: %(default)s)' )
+    parser.add_argument( '--workers', type=int, default=None, help='processos do pool (padrão: núcleos da máquina)' )
+    parser.add_argument( '--backend', default='pandas', help='backend das fontes (padrão: %(default)s)' )
+    parser.add_argument( '--dir', default=PRECOMPUTE_DIR, help='diretório dos stores (padrão: %(default)s)' )
+    args = parser.parse_args()
+
+    # Os processos do pool leem CURRY_DATASET ao importar utils.loader
+    path = DATASET_PATH
+    if args.dataset:
+        os.environ['CURRY_DATASET'] = path = args.dataset
+
+    manifest = precompute( path, args.dates, args.traffic, args.weather, args.workers, args.backend, args.dir )
+    print( '{}: {} estados, {} resultados'.format( store_path( manifest['dataset'], args.dir ),
+                                                  len( manifest['states'] ), len( manifest['results'] ) ) )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# ==================================
+# ===    Profiling dos reruns    =====
+# ==================================
+# Spans de tempo nas etapas load -> clean -> filter -> aggregate -> render.
+# Cada rerun de página abre um registro (start_rerun) na thread da sessão;
+# fora de um registro, span() não faz nada (custo desprezível).
+#     CURRY_PROFILE=1              liga o profiling em todas as sessões
+#     CURRY_PROFILE_LOG=arquivo    json lines, uma linha por rerun (sem a
+#                                  variável, nada é gravado em arquivo)
+#     CURRY_PROFILE_PROM=arquivo   métricas no formato texto do Prometheus
+#                                  ('{pid}' no nome = um arquivo por processo)
+import os
+import json
+import time
+import datetime
+import threading
+import functools
+import contextlib
+from collections import OrderedDict
+
+PROFILE_ENABLED = os.environ.get( 'CURRY_PROFILE', '' ).lower() in ( '1', 'true', 'yes' )
+PROFILE_LOG = os.environ.get( 'CURRY_PROFILE_LOG' )
+PROFILE_PROM = os.environ.get( 'CURRY_PROFILE_PROM' )
+
+_local = threading.local()
+_lock = threading.Lock()
+
+# Totais por ( página, etapa ) desde o início do processo, para o Prometheus
+_totals = {}
+_reruns = {}
+
+
+class _Rerun:
+    def __init__( self, page, persist ):
+        self.page = page
+        self.persist = persist
+        self.start = time.perf_counter()
+        self.spans = OrderedDict()
+
+    def add( self, name, seconds ):
+        calls, total = self.spans.get( name, ( 0, 0.0 ) )
+        self.spans[name] = ( calls + 1, total + seconds )
+
+
+def start_rerun( page, enabled=None, persist=True ):
+    """
+        Abre o registro do rerun da página na thread atual. Com enabled=None
+        vale CURRY_PROFILE. Com persist=False o registro só é retornado por
+        finish_rerun: não entra nos totais nem nos arquivos. Retorna True se
+        o profiling está ligado.
+    """
+    if enabled is None:
+        enabled = PROFILE_ENABLED
+
+    _local.rerun = _Rerun( page, persist ) if enabled else None
+
+    return enabled
+
+
+@contextlib.contextmanager
+def _span( rerun, name ):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        rerun.add( name, time.perf_counter() - start )
+
+
+def span( name ):
+    """
+        Mede o bloco `with span( 'filter' ):` no rerun da thread atual.
+        Spans com o mesmo nome são somados; nomes com ponto ('load.clean')
+        indicam uma etapa dentro de outra.
+    """
+    rerun = getattr( _local, 'rerun', None )
+    if rerun is None:
+        return contextlib.nullcontext()
+
+    return _span( rerun, name )
+
+
+def timed( name ):
+    """
+        Decorador: cada chamada da função é um span `name`.
+    """
+    def decorator( fn ):
+        @functools.wraps( fn )
+        def wrapper( *args, **kwargs ):
+            with span( name ):
+                return fn( *args, **kwargs )
+
+        return wrapper
+
+    return decorator
+
+
+def finish_rerun():
+    """
+        Fecha o registro da thread atual, grava a linha json e o arquivo do
+        Prometheus (os que estiverem configurados, e só se o registro foi
+        aberto com persist) e retorna o registro como dict, ou None se o
+        profiling está desligado.
+    """
+    rerun = getattr( _local, 'rerun', None )
+    _local.rerun = None
+    if rerun is None:
+        return None
+
+    record = { 'ts': datetime.datetime.now().isoformat( timespec='milliseconds' ),
+               'pid': os.getpid(),
+               'page': rerun.page,
+               'total_ms': round( ( time.perf_counter() - rerun.start ) * 1000, 3 ),
+               'spans': [ { 'name': name, 'calls': calls, 'ms': round( total * 1000, 3 ) }
+                          for name, ( calls, total ) in rerun.spans.items() ] }
+
+    if not rerun.persist:
+        return record
+
+    with _lock:
+        _reruns[rerun.page] = _reruns.get( rerun.page, 0 ) + 1
+        for name, ( calls, total ) in rerun.spans.items():
+            key = ( rerun.page, name )
+            old_calls, old_total = _totals.get( key, ( 0, 0.0 ) )
+            _totals[key] = ( old_calls + calls, old_total + total )
+
+        if PROFILE_LOG:
+            with open( PROFILE_LOG, 'a' ) as f:
+                f.write( json.dumps( record ) + '\n' )
+
+        if PROFILE_PROM:
+            write_prometheus( PROFILE_PROM.format( pid=os.getpid() ) )
+
+    return record
+
+
+def prometheus_text():
+    """
+        Totais do processo no formato texto do Prometheus (counters).
+    """
+    linhas = [ '# HELP curry_reruns_total Reruns de página com profiling.',
+               '# TYPE curry_reruns_total counter' ]
+    linhas += [ 'curry_reruns_total{{page="{}"}} {}'.format( page, n ) for page, n in sorted( _reruns.items() ) ]
+
+    linhas += [ '# HELP curry_stage_seconds_total Tempo acumulado por etapa dos reruns.',
+                '# TYPE curry_stage_seconds_total counter' ]
+    linhas += [ 'curry_stage_seconds_total{{page="{}",stage="{}"}} {:.6f}'.format( page, name, total )
+                for ( page, name ), ( _, total ) in sorted( _totals.items() ) ]
+
+    linhas += [ '# HELP curry_stage_calls_total Execuções por etapa dos reruns.',
+                '# TYPE curry_stage_calls_total counter' ]
+    linhas += [ 'curry_stage_calls_total{{page="{}",stage="{}"}} {}'.format( page, name, calls )
+                for ( page, name ), ( calls, _ ) in sorted( _totals.items() ) ]
+
+    return '\n'.join( linhas ) + '\n'
+
+
+def write_prometheus( path ):
+    # Gravação atômica: o coletor (node_exporter textfile) nunca lê um arquivo pela metade
+    tmp_path = '{}.tmp-{}'.format( path, os.getpid() )
+    with open( tmp_path, 'w' ) as f:
+        f.write( prometheus_text() )
+    os.replace( tmp_path, path )
@@ -0,0 +1,54 @@
+# ==================================
+# ===    Ranking top/bottom-K    =====
+# ==================================
+import numpy as np
+import pandas as pd
+
+from utils.profiling import timed
+from utils.schema import plain
+
+
+def _k_smallest( values, positions, k ):
+    # Seleção parcial (partition) seguida de ordenação só dos candidatos.
+    # Empates são decididos pela posição (primeira ocorrência da chave), como
+    # no backend DuckDB (utils.warehouse.top_bottom_k)
+    if len( positions ) > k:
+        kth = np.partition( values[positions], k - 1 )[k - 1]
+        positions = positions[values[positions] <= kth]
+
+    return positions[np.lexsort( ( positions, values[positions] ) )][:k]
+
+
+@timed( 'aggregate' )
+def top_bottom_k( df1, group='City', key='Delivery_person_ID', value='Time_taken(min)', k=10, min_orders=1 ):
+    """
+        Esta função calcula a média de `value` por ( group, key ) e devolve,
+        para cada grupo encontrado nos dados, os k menores e os k maiores:
+            - uma única agregação e seleção parcial por grupo (sem ordenar a
+              tabela inteira)
+            - min_orders: ignora chaves com menos pedidos que isso no grupo
+        Retorna ( top, bottom ): DataFrames com group, key, value (média) e
+        orders, ordenados por grupo e pela média (crescente no top,
+        decrescente no bottom).
+    """
+    stats = ( df1.loc[:, [group, key, value]]
+                 .groupby( [group, key], sort=False, observed=True )[value]
+                 .agg( ['mean', 'size'] ) )
+    stats = stats.loc[stats['size'] >= min_orders, :]
+
+    means = stats['mean'].to_numpy()
+    codes, groups = pd.factorize( stats.index.get_level_values( 0 ), sort=True )
+
+    top_pos, bottom_pos = [], []
+    for code in range( len( groups ) ):
+        positions = np.flatnonzero( codes == code )
+        top_pos.append( _k_smallest( means, positions, k ) )
+        bottom_pos.append( _k_smallest( -means, positions, k ) )
+
+    def _frame( pos ):
+        pos = np.concatenate( pos ) if pos else np.zeros( 0, dtype=int )
+        df_aux = plain( stats.iloc[pos].reset_index() )
+
+        return df_aux.rename( columns={ 'mean': value, 'size': 'orders' } )
+
+    return _frame( top_pos ), _frame( bottom_pos )
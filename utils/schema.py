@@ -0,0 +1,138 @@
+# ==================================
+# ===    Esquema compacto    =====
+# ==================================
+# Tipos do dataset limpo em memória (e no snapshot):
+#     - texto de baixa cardinalidade -> category ordenada, com categorias
+#       fixas em ordem alfabética (mesma ordem dos agrupamentos sobre texto e
+#       do backend DuckDB); valores novos entram na lista, que segue ordenada.
+#       Ordenada porque o groupby( observed=True ) do pandas ignora sort=True
+#       em categorias não ordenadas
+#     - inteiros -> menor inteiro que comporta os valores (int8/int16)
+#     - coordenadas -> float32 (as medidas agregadas continuam float64)
+# Uso:
+#     python -m utils.schema dataset/train.csv   (relatório de memória por coluna)
+import argparse
+
+import pandas as pd
+
+# Categorias conhecidas de cada coluna (ordem alfabética)
+CATEGORIES = { 'City': [ 'Metropolitian', 'Semi-Urban', 'Urban' ],
+               'Road_traffic_density': [ 'High', 'Jam', 'Low', 'Medium' ],
+               'Weatherconditions': [ 'conditions Cloudy', 'conditions Fog', 'conditions NaN', 'conditions Sandstorms',
+                                      'conditions Stormy', 'conditions Sunny', 'conditions Windy' ],
+               'Festival': [ 'No', 'Yes' ],
+               'Type_of_order': [ 'Buffet', 'Drinks', 'Meal', 'Snack' ],
+               'Type_of_vehicle': [ 'bicycle', 'electric_scooter', 'motorcycle', 'scooter' ] }
+
+# Texto com categorias vindas dos dados (milhares de entregadores, mas
+# muitas linhas por entregador)
+DATA_CATEGORIES = [ 'Delivery_person_ID' ]
+
+# Inteiros reduzidos ao menor tipo sem perda
+INT_COLUMNS = [ 'Delivery_person_Age', 'Vehicle_condition', 'multiple_deliveries', 'Time_taken(min)' ]
+
+# Floats que só são desenhados (mapas), nunca somados: float32 basta
+FLOAT32_COLUMNS = [ 'Restaurant_latitude', 'Restaurant_longitude',
+                    'Delivery_location_latitude', 'Delivery_location_longitude' ]
+
+
+def _categorical( coluna, categorias ):
+    dtype = pd.CategoricalDtype( categorias, ordered=True )
+    if coluna.dtype == dtype:
+        return coluna
+
+    return coluna.astype( dtype )
+
+
+def compact( df1, categoricals=True ):
+    """
+        Converte o dataset limpo para o esquema compacto (colunas ausentes
+        são ignoradas; aplicar duas vezes não muda nada). Os valores são os
+        mesmos: só a representação muda.
+            - categoricals: False mantém o texto como object (usado pelo
+              backend DuckDB, que tem a sua própria compressão)
+    """
+    colunas = {}
+
+    if categoricals:
+        for col in list( CATEGORIES ) + DATA_CATEGORIES:
+            if col not in df1.columns:
+                continue
+
+            valores = df1[col].dropna().unique()
+            categorias = sorted( set( CATEGORIES.get( col, [] ) ) | set( valores ) )
+            colunas[col] = _categorical( df1[col], categorias )
+
+    for col in INT_COLUMNS:
+        if col in df1.columns and pd.api.types.is_integer_dtype( df1[col] ):
+            colunas[col] = pd.to_numeric( df1[col], downcast='integer' )
+
+    for col in FLOAT32_COLUMNS:
+        if col in df1.columns:
+            colunas[col] = df1[col].astype( 'float32' )
+
+    return df1.assign( **colunas ) if colunas else df1
+
+
+def plain( df_aux, columns=None ):
+    """
+        Colunas categóricas de `columns` (padrão: todas) voltam a ser texto.
+        Usado nas tabelas pequenas de resultado: mesmos tipos do backend
+        DuckDB, sem as categorias ausentes nos gráficos e sem enviar a lista
+        inteira de categorias ao navegador junto com cada tabela.
+    """
+    columns = df_aux.columns if columns is None else columns
+
+    return df_aux.astype( { col: object for col in columns if isinstance( df_aux[col].dtype, pd.CategoricalDtype ) } )
+
+
+def memory_report( before, after ):
+    """
+        Bytes por coluna (memory_usage deep) antes e depois da compactação.
+        Retorna um DataFrame com uma linha por coluna e a linha 'total'.
+    """
+    df_aux = pd.DataFrame( { 'dtype_before': before.dtypes.astype( str ),
+                             'bytes_before': before.memory_usage( index=False, deep=True ),
+                             'dtype_after': after.dtypes.astype( str ),
+                             'bytes_after': after.memory_usage( index=False, deep=True ) } )
+
+    df_aux.loc['total'] = [ '', df_aux['bytes_before'].sum(), '', df_aux['bytes_after'].sum() ]
+    df_aux['ratio'] = ( df_aux['bytes_after'] / df_aux['bytes_before'] ).round( 3 )
+
+    return df_aux
+
+
+def page_report( after, pages ):
+    """
+        Bytes do dataset compacto carregado por cada página ( { página:
+        colunas } ), com a projeção de colunas das páginas.
+    """
+    bytes_por_coluna = after.memory_usage( index=False, deep=True )
+
+    return pd.Series( { page: int( bytes_por_coluna[list( columns )].sum() ) for page, columns in pages.items() },
+                      name='bytes' )
+
+
+def main():
+    from utils.loader import read_clean, sort_by_date
+    import utils.visao_empresa as empresa
+    import utils.visao_entregadores as entregadores
+    import utils.visao_restaurantes as restaurantes
+
+    parser = argparse.ArgumentParser( description='Relatório de memória do esquema compacto.' )
+    parser.add_argument( 'csv', help='csv no esquema do train.csv' )
+    args = parser.parse_args()
+
+    before = sort_by_date( read_clean( args.csv ) )
+    after = compact( before )
+
+    pd.set_option( 'display.width', 200 )
+    print( memory_report( before, after ).to_string() )
+    print()
+    print( page_report( after, { 'visao_empresa': empresa.COLUMNS,
+                                 'visao_entregadores': entregadores.COLUMNS,
+                                 'visao_restaurantes': restaurantes.COLUMNS } ).to_string() )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+# ==================================
+# ===    Sketches de distintos    =====
+# ==================================
+# Entregadores distintos por célula ( dia, City, trânsito, clima ), somáveis
+# como o cubo (utils.cube): qualquer combinação de filtros é a união das
+# células selecionadas, sem percorrer as linhas do dataset.
+#     - cada célula guarda os hashes (64 bits) dos seus entregadores; células
+#       com muitos entregadores guardam os registradores de um HyperLogLog
+#     - a união de células esparsas é exata (np.unique dos hashes); com
+#       alguma célula densa selecionada é a estimativa do HLL, com erro
+#       padrão ~DISTINCT_ERROR (CURRY_DISTINCT_ERROR, padrão 2%)
+import os
+import math
+
+import numpy as np
+import pandas as pd
+
+from utils.loader import DATASET_PATH, load_dataset, load_derived
+from utils.cube import filter_cube
+from utils.profiling import timed
+
+SKETCH_DIMENSIONS = [ 'Order_Date', 'City', 'Road_traffic_density', 'Weatherconditions' ]
+
+SKETCH_KEY = 'Delivery_person_ID'
+
+# Erro padrão relativo do HLL (1.04 / sqrt( registradores ))
+DISTINCT_ERROR = float( os.environ.get( 'CURRY_DISTINCT_ERROR', 0.02 ) )
+
+# Teto opcional de pares célula x entregador da contagem exata: acima dele
+# até células esparsas usam o HLL (padrão: sem teto)
+DISTINCT_EXACT = int( os.environ.get( 'CURRY_DISTINCT_EXACT', 0 ) ) or None
+
+
+def precision( error=DISTINCT_ERROR ):
+    """
+        Bits de índice do HLL (2**p registradores) para o erro padrão `error`.
+    """
+    return int( min( 18, max( 4, math.ceil( math.log2( ( 1.04 / error ) ** 2 ) ) ) ) )
+
+
+def hash_values( values ):
+    """
+        Hash de 64 bits dos valores (categorias são hasheadas uma vez cada).
+    """
+    if isinstance( values.dtype, pd.CategoricalDtype ):
+        hashes = pd.util.hash_array( values.cat.categories.to_numpy( dtype=object ) )
+        return hashes[values.cat.codes.to_numpy()]
+
+    return pd.util.hash_array( values.to_numpy( dtype=object ) )
+
+
+def _bit_length( values ):
+    # Número de bits de cada uint64 (busca binária vetorizada, sem passar por float)
+    n = np.zeros( len( values ), dtype=np.int64 )
+    values = values.copy()
+    for shift in ( 32, 16, 8, 4, 2, 1 ):
+        grandes = values >= ( np.uint64( 1 ) << np.uint64( shift ) )
+        values[grandes] >>= np.uint64( shift )
+        n[grandes] += shift
+
+    return n + ( values > 0 )
+
+
+def register_keys( hashes, p ):
+    """
+        Chave de registrador de cada hash ( registrador * 64 + rank, uint32 ):
+        os p bits altos escolhem o registrador e o rank é a posição do
+        primeiro bit 1 nos bits restantes.
+    """
+    bits = 64 - p
+    indices = ( hashes >> np.uint64( bits ) ).astype( np.uint32 )
+    resto = hashes & np.uint64( ( 1 << bits ) - 1 )
+    rank = ( bits - _bit_length( resto ) + 1 ).astype( np.uint32 )
+
+    return indices * np.uint32( 64 ) + rank
+
+
+def registers( keys, p ):
+    """
+        Registradores do HLL ( 2**p, uint8 ) a partir das chaves de
+        register_keys: o maior rank de cada registrador.
+    """
+    # Marca as chaves presentes (a ordem das escritas não importa, ao
+    # contrário de np.maximum.at, bem mais lento) e pega o maior rank marcado
+    presentes = np.zeros( ( 1 << p ) * 64, dtype=bool )
+    presentes[keys] = True
+    presentes = presentes.reshape( -1, 64 )
+
+    regs = 63 - np.argmax( presentes[:, ::-1], axis=1 )
+
+    return np.where( presentes.any( axis=1 ), regs, 0 ).astype( np.uint8 )
+
+
+def estimate( regs ):
+    """
+        Estimativa do HLL, com a correção de contagem linear para
+        cardinalidades pequenas.
+    """
+    m = len( regs )
+    alpha = { 16: 0.673, 32: 0.697, 64: 0.709 }.get( m, 0.7213 / ( 1 + 1.079 / m ) )
+    e = alpha * m * m / np.sum( np.ldexp( 1.0, -regs.astype( np.int64 ) ) )
+
+    zeros = int( np.count_nonzero( regs == 0 ) )
+    if e <= 2.5 * m and zeros:
+        return m * math.log( m / zeros )
+
+    return e
+
+
+def build_sketches( df1, dimensions=SKETCH_DIMENSIONS, key=SKETCH_KEY, error=DISTINCT_ERROR ):
+    """
+        Esta função monta os sketches de valores distintos de `key` por
+        célula de `dimensions`:
+            - cells: DataFrame com as dimensões, distinct (valores distintos
+              na célula), start/stop (fatia de hashes) e dense (linha de
+              registers, ou -1)
+            - hashes: hashes ordenados dos valores de cada célula esparsa
+            - keys: chave de registrador de cada hash (register_keys)
+            - registers: registradores das células densas (mais de 2**p / 8
+              valores: aí 2**p bytes ocupam menos que os hashes)
+        Valores nulos de `key` não são contados.
+    """
+    dimensions = list( dimensions )
+    p = precision( error )
+
+    validos = df1[key].notna().to_numpy()
+    pares = ( df1.loc[validos, dimensions]
+                 .assign( hash=hash_values( df1.loc[validos, key] ) )
+                 .drop_duplicates() )
+
+    grupos = pares.groupby( dimensions, sort=True, observed=True )
+    codes = grupos.ngroup().to_numpy()
+    cells = grupos.size().rename( 'distinct' ).reset_index()
+
+    hashes = pares['hash'].to_numpy()
+    ordem = np.lexsort( ( hashes, codes ) )
+    hashes, codes = hashes[ordem], codes[ordem]
+    keys = register_keys( hashes, p )
+
+    distinct = cells['distinct'].to_numpy()
+    densas = distinct > ( 1 << p ) // 8
+    stops = np.cumsum( distinct )
+    starts = stops - distinct
+
+    regs = np.zeros( ( int( densas.sum() ), 1 << p ), dtype=np.uint8 )
+    for i, ( start, stop ) in enumerate( zip( starts[densas], stops[densas] ) ):
+        regs[i] = registers( keys[start:stop], p )
+
+    # Hashes só das células esparsas
+    esparsas = ~densas[codes]
+    comprimentos = np.where( densas, 0, distinct )
+    cells['stop'] = np.cumsum( comprimentos )
+    cells['start'] = cells['stop'] - comprimentos
+    cells['dense'] = np.where( densas, np.cumsum( densas ) - 1, -1 )
+
+    return { 'p': p, 'cells': cells, 'hashes': hashes[esparsas], 'keys': keys[esparsas], 'registers': regs }
+
+
+def load_sketches( path=DATASET_PATH ):
+    """
+        Sketches de entregadores distintos da versão atual do dataset,
+        construídos uma vez por processo.
+    """
+    return load_derived( 'sketches',
+                         lambda: build_sketches( load_dataset( path, SKETCH_DIMENSIONS + [ SKETCH_KEY ] ) ),
+                         path=path )
+
+
+def filter_cells( sketches, date=None, traffic=None, weather=None ):
+    """
+        Células selecionadas pelos filtros da barra lateral (mesma semântica
+        de utils.cube.filter_cube).
+    """
+    return filter_cube( sketches['cells'], date=date, traffic=traffic, weather=weather )
+
+
+def _gather( hashes, starts, stops ):
+    # Concatena as fatias [start, stop) sem um loop em Python
+    comprimentos = stops - starts
+    total = int( comprimentos.sum() )
+    inicio_da_fatia = np.repeat( starts - ( np.cumsum( comprimentos ) - comprimentos ), comprimentos )
+
+    return hashes[inicio_da_fatia + np.arange( total )]
+
+
+def _count( sketches, cells, exact_limit ):
+    p = sketches['p']
+
+    dense = cells['dense'].to_numpy()
+    starts, stops = cells['start'].to_numpy(), cells['stop'].to_numpy()
+
+    # Sem células densas todos os hashes estão guardados: a união é exata
+    if not ( dense >= 0 ).any() and ( exact_limit is None or ( stops - starts ).sum() <= exact_limit ):
+        return int( len( np.unique( _gather( sketches['hashes'], starts, stops ) ) ) )
+
+    regs = registers( _gather( sketches['keys'], starts, stops ), p )
+    if ( dense >= 0 ).any():
+        regs = np.maximum( regs, sketches['registers'][dense[dense >= 0]].max( axis=0 ) )
+
+    return int( round( estimate( regs ) ) )
+
+
+@timed( 'aggregate' )
+def count_distinct( sketches, cells, exact_limit=DISTINCT_EXACT ):
+    """
+        Valores distintos na união das células `cells` (linhas de
+        filter_cells): exato quando só há células esparsas, estimativa do
+        HLL quando alguma célula densa está selecionada.
+    """
+    return _count( sketches, cells, exact_limit )
+
+
+def count_distinct_by( sketches, cells, labels, exact_limit=DISTINCT_EXACT ):
+    """
+        count_distinct para cada valor de `labels` (um rótulo por célula, ex.:
+        a semana de Order_Date). Retorna uma Series ordenada pelo rótulo.
+    """
+    labels = np.asarray( labels )
+    grupos = np.unique( labels )
+
+    return pd.Series( [ _count( sketches, cells.loc[labels == grupo, :], exact_limit ) for grupo in grupos ],
+                      index=grupos, dtype='int64' )
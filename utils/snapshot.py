@@ -0,0 +1,203 @@
+# ==================================
+# ===    Snapshot colunar    =====
+# ==================================
+# O snapshot é o dataset limpo publicado uma vez para todos os processos do
+# servidor: cada worker o abre via memory-map, somente leitura e sem cópia
+# das colunas numéricas, de data e de texto (as páginas do arquivo ficam no
+# cache do sistema operacional, compartilhadas). Com CURRY_SNAPSHOT_DIR num
+# tmpfs (ex.: /dev/shm/curry) o arquivo é um segmento de memória compartilhada.
+# Cada versão do dataset é um arquivo novo publicado com os.replace: quem já
+# abriu a versão anterior continua com ela até recarregar, e o arquivo da
+# versão anterior da mesma origem é removido (supersede).
+import os
+import glob
+import shutil
+import hashlib
+import contextlib
+
+import pandas as pd
+import pyarrow as pa
+
+SNAPSHOT_DIR = os.environ.get( 'CURRY_SNAPSHOT_DIR', 'dataset/.snapshots' )
+
+# Incrementar sempre que o esquema do dataset limpo (clean_code + colunas derivadas
+# + utils.schema), a ordem das linhas ou o formato do arquivo mudar
+SNAPSHOT_VERSION = 7
+
+
+def snapshot_path( digest, snapshot_dir=SNAPSHOT_DIR, name='clean' ):
+    """
+        Caminho do snapshot `name` (dataset limpo ou artefato derivado, como o
+        cubo) para o hash `digest` da origem.
+    """
+    return os.path.join( snapshot_dir, '{}-v{}-{}.arrow'.format( name, SNAPSHOT_VERSION, digest ) )
+
+
+def write_arrow( df, path, preserve_index=True ):
+    """
+        Grava um DataFrame em Arrow IPC (sem compressão, para permitir
+        memory-map). A escrita vai para um arquivo temporário e é publicada
+        com os.replace, então leitores nunca veem um arquivo pela metade.
+    """
+    os.makedirs( os.path.dirname( path ) or '.', exist_ok=True )
+
+    table = pa.Table.from_pandas( df, preserve_index=preserve_index )
+
+    # NaN dos floats gravado como valor, e não como nulo: sem bitmap de nulos
+    # a coluna é lida sem cópia (read_arrow( zero_copy=True ))
+    for i, field in enumerate( table.schema ):
+        if pa.types.is_floating( field.type ) and field.name in df.columns:
+            values = pa.array( df[field.name].to_numpy(), type=field.type, from_pandas=False )
+            table = table.set_column( i, field, values )
+
+    tmp_path = '{}.tmp-{}'.format( path, os.getpid() )
+    with pa.OSFile( tmp_path, 'wb' ) as sink:
+        with pa.ipc.new_file( sink, table.schema ) as writer:
+            writer.write_table( table )
+    os.replace( tmp_path, path )
+
+    return path
+
+
+def _string_dtype( arrow_type ):
+    # Texto continua nos buffers do Arrow (string[pyarrow]) em vez de virar
+    # um objeto Python por linha
+    if arrow_type in ( pa.string(), pa.large_string() ):
+        return pd.StringDtype( 'pyarrow' )
+
+    return None
+
+
+def read_arrow( path, columns=None, zero_copy=False ):
+    """
+        Lê um arquivo Arrow IPC via memory-map. Com `columns`, apenas essas
+        colunas (e o índice) são convertidas para pandas; as demais nunca
+        saem do mapa.
+            - zero_copy: as colunas numéricas/datas sem nulos e o texto
+              (string[pyarrow]) apontam para o mapa, sem cópia (arrays
+              somente leitura); só as categorias e os códigos são copiados
+    """
+    table = pa.ipc.open_file( pa.memory_map( path, 'r' ) ).read_all()
+
+    if columns is not None:
+        metadata = table.schema.pandas_metadata or {}
+        index_cols = [ col for col in metadata.get( 'index_columns', [] ) if isinstance( col, str ) ]
+        table = table.select( list( columns ) + index_cols )
+
+    if zero_copy:
+        # split_blocks: uma coluna por bloco, sem consolidar (copiar) as colunas do mesmo tipo
+        return table.to_pandas( split_blocks=True, types_mapper=_string_dtype )
+
+    return table.to_pandas()
+
+
+def _source_id( source ):
+    # Identificador estável da origem (csv ou store) no nome do ponteiro
+    return hashlib.sha1( os.path.abspath( source ).encode() ).hexdigest()[:12]
+
+
+def _remove( path ):
+    if os.path.isdir( path ):
+        shutil.rmtree( path, ignore_errors=True )
+    elif os.path.exists( path ):
+        os.remove( path )
+
+
+def supersede( path, source, kind ):
+    """
+        Registra `path` como a versão publicada do artefato `kind` para a
+        origem `source` e remove a versão que ele substitui (outro hash do
+        conteúdo ou formato anterior), com os arquivos auxiliares dela
+        (.lock, .wal). O registro é um ponteiro por origem no diretório de
+        `path` (.<kind>-<id da origem>.current): versões de outras origens
+        no mesmo diretório ficam intactas, e uma versão ainda apontada por
+        outra origem (mesmo conteúdo) não é removida. Os processos que ainda
+        têm a versão antiga mapeada não são afetados.
+    """
+    directory = os.path.dirname( path ) or '.'
+    pointer = os.path.join( directory, '.{}-{}.current'.format( kind, _source_id( source ) ) )
+
+    try:
+        with open( pointer ) as f:
+            previous = f.read().strip()
+    except FileNotFoundError:
+        previous = ''
+
+    tmp_pointer = '{}.tmp-{}'.format( pointer, os.getpid() )
+    with open( tmp_pointer, 'w' ) as f:
+        f.write( os.path.basename( path ) )
+    os.replace( tmp_pointer, pointer )
+
+    if not previous or previous == os.path.basename( path ):
+        return
+
+    for other in glob.glob( os.path.join( glob.escape( directory ), '.{}-*.current'.format( glob.escape( kind ) ) ) ):
+        with open( other ) as f:
+            if f.read().strip() == previous:
+                return
+
+    old_path = os.path.join( directory, previous )
+    for sidecar in glob.glob( '{}.*'.format( glob.escape( old_path ) ) ):
+        if '.tmp-' not in sidecar:
+            _remove( sidecar )
+    _remove( old_path )
+
+
+def write_snapshot( df1, path ):
+    """
+        Grava o snapshot. O índice não é gravado: as linhas são identificadas
+        pela posição.
+    """
+    return write_arrow( df1.reset_index( drop=True ), path, preserve_index=False )
+
+
+def read_snapshot( path, columns=None ):
+    return read_arrow( path, columns, zero_copy=True )
+
+
+@contextlib.contextmanager
+def publish_lock( path ):
+    """
+        Trava exclusiva entre processos para publicar `path`: só um worker
+        lê e limpa o csv; os outros esperam e abrem o snapshot publicado.
+        Sem fcntl (Windows) não trava.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+
+    os.makedirs( os.path.dirname( path ) or '.', exist_ok=True )
+    with open( '{}.lock'.format( path ), 'w' ) as f:
+        fcntl.flock( f, fcntl.LOCK_EX )
+        try:
+            yield
+        finally:
+            fcntl.flock( f, fcntl.LOCK_UN )
+
+
+def publish_snapshot( path, build, columns=None, source=None ):
+    """
+        Abre o snapshot `path` sem cópia; se ainda não existe, um único
+        processo executa build() (DataFrame) e o publica, enquanto os demais
+        esperam a trava e abrem o mesmo arquivo. Se o diretório não aceita
+        escrita, retorna o frame construído (cópia própria do processo).
+        Com `source` (csv ou store de origem), o snapshot aberto passa a ser
+        a versão dessa origem e a versão que ele substitui é removida
+        (supersede); snapshots de outros datasets ficam intactos.
+    """
+    if not os.path.exists( path ):
+        try:
+            with publish_lock( path ):
+                if not os.path.exists( path ):
+                    write_snapshot( build(), path )
+        except OSError:
+            df = build()
+            return df if columns is None else df.loc[:, list( columns )]
+
+    if source is not None:
+        with contextlib.suppress( OSError ):
+            supersede( path, source, os.path.basename( path ).split( '-v' )[0] )
+
+    return read_snapshot( path, columns )
@@ -0,0 +1,232 @@
+# ==================================
+# ===    Índice espacial    =====
+# ==================================
+# Índice em grade sobre as coordenadas de entrega e de restaurante, a partir
+# das chaves de célula gravadas na ingestão (utils.geo: bits intercalados,
+# como no geohash). Para cada tipo de ponto as linhas ficam ordenadas pela
+# chave da célula, com o início de cada célula no array ordenado:
+#     - densidade por célula, em qualquer nível da grade: soma por célula,
+#       sem percorrer as linhas
+#     - retângulo (bounding box): as células que o cobrem viram intervalos de
+#       chaves, e só as linhas dessas células são lidas
+#     - restaurante mais próximo: busca nas células de um quadrado ao redor
+#       do ponto, ampliado até conter os k mais próximos
+# Tudo local: nenhuma consulta a serviço de mapas ou de tiles.
+import math
+
+import numpy as np
+import pandas as pd
+
+from utils.loader import DATASET_PATH, load_dataset, load_derived
+from utils.geo import ( EARTH_RADIUS_KM, GRID_BITS, GEOCELL_COLUMNS, cell_center, grid_xy, haversine_km, interleave,
+                        restaurant_location )
+from utils.profiling import timed
+
+SPATIAL_COLUMNS = [ 'Restaurant_latitude', 'Restaurant_longitude',
+                    'Delivery_location_latitude', 'Delivery_location_longitude' ] + GEOCELL_COLUMNS
+
+# Tipos de ponto das linhas do dataset
+KINDS = [ 'delivery', 'restaurant' ]
+
+# Teto de células na cobertura de um retângulo: retângulos grandes são
+# cobertos por células mais grossas (menos intervalos de chaves, mais
+# linhas conferidas na borda)
+MAX_QUERY_CELLS = 1024
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def point_index( keys, lat, lon ):
+    """
+        Índice de um conjunto de pontos com chave de célula `keys`:
+            - cells: chaves distintas, ordenadas
+            - offsets: início de cada célula em rows (e o total no fim)
+            - rows: posição de cada ponto, na ordem das células
+            - lat / lon: coordenadas na mesma ordem de rows
+        Pontos sem localização (chave -1) ficam fora do índice.
+    """
+    keys = np.asarray( keys )
+    validos = np.flatnonzero( keys >= 0 )
+    rows = validos[np.argsort( keys[validos], kind='stable' )]
+    cells, starts = np.unique( keys[rows], return_index=True )
+
+    return { 'cells': cells.astype( 'int64' ),
+             'offsets': np.append( starts, len( rows ) ),
+             'rows': rows,
+             'lat': np.asarray( lat )[rows],
+             'lon': np.asarray( lon )[rows] }
+
+
+def build_spatial_index( df1 ):
+    """
+        Esta função monta o índice espacial do dataset (com as colunas de
+        SPATIAL_COLUMNS), com as posições das linhas de df1:
+            - delivery / restaurant: point_index dos locais de entrega e dos
+              restaurantes de cada pedido
+            - restaurants: point_index dos restaurantes distintos, com orders
+              (pedidos de cada restaurante)
+            - bounds: { tipo: ( lat_min, lat_max, lon_min, lon_max ) }
+    """
+    rest_lat, rest_lon = restaurant_location( df1 )
+    index = { 'rows': len( df1 ),
+              'delivery': point_index( df1['delivery_cell'].to_numpy(), df1['Delivery_location_latitude'].to_numpy(),
+                                       df1['Delivery_location_longitude'].to_numpy() ),
+              'restaurant': point_index( df1['restaurant_cell'].to_numpy(), rest_lat, rest_lon ) }
+
+    pedidos = index['restaurant']
+    locais = ( pd.DataFrame( { 'cell': df1['restaurant_cell'].to_numpy()[pedidos['rows']],
+                               'lat': pedidos['lat'], 'lon': pedidos['lon'] } )
+                 .groupby( [ 'cell', 'lat', 'lon' ], sort=True )
+                 .size() )
+    index['restaurants'] = point_index( locais.index.get_level_values( 'cell' ),
+                                        locais.index.get_level_values( 'lat' ), locais.index.get_level_values( 'lon' ) )
+    index['restaurants']['orders'] = locais.to_numpy()[index['restaurants']['rows']]
+
+    index['bounds'] = { kind: ( float( index[kind]['lat'].min() ), float( index[kind]['lat'].max() ),
+                                float( index[kind]['lon'].min() ), float( index[kind]['lon'].max() ) )
+                        for kind in KINDS if len( index[kind]['rows'] ) }
+
+    return index
+
+
+def load_spatial_index( path=DATASET_PATH ):
+    """
+        Índice espacial da versão atual do dataset, construído uma vez por processo.
+    """
+    return load_derived( 'spatial_index',
+                         lambda: build_spatial_index( load_dataset( path, SPATIAL_COLUMNS ) ),
+                         path=path )
+
+
+def _ranges( starts, stops ):
+    # Concatena os intervalos [start, stop) sem um loop em Python
+    comprimentos = stops - starts
+    total = int( comprimentos.sum() )
+    inicio_do_intervalo = np.repeat( starts - ( np.cumsum( comprimentos ) - comprimentos ), comprimentos )
+
+    return inicio_do_intervalo + np.arange( total )
+
+
+def covering_ranges( bbox, max_cells=MAX_QUERY_CELLS ):
+    """
+        Intervalos de chaves [lo, hi) das células que cobrem o retângulo
+        bbox = ( lat_min, lat_max, lon_min, lon_max ): até max_cells células,
+        no nível mais fino em que a cobertura cabe nesse teto, com os
+        intervalos contíguos já unidos.
+    """
+    lat_min, lat_max, lon_min, lon_max = bbox
+    x0, y0 = ( int( v ) for v in grid_xy( lat_min, lon_min ) )
+    x1, y1 = ( int( v ) for v in grid_xy( lat_max, lon_max ) )
+
+    shift = 0
+    while ( ( x1 >> shift ) - ( x0 >> shift ) + 1 ) * ( ( y1 >> shift ) - ( y0 >> shift ) + 1 ) > max_cells:
+        shift += 1
+
+    xs, ys = np.meshgrid( np.arange( x0 >> shift, ( x1 >> shift ) + 1 ), np.arange( y0 >> shift, ( y1 >> shift ) + 1 ) )
+    keys = np.sort( interleave( xs.ravel(), ys.ravel() ) )
+    lo, hi = keys << ( 2 * shift ), ( keys + 1 ) << ( 2 * shift )
+
+    inicio = np.append( True, lo[1:] != hi[:-1] )
+    fim = np.append( inicio[1:], True )
+
+    return lo[inicio], hi[fim]
+
+
+def _cells_in( points, lo, hi ):
+    # Intervalos [a, b) de índices em points['cells'] das chaves em [lo, hi)
+    return np.searchsorted( points['cells'], lo ), np.searchsorted( points['cells'], hi )
+
+
+@timed( 'filter' )
+def query_bbox( index, bbox, kind='delivery' ):
+    """
+        Posições (ordenadas, na ordem do dataset) das linhas cujo ponto
+        `kind` ('delivery' ou 'restaurant') está no retângulo bbox =
+        ( lat_min, lat_max, lon_min, lon_max ), bordas incluídas. Só as
+        linhas das células que cobrem o retângulo são lidas, e só as
+        coordenadas delas são conferidas.
+    """
+    points = index[kind]
+    a, b = _cells_in( points, *covering_ranges( bbox ) )
+    candidatos = _ranges( points['offsets'][a], points['offsets'][b] )
+
+    lat_min, lat_max, lon_min, lon_max = bbox
+    lat, lon = points['lat'][candidatos], points['lon'][candidatos]
+    dentro = ( lat >= lat_min ) & ( lat <= lat_max ) & ( lon >= lon_min ) & ( lon <= lon_max )
+
+    return np.sort( points['rows'][candidatos[dentro]] )
+
+
+@timed( 'aggregate' )
+def cell_density( index, kind='delivery', level=GRID_BITS, bbox=None ):
+    """
+        Pontos `kind` por célula do nível `level` (bits por eixo; cada nível
+        abaixo de GRID_BITS junta 2 x 2 células). Com bbox, só as células
+        que tocam o retângulo. A soma é feita sobre as células do índice,
+        não sobre as linhas. Retorna um DataFrame com cell, lat, lon (centro
+        da célula) e orders, ordenado por cell.
+    """
+    points = index[kind]
+    counts = np.diff( points['offsets'] )
+    cells = points['cells']
+
+    if bbox is not None:
+        a, b = _cells_in( points, *covering_ranges( bbox ) )
+        posicoes = _ranges( a, b )
+        cells, counts = cells[posicoes], counts[posicoes]
+
+    grossas = cells >> ( 2 * ( GRID_BITS - level ) )
+    chaves, inicios = np.unique( grossas, return_index=True )
+    orders = np.add.reduceat( counts, inicios ) if len( inicios ) else counts[:0]
+    lat, lon = cell_center( chaves, level )
+
+    return pd.DataFrame( { 'cell': chaves, 'lat': lat, 'lon': lon, 'orders': orders } )
+
+
+def _box( lat, lon, km ):
+    # Retângulo ( lat_min, lat_max, lon_min, lon_max ) que contém o círculo de
+    # raio `km` ao redor do ponto (com folga para a curvatura)
+    dlat = 1.1 * km / KM_PER_DEGREE
+    dlon = dlat / max( math.cos( math.radians( min( abs( lat ) + dlat, 89.0 ) ) ), 1e-6 )
+
+    return max( lat - dlat, -90.0 ), min( lat + dlat, 90.0 ), max( lon - dlon, -180.0 ), min( lon + dlon, 180.0 )
+
+
+@timed( 'aggregate' )
+def nearest_restaurants( index, lat, lon, k=1 ):
+    """
+        Os k restaurantes (locais distintos) mais próximos de ( lat, lon ):
+        busca nas células de um quadrado ao redor do ponto, que dobra de
+        tamanho até ter k candidatos; o raio final é a distância do k-ésimo
+        candidato, então nenhum restaurante mais próximo fica de fora.
+        Retorna um DataFrame com Restaurant_latitude, Restaurant_longitude,
+        orders e distance_km, do mais próximo ao mais distante.
+    """
+    points = index['restaurants']
+    k = min( k, len( points['rows'] ) )
+
+    # Raio inicial: o lado de uma célula da grade
+    raio = KM_PER_DEGREE * 180.0 / ( 1 << GRID_BITS )
+    while True:
+        a, b = _cells_in( points, *covering_ranges( _box( lat, lon, raio ) ) )
+        candidatos = _ranges( points['offsets'][a], points['offsets'][b] )
+        distancias = haversine_km( lat, lon, points['lat'][candidatos], points['lon'][candidatos] )
+
+        if len( candidatos ) >= k and k > 0:
+            kesimo = np.partition( distancias, k - 1 )[k - 1]
+            # O quadrado contém tudo até `raio`: com o k-ésimo dentro dele, acabou
+            if kesimo <= raio:
+                break
+            raio = kesimo
+        elif raio >= math.pi * EARTH_RADIUS_KM:
+            break
+        else:
+            raio *= 2
+
+    ordem = np.argsort( distancias, kind='stable' )[:k]
+    escolhidos = candidatos[ordem]
+
+    return pd.DataFrame( { 'Restaurant_latitude': points['lat'][escolhidos],
+                           'Restaurant_longitude': points['lon'][escolhidos],
+                           'orders': points['orders'][escolhidos],
+                           'distance_km': distancias[ordem] } )
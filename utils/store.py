@@ -0,0 +1,57 @@
+# ==================================
+# ===    Store incremental    =====
+# ==================================
+# Diretório com o dataset limpo particionado por lote de ingestão:
+#     manifest.json      versão, partes e artefatos derivados
+#     part-00000.arrow   linhas limpas de cada lote (Arrow IPC)
+#     ids-00000.npy      hashes ordenados dos IDs de cada parte
+#     cube-v<versão>.arrow cubo pré-agregado (utils.cube) da versão
+import os
+import json
+
+import pandas as pd
+
+from utils.snapshot import read_arrow
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def is_store( path ):
+    return os.path.isdir( path )
+
+
+def manifest_path( store_dir ):
+    return os.path.join( store_dir, MANIFEST_NAME )
+
+
+def read_manifest( store_dir ):
+    """
+        Retorna o manifesto do store (ou um manifesto vazio se ainda não existe).
+    """
+    try:
+        with open( manifest_path( store_dir ) ) as f:
+            return json.load( f )
+    except FileNotFoundError:
+        return { 'version': 0, 'rows': 0, 'parts': [], 'ids': [], 'cube': None }
+
+
+def write_manifest( store_dir, manifest ):
+    # Publicação atômica: a nova versão só fica visível depois do os.replace
+    path = manifest_path( store_dir )
+    tmp_path = '{}.tmp-{}'.format( path, os.getpid() )
+    with open( tmp_path, 'w' ) as f:
+        json.dump( manifest, f, indent=2 )
+    os.replace( tmp_path, path )
+
+
+def read_store( store_dir, columns=None ):
+    """
+        Lê (via memory-map) e concatena as partes do store.
+    """
+    manifest = read_manifest( store_dir )
+    parts = [ read_arrow( os.path.join( store_dir, part ), columns ) for part in manifest['parts'] ]
+
+    if not parts:
+        raise FileNotFoundError( 'store vazio: {}'.format( store_dir ) )
+
+    return pd.concat( parts, ignore_index=True )
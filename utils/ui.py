@@ -0,0 +1,79 @@
+# ==================================
+# ===    Componentes Streamlit    =====
+# ==================================
+import pandas as pd
+import streamlit as st
+
+from utils.profiling import PROFILE_ENABLED, start_rerun, finish_rerun
+
+
+def sidebar_progress( label='Carregando dados' ):
+    """
+        Retorna um callback( fração, linhas ) que mostra o progresso da leitura
+        na barra lateral. A barra só é criada se o callback for chamado, ou
+        seja, quando o dataset não está em cache.
+    """
+    state = {}
+
+    def callback( fraction, rows ):
+        if not state:
+            state['bar'] = st.sidebar.progress( 0 )
+            state['text'] = st.sidebar.empty()
+
+        state['bar'].progress( min( int( fraction * 100 ), 100 ) )
+        state['text'].caption( '{}: {:,} linhas'.format( label, rows ) )
+
+        if fraction >= 1.0:
+            state['bar'].empty()
+            state['text'].empty()
+
+    return callback
+
+
+def view_selector( views, label='Visão' ):
+    """
+        Seletor da visão ativa (no lugar de st.tabs, que executa o corpo de
+        todas as abas a cada rerun): a página só executa o bloco da visão
+        retornada. Com uma única visão, nenhum widget é mostrado.
+    """
+    if len( views ) == 1:
+        return views[0]
+
+    return st.radio( label, views, horizontal=True )
+
+
+def deferred_section( label, value=False ):
+    """
+        Seção cara adiada até o usuário pedir: retorna o estado de um
+        checkbox, e a página só calcula a seção quando ele está marcado.
+    """
+    return st.checkbox( label, value=value )
+
+
+def start_profiling( page ):
+    """
+        Abre o profiling do rerun se CURRY_PROFILE estiver ligado ou se a
+        url tiver ?profile=1. Chamar no início do script da página. As
+        sessões ligadas só pela url ficam no painel da barra lateral: não
+        gravam em arquivo (qualquer visitante pode pedir ?profile=1).
+    """
+    params = st.experimental_get_query_params() or {}
+    requested = params.get( 'profile', [ '' ] )[0].lower() in ( '1', 'true', 'yes' )
+
+    return start_rerun( page, enabled=PROFILE_ENABLED or requested, persist=PROFILE_ENABLED )
+
+
+def profiling_panel():
+    """
+        Fecha o profiling do rerun e mostra os spans num painel da barra
+        lateral. Chamar no fim do script da página.
+    """
+    record = finish_rerun()
+    if record is None:
+        return None
+
+    with st.sidebar.expander( 'Profiling do rerun' ):
+        st.caption( 'total: {:.1f} ms'.format( record['total_ms'] ) )
+        st.dataframe( pd.DataFrame( record['spans'], columns=[ 'name', 'calls', 'ms' ] ) )
+
+    return record
@@ -0,0 +1,119 @@
+# ==================================
+# ===    Visão Empresa (cálculos)    =====
+# ==================================
+# Funções auxiliares da página pages/1_visao_empresa.py, sem Streamlit:
+# importáveis pelos benchmarks (benchmarks/run.py).
+import numpy as np
+import plotly.express as px
+
+from utils.metrics import KPI
+from utils.maps import build_county_map
+from utils.charts import downsample, render_mode
+from utils.sketch import count_distinct_by
+from utils.calendar_dim import bucketize, bucket_keys
+from utils.profiling import timed
+
+# KPIs da Visão Gerencial, calculados juntos por utils.metrics.run_kpis
+PAGE_KPIS = [ KPI( 'orders_by_date', ['Order_Date'], None ),
+              KPI( 'orders_by_traffic', ['Road_traffic_density'], None ),
+              KPI( 'orders_by_city_traffic', ['City', 'Road_traffic_density'], None ) ]
+
+# Colunas usadas pela página: as demais não são carregadas do snapshot
+COLUMNS = [ 'ID', 'Order_Date', 'Road_traffic_density', 'City', 'Delivery_person_ID',
+            'Delivery_location_latitude', 'Delivery_location_longitude', 'delivery_cell' ]
+
+
+def order_metrics( df_kpi ):
+    # Order Mertrics: pedidos por dia (KPI 'orders_by_date')
+    df_aux = df_kpi.rename( columns={ 'orders': 'ID' } )
+    # Períodos longos: mantém mínimos e máximos de cada intervalo
+    df_aux = downsample( df_aux, 'Order_Date', 'ID', method='minmax' )
+    # Desenhar o gráfico de Barras
+    fig = px.bar(df_aux, x='Order_Date', y='ID')
+
+    return fig
+
+def traffic_order_share( df_kpi ):
+    # Order Mertrics Share (KPI 'orders_by_traffic')
+    df_aux = df_kpi.rename( columns={ 'orders': 'ID' } )
+    # Criaçao. da metrica
+    df_aux['entregas_perc'] = df_aux['ID'] / df_aux['ID'].sum()
+    # Desenhar o gráfico de pizza
+    fig = px.pie( df_aux, values='entregas_perc', names='Road_traffic_density' )
+
+    return fig
+
+def traffic_order_city( df_kpi ):
+    # Traffic Order by city (KPI 'orders_by_city_traffic')
+    df_aux = df_kpi.rename( columns={ 'orders': 'ID' } )
+    # Desenhar o gráfico de scatter (WebGL quando há muitos pontos)
+    fig  = px.scatter( df_aux, x='City', y= 'Road_traffic_density', size='ID', color='City',
+                       render_mode=render_mode( len( df_aux ) ) )
+
+    return fig
+
+@timed( 'aggregate' )
+def period_orders( df1, granularity='week' ):
+    # Pedidos e entregadores únicos por período ( 'day', 'week' ou 'month' ),
+    # numa única agregação pelas chaves de calendário (utils.calendar_dim),
+    # sem criar colunas em df1 (uma view do dataset compartilhado)
+    return bucketize( df1, granularity, { 'ID': 'count', 'Delivery_person_ID': 'nunique' } )
+
+@timed( 'aggregate' )
+def period_orders_sketch( df_orders, sketches, cells, granularity='week' ):
+    # O mesmo de period_orders sem percorrer as linhas: pedidos somados por
+    # período a partir de df_orders ( Order_Date, orders; ex.: o cubo
+    # filtrado ) e entregadores distintos pela união dos sketches das células
+    # do período (utils.sketch; aproximado em períodos com muitos entregadores)
+    df_aux = bucketize( df_orders, granularity, { 'orders': 'sum' } ).rename( columns={ 'orders': 'ID' } )
+
+    keys = np.unique( bucket_keys( df_orders, granularity ) )
+    distintos = count_distinct_by( sketches, cells, bucket_keys( cells, granularity ) )
+    df_aux['Delivery_person_ID'] = distintos.reindex( keys, fill_value=0 ).to_numpy()
+
+    return df_aux
+
+def orders_by_period( df_periods ):
+    # Pedidos por período (df_periods: period_orders; a primeira coluna é o período)
+    period = df_periods.columns[0]
+    df_aux = df_periods.loc[:, [period, 'ID']]
+    # WebGL decidido pelo tamanho da série inteira, antes da redução
+    modo = render_mode( len( df_aux ) )
+    df_aux = downsample( df_aux, period, 'ID' )
+    # Desenhar um gráfico de linhas
+    fig = px.line( df_aux, x=period, y='ID', render_mode=modo )
+
+    return fig
+
+def orders_share_by_period( df_periods ):
+    # Quantidade de pedidos por período / numero unico de entregadores por período
+    period = df_periods.columns[0]
+    df_aux = df_periods.loc[:, [period, 'ID', 'Delivery_person_ID']]
+    # Feature engeniering em df_aux (uma cópia: df_periods não é alterado)
+    df_aux['order_by_delivery'] = df_aux['ID'] / df_aux['Delivery_person_ID']
+    modo = render_mode( len( df_aux ) )
+    df_aux = downsample( df_aux, period, 'order_by_delivery' )
+    # Desenhar um gráfico de linhas
+    fig = px.line( df_aux, x=period, y='order_by_delivery', render_mode=modo )
+
+    return fig
+
+
+def compute_page( source, granularity='week' ):
+    """
+        Todos os cálculos da página para um estado dos filtros, sem Streamlit
+        e sem os caches de figuras/mapa (usado pelos benchmarks), com os
+        mesmos métodos da fonte que a página usa:
+            - source: fonte de utils.backend com os filtros da página
+            - granularity: período dos gráficos de pedidos ( 'day', 'week', 'month' )
+        Retorna { nome: figura } com as figuras e o mapa (folium) da página.
+    """
+    kpis = source.kpis( PAGE_KPIS )
+    df_periods = source.period_orders( granularity )
+
+    return { 'orders_by_day': order_metrics( kpis['orders_by_date'] ),
+             'traffic_order_share': traffic_order_share( kpis['orders_by_traffic'] ),
+             'traffic_order_city': traffic_order_city( kpis['orders_by_city_traffic'] ),
+             'orders_by_period': orders_by_period( df_periods ),
+             'orders_share_by_period': orders_share_by_period( df_periods ),
+             'county_map': build_county_map( source.rows() ) }
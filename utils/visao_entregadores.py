@@ -0,0 +1,67 @@
+# ==================================
+# ===    Visão Entregadores (cálculos)    =====
+# ==================================
+# Funções auxiliares da página pages/2_visao_entregadores.py, sem Streamlit:
+# importáveis pelos benchmarks (benchmarks/run.py).
+from utils.metrics import KPI
+from utils.profiling import timed
+from utils.schema import plain
+
+# KPIs da página, calculados juntos por utils.metrics.run_kpis
+PAGE_KPIS = [ KPI( 'ratings_traffic', ['Road_traffic_density'], 'Delivery_person_Ratings' ),
+              KPI( 'ratings_weather', ['Weatherconditions'], 'Delivery_person_Ratings' ) ]
+
+# Tamanho dos rankings de entregadores e mínimo de pedidos para entrar neles
+TOP_K = 10
+MIN_ORDERS = 1
+
+# Colunas usadas pela página: as demais não são carregadas do snapshot
+COLUMNS = [ 'Delivery_person_ID', 'Delivery_person_Age', 'Delivery_person_Ratings', 'Vehicle_condition',
+            'Road_traffic_density', 'Weatherconditions', 'City', 'Time_taken(min)', 'Order_Date' ]
+
+
+@timed( 'aggregate' )
+def age_vehicle_metrics( df1 ):
+    # Maior e menor idade dos entregadores, melhor e pior condição dos veículos
+    maior_idade = df1.loc[: , 'Delivery_person_Age'].max()
+    menor_idade = df1.loc[: , 'Delivery_person_Age'].min()
+    melhor_condicao = df1.loc[:, 'Vehicle_condition'].max()
+    pior_condicao =  df1.loc[:, 'Vehicle_condition'].min()
+
+    return maior_idade, menor_idade, melhor_condicao, pior_condicao
+
+@timed( 'aggregate' )
+def avg_ratings_by_delivery( df1 ):
+    # Avaliação média por entregador
+    df_avg_ratings = ( df1.loc[:, ['Delivery_person_Ratings','Delivery_person_ID']]
+                             .groupby( 'Delivery_person_ID', observed=True )
+                             .mean()
+                             .reset_index() )
+
+    return plain( df_avg_ratings )
+
+def avg_std_ratings( df_kpi, col ):
+    # Avaliação média e desvio padrão por `col` (KPIs 'ratings_traffic' / 'ratings_weather')
+    df_aux = df_kpi.loc[:, [col, 'mean', 'std']]
+    df_aux.columns = [col, 'delivery_mean', 'delivery_std']
+
+    return df_aux
+
+
+def compute_page( source ):
+    """
+        Todos os cálculos da página para um estado dos filtros, sem Streamlit
+        (usado pelos benchmarks), com os mesmos métodos da fonte que a
+        página usa:
+            - source: fonte de utils.backend com os filtros da página
+        Retorna { nome: resultado } com as métricas e tabelas da página.
+    """
+    kpis = source.kpis( PAGE_KPIS )
+    df_fastest, df_slowest = source.top_bottom_k( k=TOP_K, min_orders=MIN_ORDERS )
+
+    return { 'age_vehicle_metrics': source.age_vehicle_metrics(),
+             'avg_ratings_by_delivery': source.avg_ratings_by_delivery(),
+             'ratings_traffic': avg_std_ratings( kpis['ratings_traffic'], 'Road_traffic_density' ),
+             'ratings_weather': avg_std_ratings( kpis['ratings_weather'], 'Weatherconditions' ),
+             'fastest': df_fastest,
+             'slowest': df_slowest }
@@ -0,0 +1,121 @@
+# ==================================
+# ===    Visão Restaurantes (cálculos)    =====
+# ==================================
+# Funções auxiliares da página pages/3_visao_restaurantes.py, sem Streamlit:
+# importáveis pelos benchmarks (benchmarks/run.py).
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from utils.metrics import KPI
+from utils.profiling import timed
+
+# KPIs da página, calculados juntos por utils.metrics.run_kpis
+PAGE_KPIS = [ KPI( 'festival', ['Festival'], 'Time_taken(min)' ),
+              KPI( 'city', ['City'], 'Time_taken(min)' ),
+              KPI( 'city_order', ['City', 'Type_of_order'], 'Time_taken(min)' ),
+              KPI( 'city_traffic', ['City', 'Road_traffic_density'], 'Time_taken(min)' ),
+              KPI( 'distance', [], 'distance_km' ),
+              KPI( 'city_distance', ['City'], 'distance_km' ) ]
+
+# Colunas usadas pela página: as demais não são carregadas do snapshot
+# (as métricas de tempo e distância vêm do cubo pré-agregado)
+COLUMNS = [ 'Delivery_person_ID', 'Road_traffic_density', 'Weatherconditions', 'Order_Date' ]
+
+
+@timed( 'aggregate' )
+def unique_deliveries( df1 ):
+    #Quantidade de entregadores únicos
+    delivery_unique = len(df1.loc[:, 'Delivery_person_ID'].unique())
+
+    return delivery_unique
+
+def distance( df_kpi ):
+    # distance_km é calculada na ingestão (utils.geo.add_distance)
+    avg_distance = np.round( df_kpi.loc[0, 'mean'], 2) 
+
+    return avg_distance
+
+def avg_std_time_delivery_festival( df_kpi, festival, op):
+    """"
+        Esta funçao tem como objetivo calcular a distancia média e o desvio padrao das entregas com e sem festival
+        Parametros: 
+            Input:
+                - df_kpi: KPI 'festival' de PAGE_KPIS (tempo por Festival)
+                - festival: 
+                    'Yes': para dias em que há festivais 
+                    'No': para dias em que nao há festivais
+                - op
+                    'avg_time': calcula a média da distancia
+                    'std_time': calcula o desvio padrao da media
+            Output:
+                - df: Dataframe com uma linha e uma métrica
+            
+    """
+
+    df_aux = df_kpi.loc[:, ['Festival', 'mean', 'std']]
+
+    df_aux.columns = [ 'Festival', 'avg_time', 'std_time'] 
+    df_aux = np.round( df_aux.loc[df_aux['Festival'] == festival, op], 2)
+
+    return df_aux
+
+def avg_std_time_by_city( df_kpi ):
+    df_aux = df_kpi.loc[:, ['City', 'mean', 'std']]
+    df_aux.columns = ['City', 'avg_time', 'std_time']
+
+    fig = go.Figure() 
+    fig.add_trace( go.Bar( name='Control', x=df_aux['City'], y=df_aux['avg_time'], error_y=dict(type='data', array=df_aux['std_time']))) 
+    fig.update_layout(barmode='group') 
+
+    return fig 
+
+def avg_std_time_by_city_order( df_kpi ):
+    df_aux = df_kpi.loc[:, ['City', 'Type_of_order', 'mean', 'std']]
+
+    df_aux.columns = ['City', 'Type_of_order', 'avg_time', 'std_time']
+
+    return df_aux
+
+def avg_time_by_city ( df_kpi ): 
+    avg_distance = df_kpi.loc[:, ['City', 'mean']]
+    fig = go.Figure( data=[ go.Pie( labels=avg_distance['City'], values=avg_distance['mean'], pull=[0, 0.1, 0])])
+
+    return fig
+
+def avg_time_by_city_traffic( df_kpi ):
+
+    df_aux = df_kpi.loc[:, ['City', 'Road_traffic_density', 'mean', 'std']]
+
+    df_aux.columns = ['City', 'Road_traffic_density', 'avg_time', 'std_time']
+
+    fig = px.sunburst(df_aux, path=['City', 'Road_traffic_density'], values='avg_time',
+                      color='std_time', color_continuous_scale='RdBu',
+                      color_continuous_midpoint=np.average(df_aux['std_time'] ) )
+
+    return fig
+
+
+def compute_page( source ):
+    """
+        Todos os cálculos da página para um estado dos filtros, sem Streamlit
+        e sem o cache de figuras (usado pelos benchmarks), com os mesmos
+        métodos da fonte que a página usa (entregadores distintos pelos
+        sketches, e não unique_deliveries):
+            - source: fonte de utils.backend com os filtros da página
+        Retorna { nome: resultado } com as métricas, a tabela e as figuras da página.
+    """
+    kpis = source.kpis( PAGE_KPIS )
+
+    results = { 'unique_deliveries': source.unique_deliveries(),
+                'distance': distance( kpis['distance'] ) }
+    for festival in [ 'Yes', 'No' ]:
+        for op in [ 'avg_time', 'std_time' ]:
+            results['festival_{}_{}'.format( festival, op )] = avg_std_time_delivery_festival( kpis['festival'], festival, op )
+
+    results.update( { 'avg_std_time_by_city': avg_std_time_by_city( kpis['city'] ),
+                      'avg_std_time_by_city_order': avg_std_time_by_city_order( kpis['city_order'] ),
+                      'avg_time_by_city': avg_time_by_city( kpis['city_distance'] ),
+                      'avg_time_by_city_traffic': avg_time_by_city_traffic( kpis['city_traffic'] ) } )
+
+    return results
@@ -0,0 +1,360 @@
+# ==================================
+# ===    Backend DuckDB    =====
+# ==================================
+# Banco DuckDB embutido (um arquivo, sem serviço externo) com o dataset
+# limpo: as agregações das páginas rodam em SQL, com os filtros da barra
+# lateral como predicados, sem carregar o histórico inteiro em memória.
+#     dataset/.duckdb/curry-v<versão>-<hash>.duckdb   tabela orders
+# As linhas ficam na ordem de utils.loader.sort_by_date (coluna row_id), e
+# cada função retorna exatamente o formato da função pandas equivalente.
+import os
+import contextlib
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from utils.loader import DATASET_PATH, iter_clean_chunks, dataset_version, load_derived
+from utils.snapshot import read_arrow, supersede
+from utils.store import is_store, read_manifest
+from utils.cube import rollup
+from utils.schema import compact
+from utils.sketch import SKETCH_DIMENSIONS, SKETCH_KEY, build_sketches
+from utils.calendar_dim import GRANULARITIES, add_calendar, bucket_labels
+from utils.geo import add_geocells
+from utils.spatial import SPATIAL_COLUMNS, build_spatial_index
+from utils.profiling import timed
+
+DUCKDB_DIR = os.environ.get( 'CURRY_DUCKDB_DIR', 'dataset/.duckdb' )
+
+# Incrementar sempre que o esquema da tabela orders mudar
+WAREHOUSE_VERSION = 4
+
+TABLE = 'orders'
+
+
+def database_path( digest, duckdb_dir=DUCKDB_DIR ):
+    """
+        Caminho do banco do dataset limpo para o hash `digest` da origem.
+    """
+    return os.path.join( duckdb_dir, 'curry-v{}-{}.duckdb'.format( WAREHOUSE_VERSION, digest ) )
+
+
+def _iter_source( path, progress ):
+    # Mesmos frames limpos do backend pandas: chunks do csv ou partes do store,
+    # com os tipos numéricos compactos (utils.schema); o texto fica VARCHAR
+    if not is_store( path ):
+        for df1 in iter_clean_chunks( path, progress=progress ):
+            yield compact( df1, categoricals=False )
+        return
+
+    manifest = read_manifest( path )
+    rows = 0
+    for i, part in enumerate( manifest['parts'] ):
+        # Partes gravadas antes da dimensão calendário e da grade geográfica
+        # recebem as colunas aqui
+        df1 = read_arrow( os.path.join( path, part ) ).reset_index( drop=True )
+        df1 = compact( add_geocells( add_calendar( df1 ) ), categoricals=False )
+        rows += len( df1 )
+        if progress is not None:
+            progress( ( i + 1 ) / len( manifest['parts'] ), rows )
+
+        yield df1
+
+
+def build_database( path, db_path, progress=None ):
+    """
+        Grava o banco a partir do csv (em chunks, com o teto de memória de
+        utils.loader) ou do store. Cada chunk é inserido numa tabela
+        temporária; a tabela final é ordenada por Order_Date de forma
+        estável (row_id), como o frame do backend pandas. A escrita vai para
+        um arquivo temporário publicado com os.replace.
+    """
+    os.makedirs( os.path.dirname( db_path ) or '.', exist_ok=True )
+
+    tmp_path = '{}.tmp-{}'.format( db_path, os.getpid() )
+    if os.path.exists( tmp_path ):
+        os.remove( tmp_path )
+
+    con = duckdb.connect( tmp_path )
+    try:
+        rows = 0
+        for df1 in _iter_source( path, progress ):
+            # _seq: ordem de leitura, para o desempate da ordenação estável
+            chunk = df1.assign( _seq=np.arange( rows, rows + len( df1 ) ) )
+            con.register( 'chunk', chunk )
+            if rows == 0:
+                con.execute( 'CREATE TABLE staging AS SELECT * FROM chunk' )
+            else:
+                con.execute( 'INSERT INTO staging SELECT * FROM chunk' )
+            con.unregister( 'chunk' )
+            rows += len( df1 )
+
+        con.execute( 'CREATE TABLE {} AS SELECT * EXCLUDE ( _seq ), '
+                     'row_number() OVER ( ORDER BY Order_Date, _seq ) - 1 AS row_id '
+                     'FROM staging ORDER BY row_id'.format( TABLE ) )
+        con.execute( 'DROP TABLE staging' )
+        con.execute( 'CHECKPOINT' )
+    finally:
+        con.close()
+
+    os.replace( tmp_path, db_path )
+
+    # Remove o banco que este substitui para a mesma origem (outro hash do
+    # conteúdo ou formato anterior); bancos de outros datasets ficam intactos
+    supersede( db_path, path, 'curry' )
+
+    return db_path
+
+
+def load_database( path=DATASET_PATH, progress=None ):
+    """
+        Conexão somente leitura ao banco da versão atual do dataset, aberta
+        uma vez por processo (o banco é gravado se ainda não existe).
+        Cada consulta usa o seu próprio cursor: a conexão é compartilhada
+        entre as sessões.
+    """
+    def builder():
+        db_path = database_path( dataset_version( path ) )
+        if not os.path.exists( db_path ):
+            build_database( path, db_path, progress )
+        else:
+            with contextlib.suppress( OSError ):
+                supersede( db_path, path, 'curry' )
+
+        return duckdb.connect( db_path, read_only=True )
+
+    return load_derived( 'duckdb', builder, path=path )
+
+
+def load_sketches( path=DATASET_PATH, progress=None ):
+    """
+        Sketches de entregadores distintos (utils.sketch) construídos a partir
+        dos pares distintos célula x entregador do banco, uma vez por processo.
+    """
+    def builder():
+        con = load_database( path, progress )
+        sql = 'SELECT DISTINCT {} FROM {} WHERE {} IS NOT NULL'.format(
+            ', '.join( _quote( col ) for col in SKETCH_DIMENSIONS + [ SKETCH_KEY ] ), TABLE, _quote( SKETCH_KEY ) )
+
+        return build_sketches( _query( con, sql ) )
+
+    return load_derived( 'duckdb.sketches', builder, path=path )
+
+
+def load_spatial_index( path=DATASET_PATH, progress=None ):
+    """
+        Índice espacial (utils.spatial) das coordenadas do banco, uma vez por
+        processo; as posições das linhas são o row_id.
+    """
+    def builder():
+        con = load_database( path, progress )
+        sql = 'SELECT {} FROM {} ORDER BY row_id'.format( ', '.join( _quote( col ) for col in SPATIAL_COLUMNS ), TABLE )
+
+        return build_spatial_index( _query( con, sql ) )
+
+    return load_derived( 'duckdb.spatial_index', builder, path=path )
+
+
+def _quote( col ):
+    # Nomes como "Time_taken(min)" precisam de aspas no SQL
+    return '"{}"'.format( col.replace( '"', '""' ) )
+
+
+def _where( date=None, traffic=None, weather=None ):
+    # Filtros da barra lateral como predicados ( sql, parâmetros ), com a
+    # mesma semântica de utils.filters.apply_filters
+    predicados, params = [ 'TRUE' ], []
+
+    if date is not None:
+        predicados.append( 'Order_Date < ?' )
+        params.append( pd.Timestamp( date ).to_pydatetime() )
+
+    for col, values in ( ( 'Road_traffic_density', traffic ), ( 'Weatherconditions', weather ) ):
+        if values is None:
+            continue
+        if not values:
+            predicados.append( 'FALSE' )
+            continue
+
+        predicados.append( '{} IN ( {} )'.format( _quote( col ), ', '.join( '?' for _ in values ) ) )
+        params += list( values )
+
+    return ' AND '.join( predicados ), params
+
+
+def _query( con, sql, params=() ):
+    cursor = con.cursor()
+    try:
+        return cursor.execute( sql, list( params ) ).df()
+    finally:
+        cursor.close()
+
+
+def _fetchone( con, sql, params=() ):
+    cursor = con.cursor()
+    try:
+        return cursor.execute( sql, list( params ) ).fetchone()
+    finally:
+        cursor.close()
+
+
+@timed( 'filter' )
+def rows( con, columns, date=None, traffic=None, weather=None ):
+    """
+        Linhas filtradas com as colunas `columns`, na ordem do dataset
+        (o mesmo que utils.filters.apply_filters).
+    """
+    where, params = _where( date, traffic, weather )
+    sql = 'SELECT {} FROM {} WHERE {} ORDER BY row_id'.format( ', '.join( _quote( col ) for col in columns ),
+                                                              TABLE, where )
+
+    return _query( con, sql, params )
+
+
+@timed( 'filter' )
+def rows_at( con, columns, positions, date=None, traffic=None, weather=None ):
+    """
+        Linhas de row_id em `positions` (ex.: utils.spatial.query_bbox sobre
+        load_spatial_index) que passam nos filtros, com as colunas `columns`,
+        na ordem do dataset.
+    """
+    where, params = _where( date, traffic, weather )
+    cursor = con.cursor()
+    try:
+        cursor.register( 'positions', pd.DataFrame( { 'row_id': np.asarray( positions, dtype='int64' ) } ) )
+        sql = 'SELECT {} FROM {} SEMI JOIN positions USING ( row_id ) WHERE {} ORDER BY row_id'.format(
+            ', '.join( _quote( col ) for col in columns ), TABLE, where )
+
+        return cursor.execute( sql, params ).df()
+    finally:
+        cursor.close()
+
+
+@timed( 'aggregate' )
+def run_kpis( con, kpis, date=None, traffic=None, weather=None ):
+    """
+        Equivalente a utils.metrics.run_kpis: um único GROUP BY pela união das
+        dimensões dos KPIs (com count/sum/sumsq/min/max das medidas) e os
+        rollups de utils.cube sobre essa tabela pequena.
+    """
+    dimensions = list( dict.fromkeys( col for kpi in kpis for col in kpi.by ) )
+    measures = list( dict.fromkeys( kpi.measure for kpi in kpis if kpi.measure is not None ) )
+
+    colunas = [ _quote( col ) for col in dimensions ] + [ 'COUNT(*) AS orders' ]
+    for measure in measures:
+        m = _quote( measure )
+        colunas += [ 'COUNT({}) AS {}'.format( m, _quote( measure + '_count' ) ),
+                     'SUM({})::DOUBLE AS {}'.format( m, _quote( measure + '_sum' ) ),
+                     'SUM({0}::DOUBLE * {0}) AS {1}'.format( m, _quote( measure + '_sumsq' ) ),
+                     'MIN({}) AS {}'.format( m, _quote( measure + '_min' ) ),
+                     'MAX({}) AS {}'.format( m, _quote( measure + '_max' ) ) ]
+
+    where, params = _where( date, traffic, weather )
+    sql = 'SELECT {} FROM {} WHERE {}'.format( ', '.join( colunas ), TABLE, where )
+    if dimensions:
+        sql += ' GROUP BY {}'.format( ', '.join( _quote( col ) for col in dimensions ) )
+
+    base = _query( con, sql, params )
+
+    return { kpi.name: rollup( base, kpi.by, kpi.measure ) for kpi in kpis }
+
+
+@timed( 'aggregate' )
+def period_orders( con, granularity='week', date=None, traffic=None, weather=None ):
+    """
+        Equivalente a utils.visao_empresa.period_orders: agrupa pela coluna
+        de calendário da granularidade (utils.calendar_dim).
+    """
+    where, params = _where( date, traffic, weather )
+    sql = ( 'SELECT {key} AS period, COUNT(ID) AS ID, COUNT( DISTINCT Delivery_person_ID ) AS Delivery_person_ID '
+            'FROM {table} WHERE {where} GROUP BY period ORDER BY period'.format( key=GRANULARITIES[granularity],
+                                                                                  table=TABLE, where=where ) )
+
+    df_aux = _query( con, sql, params )
+    df_aux['period'] = bucket_labels( df_aux['period'], granularity )
+
+    return df_aux.rename( columns={ 'period': granularity } )
+
+
+@timed( 'aggregate' )
+def orders_by_day( con, date=None, traffic=None, weather=None ):
+    """
+        Pedidos (IDs não nulos) por Order_Date, no formato das células do
+        cubo ( Order_Date, orders ) usado por
+        utils.visao_empresa.period_orders_sketch.
+    """
+    where, params = _where( date, traffic, weather )
+    sql = ( 'SELECT Order_Date, COUNT(ID) AS orders FROM {} WHERE {} '
+            'GROUP BY Order_Date ORDER BY Order_Date'.format( TABLE, where ) )
+
+    return _query( con, sql, params )
+
+
+@timed( 'aggregate' )
+def age_vehicle_metrics( con, date=None, traffic=None, weather=None ):
+    """
+        Equivalente a utils.visao_entregadores.age_vehicle_metrics.
+    """
+    where, params = _where( date, traffic, weather )
+    sql = ( 'SELECT MAX(Delivery_person_Age), MIN(Delivery_person_Age), MAX(Vehicle_condition), '
+            'MIN(Vehicle_condition) FROM {} WHERE {}'.format( TABLE, where ) )
+
+    return tuple( _fetchone( con, sql, params ) )
+
+
+@timed( 'aggregate' )
+def avg_ratings_by_delivery( con, date=None, traffic=None, weather=None ):
+    """
+        Equivalente a utils.visao_entregadores.avg_ratings_by_delivery.
+    """
+    where, params = _where( date, traffic, weather )
+    sql = ( 'SELECT Delivery_person_ID, AVG(Delivery_person_Ratings) AS Delivery_person_Ratings '
+            'FROM {} WHERE {} AND Delivery_person_ID IS NOT NULL '
+            'GROUP BY Delivery_person_ID ORDER BY Delivery_person_ID'.format( TABLE, where ) )
+
+    return _query( con, sql, params )
+
+
+@timed( 'aggregate' )
+def unique_deliveries( con, date=None, traffic=None, weather=None ):
+    """
+        Equivalente a utils.visao_restaurantes.unique_deliveries (NULL conta
+        como um valor, como em Series.unique).
+    """
+    where, params = _where( date, traffic, weather )
+    sql = ( 'SELECT COUNT( DISTINCT Delivery_person_ID ) + MAX( CASE WHEN Delivery_person_ID IS NULL '
+            'THEN 1 ELSE 0 END ) FROM {} WHERE {}'.format( TABLE, where ) )
+
+    return int( _fetchone( con, sql, params )[0] or 0 )
+
+
+@timed( 'aggregate' )
+def top_bottom_k( con, group='City', key='Delivery_person_ID', value='Time_taken(min)', k=10, min_orders=1,
+                  date=None, traffic=None, weather=None ):
+    """
+        Equivalente a utils.ranking.top_bottom_k: média de `value` por
+        ( group, key ) e os k menores / k maiores de cada grupo, com o mesmo
+        desempate (primeira ocorrência da chave no dataset filtrado).
+    """
+    where, params = _where( date, traffic, weather )
+    g, c, v = _quote( group ), _quote( key ), _quote( value )
+    sql = ( 'WITH stats AS ( SELECT {g} AS g, {c} AS c, AVG({v}) AS mean, COUNT(*) AS orders, '
+            'MIN(row_id) AS first_seen FROM {table} WHERE {where} AND {g} IS NOT NULL AND {c} IS NOT NULL '
+            'GROUP BY {g}, {c} HAVING COUNT(*) >= ? ), '
+            'ranked AS ( SELECT *, '
+            'row_number() OVER ( PARTITION BY g ORDER BY mean ASC, first_seen ) AS top_rank, '
+            'row_number() OVER ( PARTITION BY g ORDER BY mean DESC, first_seen ) AS bottom_rank '
+            'FROM stats ) '
+            'SELECT g, c, mean, orders, top_rank, bottom_rank FROM ranked '
+            'WHERE top_rank <= ? OR bottom_rank <= ?'.format( g=g, c=c, v=v, table=TABLE, where=where ) )
+
+    df_aux = _query( con, sql, params + [ min_orders, k, k ] )
+
+    def _frame( rank ):
+        df_rank = df_aux.loc[df_aux[rank] <= k, :].sort_values( [ 'g', rank ] )
+        df_rank = df_rank.loc[:, [ 'g', 'c', 'mean', 'orders' ]].reset_index( drop=True )
+
+        return df_rank.rename( columns={ 'g': group, 'c': key, 'mean': value } )
+
+    return _frame( 'top_rank' ), _frame( 'bottom_rank' )
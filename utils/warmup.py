@@ -0,0 +1,249 @@
+# ==================================
+# ===    Aquecimento e prefetch    =====
+# ==================================
+# Aquecimento: uma thread do servidor carrega e limpa o dataset (e monta o
+# cubo, os índices e os sketches) e calcula os resultados de cada página no
+# estado inicial da barra lateral (todo o trânsito, todo o clima, data
+# padrão), que ficam no cache de resultados de utils.backend:
+#     python -m utils.warmup [opções do streamlit run]
+# sobe o servidor (streamlit run Home.py) com o aquecimento já em andamento.
+# Com `streamlit run Home.py` o aquecimento começa no primeiro acesso a
+# qualquer página (a Home inclusive). CURRY_WARMUP=0 desativa.
+#
+# Prefetch (opcional, CURRY_PREFETCH=1): ao fim de cada rerun a página pede
+# as posições vizinhas do slider de data, calculadas num pool de threads
+# enquanto o usuário não interage:
+#     - CPU: CURRY_PREFETCH_WORKERS threads, cada uma ocupada no máximo a
+#       fração CURRY_PREFETCH_CPU do tempo (pausa proporcional a cada estado),
+#       e só depois de CURRY_PREFETCH_IDLE_MS sem reruns
+#     - memória: os resultados vão para o cache de resultados (orçamento
+#       CURRY_RESULT_CACHE_MB), e o prefetch para enquanto o cache estiver
+#       acima de PREFETCH_FILL do orçamento: não expulsa o que as sessões
+#       usaram; no máximo PREFETCH_PENDING estados esperando (os mais antigos
+#       são descartados)
+import os
+import sys
+import time
+import datetime
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.backend import open_source, result_cache_info
+from utils.precompute import PAGES, DEFAULT_DATE, TRAFFIC, WEATHER, compute_results, state_key
+
+WARMUP = os.environ.get( 'CURRY_WARMUP', '1' ) != '0'
+
+PREFETCH = os.environ.get( 'CURRY_PREFETCH', '0' ) == '1'
+PREFETCH_WORKERS = int( os.environ.get( 'CURRY_PREFETCH_WORKERS', 1 ) )
+PREFETCH_CPU = float( os.environ.get( 'CURRY_PREFETCH_CPU', 0.5 ) )
+PREFETCH_IDLE_MS = int( os.environ.get( 'CURRY_PREFETCH_IDLE_MS', 300 ) )
+
+# Posições do slider de data calculadas de cada lado da posição atual
+PREFETCH_RADIUS = int( os.environ.get( 'CURRY_PREFETCH_RADIUS', 2 ) )
+
+PREFETCH_PENDING = 16
+PREFETCH_FILL = 0.75
+
+# Limites do slider de data das páginas (passo de um dia)
+DATE_RANGE = ( datetime.datetime( 2022, 2, 11 ), datetime.datetime( 2022, 4, 6 ) )
+
+_lock = threading.Lock()
+_state = { 'warmup': None, 'last_rerun': 0.0, 'prefetcher': None }
+
+
+def default_filters( page ):
+    """
+        Estado inicial da barra lateral da página `page` (utils.precompute.PAGES).
+    """
+    _, has_weather = PAGES[page]
+    return { 'date': DEFAULT_DATE, 'traffic': list( TRAFFIC ), 'weather': list( WEATHER ) if has_weather else None }
+
+
+def page_source( page, filters, backend=None ):
+    """
+        Fonte da página `page` com os filtros `filters`, a mesma que a página
+        abre (e, portanto, a mesma entrada no cache de resultados).
+    """
+    module, _ = PAGES[page]
+    return open_source( module.COLUMNS, backend=backend, **filters )
+
+
+def warmup( pages=None, backend=None ):
+    """
+        Calcula os resultados das páginas no estado inicial da barra lateral.
+        A primeira página carrega o dataset e as estruturas derivadas; o índice
+        espacial (Visão Geográfica) também é montado.
+    """
+    for page in pages or PAGES:
+        source = page_source( page, default_filters( page ), backend )
+        compute_results( page, source )
+
+    page_source( 'visao_empresa', default_filters( 'visao_empresa' ), backend ).spatial_index()
+
+
+def _run_warmup():
+    start = time.perf_counter()
+    try:
+        warmup()
+    except Exception as exc:
+        # As páginas continuam funcionando: só perdem o cache aquecido
+        print( 'aquecimento falhou: {!r}'.format( exc ), file=sys.stderr )
+        return
+
+    print( 'aquecimento concluído em {:.1f}s'.format( time.perf_counter() - start ), file=sys.stderr )
+
+
+def start_warmup():
+    """
+        Dispara o aquecimento numa thread, uma vez por processo (se
+        CURRY_WARMUP estiver ligado). Retorna a thread, ou None.
+    """
+    if not WARMUP:
+        return None
+
+    with _lock:
+        if _state['warmup'] is None:
+            _state['warmup'] = threading.Thread( target=_run_warmup, name='curry-warmup', daemon=True )
+            _state['warmup'].start()
+
+    return _state['warmup']
+
+
+def rerun_started():
+    """
+        Chamar no início do script da página: dispara o aquecimento (na
+        primeira vez) e adia o prefetch enquanto o rerun roda.
+    """
+    _state['last_rerun'] = time.monotonic()
+    start_warmup()
+
+
+def neighbour_dates( date, radius=PREFETCH_RADIUS, date_range=DATE_RANGE ):
+    """
+        Posições do slider de data vizinhas de `date`, da mais próxima para a
+        mais distante, dentro dos limites do slider (um valor fora deles,
+        como a data padrão, é visto a partir do limite mais próximo).
+    """
+    first, last = date_range
+    centro = min( max( date, first ), last )
+
+    datas = [ centro ] if centro != date else []
+    for dias in range( 1, radius + 1 ):
+        for sinal in ( 1, -1 ):
+            vizinha = centro + sinal * datetime.timedelta( days=dias )
+            if first <= vizinha <= last:
+                datas.append( vizinha )
+
+    return datas
+
+
+class Prefetcher:
+    """
+        Pool de threads que calcula estados dos filtros em segundo plano,
+        com os tetos de CPU e de memória descritos no início do módulo. O
+        estado pedido por último é o primeiro calculado.
+    """
+    def __init__( self, workers=PREFETCH_WORKERS, cpu=PREFETCH_CPU, idle_ms=PREFETCH_IDLE_MS,
+                  max_pending=PREFETCH_PENDING, fill=PREFETCH_FILL ):
+        self.cpu = min( max( cpu, 0.01 ), 1.0 )
+        self.idle = idle_ms / 1000
+        self.max_pending = max_pending
+        self.fill = fill
+        self._pool = ThreadPoolExecutor( max_workers=max( workers, 1 ), thread_name_prefix='curry-prefetch' )
+        self._pending = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = { 'computed': 0, 'skipped': 0, 'dropped': 0 }
+
+    def submit( self, page, filters ):
+        key = ( page, state_key( filters ) )
+        with self._lock:
+            if key in self._pending:
+                return
+
+            self._pending[key] = ( page, filters )
+            while len( self._pending ) > self.max_pending:
+                self._pending.popitem( last=False )
+                self.stats['dropped'] += 1
+
+        self._pool.submit( self._run_next )
+
+    def _wait_idle( self ):
+        while True:
+            espera = _state['last_rerun'] + self.idle - time.monotonic()
+            if espera <= 0:
+                return
+            time.sleep( espera )
+
+    def _has_room( self ):
+        info = result_cache_info()
+        return info['bytes'] <= self.fill * info['max_bytes']
+
+    def _run_next( self ):
+        self._wait_idle()
+        with self._lock:
+            if not self._pending:
+                return
+            _, ( page, filters ) = self._pending.popitem( last=True )
+
+        if not self._has_room():
+            self.stats['skipped'] += 1
+            return
+
+        start = time.perf_counter()
+        try:
+            compute_results( page, page_source( page, filters ) )
+        except Exception as exc:
+            print( 'prefetch falhou ({}): {!r}'.format( page, exc ), file=sys.stderr )
+            return
+        self.stats['computed'] += 1
+
+        # Teto de CPU: pausa proporcional ao tempo gasto no estado
+        time.sleep( ( time.perf_counter() - start ) * ( 1 - self.cpu ) / self.cpu )
+
+
+def prefetcher():
+    """
+        Prefetcher do processo (criado na primeira chamada), ou None se
+        CURRY_PREFETCH estiver desligado.
+    """
+    if not PREFETCH:
+        return None
+
+    with _lock:
+        if _state['prefetcher'] is None:
+            _state['prefetcher'] = Prefetcher()
+
+    return _state['prefetcher']
+
+
+def prefetch_neighbours( page, filters ):
+    """
+        Chamar no fim do script da página, com o estado dos filtros do rerun:
+        pede ao prefetcher as posições vizinhas do slider de data, com os
+        mesmos filtros de trânsito e clima.
+    """
+    _state['last_rerun'] = time.monotonic()
+
+    pool = prefetcher()
+    if pool is None or filters.get( 'date' ) is None:
+        return
+
+    _, has_weather = PAGES[page]
+    for date in reversed( neighbour_dates( filters['date'] ) ):
+        pool.submit( page, { 'date': date, 'traffic': filters.get( 'traffic' ),
+                             'weather': filters.get( 'weather' ) if has_weather else None } )
+
+
+def main():
+    # python -m utils.warmup [opções do streamlit run]: o servidor roda neste
+    # processo, então as páginas usam os caches que a thread aquece
+    from streamlit.web import cli
+
+    start_warmup()
+    sys.argv = [ 'streamlit', 'run', 'Home.py' ] + sys.argv[1:]
+    sys.exit( cli.main() )
+
+
+if __name__ == '__main__':
+    main()